@@ -0,0 +1,179 @@
+import threading
+import weakref
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import (
+    User, Property, Booking, Payment, VisitRequest, TenantOwnership, UserActivitySummary,
+    ArchivedBooking, ArchivedPayment, ArchivedVisitRequest,
+)
+
+
+# per-user activity summary behind the seller and tenant dashboards
+#
+# model signals mark the users touched by a write as dirty, and their
+# summary row is recomputed once when the transaction commits (a workflow
+# view that saves a payment, a booking and a property refreshes each user
+# once, not three times). Dashboards then read one row by primary key.
+# The counts include the archive tables (core/archive.py), so moving rows
+# there changes nothing and is done with marking suspended.
+
+
+_pending = threading.local()
+
+
+def mark_dirty(*user_ids):
+    if getattr(_pending, "suspended", False):
+        return
+    ids = {user_id for user_id in user_ids if user_id}
+    if not ids:
+        return
+
+    pending = getattr(_pending, "ids", None)
+    if pending is None:
+        pending = _pending.ids = set()
+    pending |= ids
+
+    # runs right away outside of atomic blocks; inside one, queued once per
+    # transaction. Only a weak reference to the queued callback is kept: a
+    # rollback (of the transaction or the savepoint it was queued in) drops
+    # it, and the next write queues another.
+    queued = getattr(_pending, "queued", None)
+    if queued is None or queued() is None:
+        def callback():
+            flush()
+        _pending.queued = weakref.ref(callback)
+        transaction.on_commit(callback)
+
+
+@contextmanager
+def suspended():
+    # for writes that leave every summary as it is
+    previous = getattr(_pending, "suspended", False)
+    _pending.suspended = True
+    try:
+        yield
+    finally:
+        _pending.suspended = previous
+
+
+def flush():
+    _pending.queued = None
+    ids = getattr(_pending, "ids", None)
+    if not ids:
+        return
+    _pending.ids = set()
+
+    now = timezone.now()
+    for user_id in ids:
+        refresh_summary(user_id, activity_at=now)
+
+
+def seller_summary(user_id):
+    props = Property.objects.filter(seller_id=user_id).aggregate(
+        total=Count("id"),
+        available=Count("id", filter=Q(status="AVAILABLE")),
+        booked=Count("id", filter=Q(status="BOOKED")),
+        sold=Count("id", filter=Q(status="SOLD")),
+        inactive=Count("id", filter=Q(status="INACTIVE")),
+    )
+    payments = Payment.objects.filter(
+        seller_id=user_id,
+        status="APPROVED",
+    ).aggregate(
+        sent=Sum("seller_amount", filter=Q(seller_amount_sent=True)),
+        unsent=Sum("seller_amount", filter=Q(seller_amount_sent=False)),
+    )
+
+    # archived payments are all settled: sent, or rejected
+    archived_sent = ArchivedPayment.objects.filter(
+        seller_id=user_id,
+        status="APPROVED",
+    ).aggregate(sent=Sum("seller_amount"))["sent"]
+
+    return {
+        "properties_total": props["total"],
+        "properties_available": props["available"],
+        "properties_booked": props["booked"],
+        "properties_sold": props["sold"],
+        "properties_inactive": props["inactive"],
+        "bookings_received": (
+            Booking.objects.filter(seller_id=user_id).count()
+            + ArchivedBooking.objects.filter(seller_id=user_id).count()
+        ),
+        "visits_received": (
+            VisitRequest.objects.filter(seller_id=user_id).count()
+            + ArchivedVisitRequest.objects.filter(seller_id=user_id).count()
+        ),
+        "payments_received": (payments["sent"] or Decimal("0")) + (archived_sent or Decimal("0")),
+        "payments_pending": payments["unsent"] or Decimal("0"),
+    }
+
+
+def tenant_summary(user_id):
+    visits = VisitRequest.objects.filter(tenant_id=user_id).aggregate(
+        pending=Count("id", filter=Q(status="PENDING")),
+        approved=Count("id", filter=Q(status="APPROVED")),
+        rejected=Count("id", filter=Q(status="REJECTED")),
+    )
+    bookings = Booking.objects.filter(tenant_id=user_id).aggregate(
+        pending=Count("id", filter=Q(status="PENDING")),
+        confirmed=Count("id", filter=Q(status="CONFIRMED")),
+        cancelled=Count("id", filter=Q(status="CANCELLED")),
+        completed=Count("id", filter=Q(status="COMPLETED")),
+    )
+    # only finished rows are archived: rejected visits, cancelled and
+    # completed bookings
+    archived_visits = ArchivedVisitRequest.objects.filter(tenant_id=user_id, status="REJECTED").count()
+    archived_bookings = ArchivedBooking.objects.filter(tenant_id=user_id).aggregate(
+        cancelled=Count("id", filter=Q(status="CANCELLED")),
+        completed=Count("id", filter=Q(status="COMPLETED")),
+    )
+    # one ownership row per completed booking with an approved payment
+    owned = TenantOwnership.objects.filter(tenant_id=user_id).aggregate(
+        properties=Count("id"),
+        spent=Sum("amount"),
+    )
+
+    return {
+        "visits_pending": visits["pending"],
+        "visits_approved": visits["approved"],
+        "visits_rejected": visits["rejected"] + archived_visits,
+        "bookings_pending": bookings["pending"],
+        "bookings_confirmed": bookings["confirmed"],
+        "bookings_cancelled": bookings["cancelled"] + archived_bookings["cancelled"],
+        "bookings_completed": bookings["completed"] + archived_bookings["completed"],
+        "owned_properties": owned["properties"],
+        "total_spent": owned["spent"] or Decimal("0"),
+    }
+
+
+def refresh_summary(user_id, activity_at=None):
+    role = User.objects.filter(id=user_id).values_list("role", flat=True).first()
+    if role is None:
+        # user was deleted; the summary row went with it
+        return None
+
+    values = {}
+    if role == "SELLER":
+        values.update(seller_summary(user_id))
+    elif role == "TENANT":
+        values.update(tenant_summary(user_id))
+
+    if activity_at:
+        values["last_activity_at"] = activity_at
+
+    summary, _ = UserActivitySummary.objects.update_or_create(user_id=user_id, defaults=values)
+    return summary
+
+
+def get_summary(user):
+    # one primary-key lookup; built on first use for users from before the table
+    summary = UserActivitySummary.objects.filter(user_id=user.id).first()
+    if summary is None:
+        summary = refresh_summary(user.id)
+    return summary
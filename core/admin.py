@@ -1,10 +1,23 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import User, Property, VisitRequest, Booking, Payment
+from .models import (
+    User, Property, VisitRequest, Booking, Payment, ImageBlob, TenantOwnership, Job, OutboxMessage, ImportRun,
+    DeletionRun,
+    ArchivedVisitRequest, ArchivedBooking, ArchivedPayment,
+)
 
 admin.site.register(User)
 admin.site.register(Property)
 admin.site.register(VisitRequest)
 admin.site.register(Booking)
 admin.site.register(Payment)
+admin.site.register(ImageBlob)
+admin.site.register(TenantOwnership)
+admin.site.register(Job)
+admin.site.register(OutboxMessage)
+admin.site.register(ImportRun)
+admin.site.register(DeletionRun)
+admin.site.register(ArchivedVisitRequest)
+admin.site.register(ArchivedBooking)
+admin.site.register(ArchivedPayment)
@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import activity
+from .models import (
+    ArchivedBooking, ArchivedPayment, ArchivedVisitRequest, Booking, Payment, VisitRequest,
+)
+
+
+# moves finished history out of the hot tables
+#
+# rejected visits, and cancelled or completed bookings together with their
+# payments, go to the Archived* tables once they are older than
+# ARCHIVE_RETENTION_DAYS (python manage.py archive_history, e.g. nightly
+# from cron). The admin queues, tenant pages and their indexes then only
+# hold open work and recent rows; sqlite reuses the freed pages.
+#
+# rows keep their ids and values and move ARCHIVE_BATCH_SIZE at a time,
+# each batch copied and deleted in its own short transaction, so a run
+# never holds the write lock for long and can stop at any point. A booking
+# stays while one of its payments is still open (pending, or approved but
+# not yet sent to the seller). Deleting a booking clears the
+# TenantOwnership links; "My Properties" keeps its own amount and date.
+#
+# the activity summaries count the archive tables too, so the move leaves
+# them unchanged and the delete signals are not replayed into them.
+
+
+class ArchiveResult:
+    def __init__(self):
+        self.visits = 0
+        self.bookings = 0
+        self.payments = 0
+
+    def __str__(self):
+        return f"{self.visits} visits, {self.bookings} bookings and {self.payments} payments archived"
+
+
+def cutoff(days=None):
+    if days is None:
+        days = settings.ARCHIVE_RETENTION_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def copied_fields(model):
+    return [field.attname for field in model._meta.concrete_fields if field.name != "archived_at"]
+
+
+def visits_due(before):
+    # visit_status_created_idx
+    return VisitRequest.objects.filter(status="REJECTED", created_at__lt=before)
+
+
+def bookings_due(before):
+    # booking_status_created_idx; a booking left behind for an open payment
+    # is stepped over again by later batches, which is rare and cheap
+    open_payments = Payment.objects.filter(booking=OuterRef("pk")).filter(
+        Q(status="PENDING") | Q(status="APPROVED", seller_amount_sent=False)
+    )
+    return Booking.objects.filter(
+        status__in=["CANCELLED", "COMPLETED"],
+        created_at__lt=before,
+    ).exclude(Exists(open_payments))
+
+
+def move_visits(ids, result):
+    now = timezone.now()
+    rows = VisitRequest.objects.filter(id__in=ids).values(*copied_fields(ArchivedVisitRequest))
+    ArchivedVisitRequest.objects.bulk_create([ArchivedVisitRequest(**row, archived_at=now) for row in rows])
+    VisitRequest.objects.filter(id__in=ids).delete()
+    result.visits += len(ids)
+
+
+def move_bookings(ids, result):
+    now = timezone.now()
+    bookings = Booking.objects.filter(id__in=ids).values(*copied_fields(ArchivedBooking))
+    payments = Payment.objects.filter(booking_id__in=ids).values(*copied_fields(ArchivedPayment))
+    ArchivedBooking.objects.bulk_create([ArchivedBooking(**row, archived_at=now) for row in bookings])
+    archived = ArchivedPayment.objects.bulk_create([ArchivedPayment(**row, archived_at=now) for row in payments])
+
+    # the payments go with their bookings
+    Booking.objects.filter(id__in=ids).delete()
+    result.bookings += len(ids)
+    result.payments += len(archived)
+
+
+def archive(days=None, batch_size=None, progress=None):
+    before = cutoff(days)
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    result = ArchiveResult()
+
+    with activity.suspended():
+        for due, move in ((visits_due, move_visits), (bookings_due, move_bookings)):
+            while True:
+                with transaction.atomic():
+                    ids = list(due(before).values_list("id", flat=True)[:batch_size])
+                    if ids:
+                        move(ids, result)
+                if not ids:
+                    break
+                if progress:
+                    progress(result)
+    return result
+
+
+def due_counts(days=None):
+    before = cutoff(days)
+    return {
+        "visits": visits_due(before).count(),
+        "bookings": bookings_due(before).count(),
+    }
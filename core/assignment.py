@@ -0,0 +1,155 @@
+import heapq
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import outbox
+from .models import User, VisitRequest
+
+
+# automatic agent assignment for visit requests
+#
+# an agent's load is the number of APPROVED visits they have on a date.
+# For a batch, the loads of every date in it come from one grouped query
+# over the (preferred_date, agent, status) index; each date then gets a
+# heap of (load, agent id) and every visit takes the least-loaded agent
+# with room left, which goes back on the heap with its load + 1. The
+# whole batch is written with one bulk update in one transaction, along
+# with the tenants' notification emails (core/outbox.py).
+
+
+class AssignmentResult:
+    def __init__(self):
+        self.assigned = []
+        self.full = []
+        self.past = []
+
+    def __str__(self):
+        return (
+            f"{len(self.assigned)} assigned, {len(self.full)} left pending (agents full), "
+            f"{len(self.past)} skipped (date passed)"
+        )
+
+
+def capacity():
+    return settings.AGENT_DAILY_VISIT_CAPACITY
+
+
+def active_agents():
+    return list(User.objects.filter(role="AGENT", is_active=True).order_by("id").values_list("id", flat=True))
+
+
+def agent_loads(dates):
+    # Counter of (agent id, date) -> approved visits
+    rows = VisitRequest.objects.filter(
+        preferred_date__in=set(dates),
+        agent__isnull=False,
+        status="APPROVED",
+    ).values("preferred_date", "agent_id").annotate(visits=Count("id")).order_by()
+    return Counter({(row["agent_id"], row["preferred_date"]): row["visits"] for row in rows})
+
+
+class CapacityIndex:
+    # per-date heaps of agents that still have room
+
+    def __init__(self, agents, loads, limit):
+        self.agents = agents
+        self.loads = loads
+        self.limit = limit
+        self.heaps = {}
+
+    def heap(self, date):
+        if date not in self.heaps:
+            heap = [(self.loads[(agent, date)], agent) for agent in self.agents]
+            heap = [item for item in heap if item[0] < self.limit]
+            heapq.heapify(heap)
+            self.heaps[date] = heap
+        return self.heaps[date]
+
+    def take(self, date):
+        # least-loaded agent for the date, or None when everyone is full
+        heap = self.heap(date)
+        if not heap:
+            return None
+        load, agent = heapq.heappop(heap)
+        load += 1
+        self.loads[(agent, date)] = load
+        if load < self.limit:
+            heapq.heappush(heap, (load, agent))
+        return agent
+
+
+def assignable_visits():
+    # pending requests, and approved ones that never got an agent;
+    # earliest dates first, then first come first served
+    return VisitRequest.objects.filter(
+        Q(status="PENDING") | Q(status="APPROVED", agent__isnull=True)
+    ).order_by("preferred_date", "created_at", "id")
+
+
+def assign_batch(visit_ids=None, limit=None):
+    from .activity import mark_dirty
+    from .notify import publish_many
+
+    result = AssignmentResult()
+    today = timezone.localdate()
+
+    with transaction.atomic():
+        visits = assignable_visits().select_related("property", "tenant").select_for_update(of=("self",))
+        if visit_ids is not None:
+            visits = visits.filter(id__in=visit_ids)
+        if limit:
+            visits = visits[:limit]
+        visits = list(visits)
+
+        upcoming = [visit for visit in visits if visit.preferred_date >= today]
+        result.past = [visit for visit in visits if visit.preferred_date < today]
+
+        index = CapacityIndex(
+            active_agents(),
+            agent_loads(visit.preferred_date for visit in upcoming),
+            capacity(),
+        )
+        for visit in upcoming:
+            agent_id = index.take(visit.preferred_date)
+            if agent_id is None:
+                result.full.append(visit)
+                continue
+            visit.agent_id = agent_id
+            visit.status = "APPROVED"
+            result.assigned.append(visit)
+
+        if result.assigned:
+            # bulk_update sends no post_save; do what those handlers would
+            VisitRequest.objects.bulk_update(result.assigned, ["agent", "status"], batch_size=500)
+            publish_many("VISIT", result.assigned)
+            mark_dirty(*{visit.tenant_id for visit in result.assigned}, *{visit.seller_id for visit in result.assigned})
+
+            agents = User.objects.in_bulk({visit.agent_id for visit in result.assigned})
+            for visit in result.assigned:
+                visit.agent = agents[visit.agent_id]
+            outbox.notify_many(
+                outbox.message("visit_approved", visit.tenant, visit.id, visit=visit)
+                for visit in result.assigned
+            )
+
+    return result
+
+
+def attach_workload(visits):
+    # sets visit.agent_workload = [(agent, approved visits that day)], least
+    # loaded first, for the agent dropdowns; one query for the agents and
+    # one for the loads of all the visits' dates
+    agents = list(User.objects.filter(role="AGENT", is_active=True).order_by("id"))
+    loads = agent_loads(visit.preferred_date for visit in visits)
+
+    by_date = {}
+    for visit in visits:
+        date = visit.preferred_date
+        if date not in by_date:
+            by_date[date] = sorted(((agent, loads[(agent.id, date)]) for agent in agents), key=lambda item: item[1])
+        visit.agent_workload = by_date[date]
+    return visits
@@ -0,0 +1,347 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db.models import QuerySet
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import render, redirect
+
+from .models import User, Property, Booking, Payment, VisitRequest
+from . import activity, assignment, exports, facets, views, notify, property_cache, streaming
+from .views import first_images
+
+
+# async versions of the read-heavy pages, used when ASYNC_VIEWS is on
+# (served by an ASGI server such as uvicorn or daphne, see project370/asgi.py)
+#
+# - a page's queries are made in one sync_to_async call (load below):
+#   Django runs every async ORM call on the same single sync thread, so
+#   gathering them would still run them one at a time, with a thread
+#   hop each
+# - everything the template touches is loaded before render(), because
+#   lazy queries are not allowed inside the event loop
+# - POST actions are passed to the sync view in views.py, so the write
+#   logic lives in one place
+
+
+async def fetch(queryset):
+    return [obj async for obj in queryset]
+
+
+def evaluate(query):
+    return list(query) if isinstance(query, QuerySet) else query()
+
+
+async def load(*queries):
+    # querysets (listed) and callables (called), in order, in one trip to
+    # the sync thread
+    return await sync_to_async(lambda: [evaluate(query) for query in queries])()
+
+
+async def resolve_user(request):
+    # request.user is lazy and loads from the db, which must happen off the loop
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+def role_required(role):
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            user = await resolve_user(request)
+            if not user.is_authenticated:
+                return redirect_to_login(request.get_full_path())
+            if user.role != role:
+                return redirect("home")
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def post_to_sync(sync_view):
+    # write actions keep using the sync view (transactions, signals, redirects)
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method == "POST":
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+#  displays featured properties
+async def home(request):
+    await resolve_user(request)
+
+    featured_properties = await fetch(
+        Property.objects.filter(is_featured=True, status="AVAILABLE").prefetch_related(first_images)
+    )
+
+    return render(request, "home.html", {"featured_properties": featured_properties})
+
+
+# admin routes
+
+@role_required("ADMIN")
+async def admin_dashboard(request):
+    (
+        total_users, total_sellers, total_tenants, total_properties,
+        total_bookings, total_payments, completed_deals,
+        pending_payments, pending_visits, pending_bookings,
+    ) = await load(
+        User.objects.count,
+        User.objects.filter(role="SELLER").count,
+        User.objects.filter(role="TENANT").count,
+        Property.objects.count,
+        Booking.objects.count,
+        Payment.objects.count,
+        Payment.objects.filter(seller_amount_sent=True).count,
+        Payment.objects.filter(status="PENDING").count,
+        VisitRequest.objects.filter(status="PENDING").count,
+        Booking.objects.filter(status="PENDING").count,
+    )
+
+    context = {
+        "total_users": total_users,
+        "total_sellers": total_sellers,
+        "total_tenants": total_tenants,
+        "total_properties": total_properties,
+        "total_bookings": total_bookings,
+        "total_payments": total_payments,
+        "completed_deals": completed_deals,
+        "pending_payments": pending_payments,
+        "pending_visits": pending_visits,
+        "pending_bookings": pending_bookings,
+    }
+    return render(request, "dashboard/admin_dashboard.html", context)
+
+
+@role_required("ADMIN")
+@post_to_sync(views.admin_users)
+async def admin_users(request):
+    # the tables are read while the page streams, in the sync thread
+    context = {
+        "sellers": streaming.Rows(User.objects.filter(role="SELLER"), "dashboard/partials/admin_user_rows.html"),
+        "tenants": streaming.Rows(User.objects.filter(role="TENANT"), "dashboard/partials/admin_user_rows.html"),
+        "agents": streaming.Rows(User.objects.filter(role="AGENT"), "dashboard/partials/admin_user_rows.html"),
+        "deletions": await fetch(views.recent_deletions("USER")),
+    }
+    return await streaming.arender_page(request, "dashboard/admin_users.html", context)
+
+
+@role_required("ADMIN")
+@post_to_sync(views.admin_properties)
+async def admin_properties(request):
+    properties = Property.objects.select_related("seller").all()
+
+    context = {
+        "properties": streaming.Rows(properties, "dashboard/partials/admin_property_rows.html"),
+        "deletions": await fetch(views.recent_deletions("PROPERTY")),
+    }
+    return await streaming.arender_page(request, "dashboard/admin_properties.html", context)
+
+
+@role_required("ADMIN")
+@post_to_sync(views.admin_payments)
+async def admin_payments(request):
+    pending_payments, approved_payments = await load(
+        Payment.objects.filter(status="PENDING").select_related(
+            "booking__property",
+            "booking__tenant"
+        ),
+        Payment.objects.filter(status="APPROVED").order_by(
+            "-approved_at"
+        ).select_related(
+            "booking__property",
+            "booking__tenant",
+            "approved_by_admin"
+        ),
+    )
+
+    total_platform_cut = sum(p.platform_cut for p in approved_payments)
+
+    context = {
+        "pending_payments": pending_payments,
+        "approved_payments": approved_payments,
+        "total_platform_cut": total_platform_cut,
+    }
+    return render(request, "dashboard/admin_payments.html", context)
+
+
+@role_required("ADMIN")
+async def admin_deals(request):
+    completed_deals = Payment.objects.filter(
+        seller_amount_sent=True
+    ).select_related(
+        "booking__property__seller",
+        "booking__tenant",
+        "approved_by_admin"
+    ).order_by("-seller_amount_sent_at")
+
+    context = {"completed_deals": streaming.Rows(completed_deals, "dashboard/partials/admin_deal_rows.html")}
+    return await streaming.arender_page(request, "dashboard/admin_deals.html", context)
+
+
+@role_required("ADMIN")
+async def admin_export(request, kind):
+    fmt = request.GET.get("format", "csv")
+    try:
+        start = exports.parse_day(request.GET.get("from"), "from")
+        end = exports.parse_day(request.GET.get("to"), "to")
+        exports.get_export(kind, fmt)
+    except exports.ExportError as e:
+        return HttpResponseBadRequest(str(e))
+
+    # an async iterator, which ASGI sends chunk by chunk
+    response = StreamingHttpResponse(
+        exports.astream(kind, fmt, start, end),
+        content_type=f"{exports.FORMATS[fmt][0]}; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{exports.filename(kind, fmt, start, end)}"'
+    return response
+
+
+@role_required("ADMIN")
+@post_to_sync(views.admin_visit_requests)
+async def admin_visit_requests(request):
+    pending = VisitRequest.objects.filter(status="PENDING").select_related(
+        "property", "tenant"
+    ).order_by("-created_at")
+
+    pending_visits, approved_visits, rejected_visits = await load(
+        lambda: assignment.attach_workload(list(pending)),
+        VisitRequest.objects.filter(status="APPROVED").select_related(
+            "property", "tenant", "agent"
+        ).order_by("-created_at")[:10],
+        VisitRequest.objects.filter(status="REJECTED").select_related(
+            "property", "tenant"
+        ).order_by("-created_at")[:10],
+    )
+
+    context = {
+        "pending_visits": pending_visits,
+        "approved_visits": approved_visits,
+        "rejected_visits": rejected_visits,
+        "agent_capacity": assignment.capacity(),
+    }
+    return render(request, "dashboard/admin_visit_requests.html", context)
+
+
+@role_required("ADMIN")
+@post_to_sync(views.admin_bookings)
+async def admin_bookings(request):
+    pending_bookings, confirmed_bookings, cancelled_bookings = await load(
+        Booking.objects.filter(status="PENDING").select_related(
+            "property", "tenant"
+        ).order_by("-created_at"),
+        Booking.objects.filter(status="CONFIRMED").select_related(
+            "property", "tenant"
+        ).order_by("-created_at")[:10],
+        Booking.objects.filter(status="CANCELLED").select_related(
+            "property", "tenant"
+        ).order_by("-created_at")[:10],
+    )
+
+    context = {
+        "pending_bookings": pending_bookings,
+        "confirmed_bookings": confirmed_bookings,
+        "cancelled_bookings": cancelled_bookings,
+    }
+    return render(request, "dashboard/admin_bookings.html", context)
+
+
+# tenant routes
+
+@role_required("TENANT")
+async def property_detail(request, property_id):
+    def page():
+        flags = property_cache.tenant_flags(property_id, request.user).first()
+        if flags is None:
+            return None
+        return (
+            flags,
+            property_cache.get_page(property_id, flags["version"]),
+            property_cache.similar_listings(property_id),
+        )
+
+    found = await sync_to_async(page)()
+    if found is None:
+        raise Http404("No Property matches the given query.")
+    flags, (prop, images), similar = found
+
+    context = {
+        "property": prop,
+        "images": images,
+        "similar": similar,
+        "has_pending_visit": flags["has_pending_visit"],
+        "has_approved_visit": flags["has_approved_visit"],
+        "has_booking": flags["has_booking"],
+    }
+    return render(request, "dashboard/property_detail.html", context)
+
+
+@role_required("TENANT")
+async def tenant_dashboard(request):
+    properties, summary, listing_facets = await load(
+        Property.objects.select_related("seller").filter(
+            status="AVAILABLE"
+        ).prefetch_related(first_images),
+        lambda: activity.get_summary(request.user),
+        facets.for_listing,
+    )
+
+    context = {
+        "properties": properties,
+        "confirmed_properties_count": summary.owned_properties,
+        "facets": listing_facets,
+    }
+    return render(request, "dashboard/tenant_dashboard.html", context)
+
+
+# seller routes
+
+@role_required("SELLER")
+async def seller_dashboard(request):
+    seller = request.user
+
+    summary, properties, bookings = await load(
+        lambda: activity.get_summary(seller),
+        Property.objects.filter(seller=seller).order_by(
+            "-created_at"
+        ).prefetch_related(first_images)[:6],
+        Booking.objects.filter(seller=seller).select_related(
+            "property", "tenant"
+        ).order_by("-created_at")[:5],
+    )
+
+    context = {
+        "summary": summary,
+        "properties": properties,
+        "bookings": bookings,
+        "payments_total": summary.payments_received,
+        "pending_payments": summary.payments_pending,
+    }
+    return render(request, "dashboard/seller_dashboard.html", context)
+
+
+# server-sent events for the admin work queues (payments, visits, bookings)
+@role_required("ADMIN")
+async def admin_queue_events(request):
+    kinds = [k for k in request.GET.get("kinds", "").upper().split(",") if k]
+
+    # resume after a reconnect, otherwise start from "now"
+    last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        last_id = await notify.alatest_event_id()
+
+    response = StreamingHttpResponse(
+        notify.event_stream(last_id, kinds),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # nginx would otherwise buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
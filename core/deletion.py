@@ -0,0 +1,268 @@
+import threading
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from . import activity, facets, jobs, similarity
+from .models import (
+    ArchivedBooking, ArchivedPayment, ArchivedVisitRequest, Booking, DeletionRun, Payment, Property,
+    PropertyImage, SimilarProperty, TenantOwnership, User, VisitRequest, release_image_blobs,
+)
+from .user_cache import bump_version
+
+
+# deleting a user or a property with everything under it
+#
+# the admin and seller pages only mark the row (the user inactive, so the
+# login stops working, the property INACTIVE, so it leaves the listings)
+# and queue a DeletionRun; a background job (core/tasks.py) then removes
+# the rest table by table, leaves first, DELETION_BATCH_SIZE rows per short
+# transaction, so the sqlite write lock is never held for long. The run's
+# counts are saved with each batch, and a retried job carries on from
+# whatever is left. A seller's listings are hidden before anything else.
+#
+# inside the cascade the per-row delete signals in models.py are skipped
+# and each batch does their work in bulk: the image blobs are released
+# together (files go once the batch commits), the facet counts move once
+# per batch, the properties listing a deleted one as similar are queued
+# for a refresh, and a property whose last open booking went with a
+# deleted tenant is back on the market, as reset_property_on_booking_delete
+# would have done. The summaries of the users on the other side of the
+# deleted rows are refreshed once per batch.
+
+
+_cascade = threading.local()
+
+
+def in_cascade():
+    return getattr(_cascade, "active", False)
+
+
+@contextmanager
+def cascading():
+    previous = in_cascade()
+    _cascade.active = True
+    try:
+        yield
+    finally:
+        _cascade.active = previous
+
+
+class DeletionResult:
+    def __init__(self, run=None):
+        # a retried run keeps its counts
+        self.deleted = Counter(run.deleted if run is not None else {})
+        # users whose summary the current batch changes
+        self.users = set()
+
+    def add(self, label, count):
+        if count:
+            self.deleted[label] += count
+
+    def __str__(self):
+        if not self.deleted:
+            return "nothing deleted"
+        return ", ".join(f"{count} {label}" for label, count in self.deleted.items())
+
+
+# users on either side of a row, for the summaries
+PEOPLE = {
+    Booking: ("tenant_id", "seller_id"),
+    VisitRequest: ("tenant_id", "seller_id"),
+    ArchivedBooking: ("tenant_id", "seller_id"),
+    ArchivedVisitRequest: ("tenant_id", "seller_id"),
+    TenantOwnership: ("tenant_id",),
+    Property: ("seller_id",),
+}
+
+
+def delete_rows(model, ids, result):
+    fields = PEOPLE.get(model)
+    if fields:
+        for row in model.objects.filter(id__in=ids).values_list(*fields):
+            result.users.update(row)
+    return model.objects.filter(id__in=ids).delete()[1].get(model._meta.label, 0)
+
+
+def delete_tenant_bookings(model, ids, result):
+    # the properties may stay; reopen the ones left without an open booking
+    reopen = set(
+        Booking.objects.filter(id__in=ids, status__in=["CONFIRMED", "PENDING"]).values_list("property_id", flat=True)
+    )
+    count = delete_rows(model, ids, result)
+
+    open_bookings = Booking.objects.filter(property=OuterRef("pk"), status__in=["CONFIRMED", "PENDING"])
+    for prop in Property.objects.filter(id__in=reopen).exclude(Exists(open_bookings)):
+        prop.status = "AVAILABLE"
+        prop.save()
+        result.users.add(prop.seller_id)
+    return count
+
+
+def delete_images(model, ids, result):
+    names = Counter(
+        PropertyImage.objects.filter(id__in=ids).exclude(image="").values_list("image", flat=True)
+    )
+    count = delete_rows(model, ids, result)
+    result.add("image files", release_image_blobs(names))
+    return count
+
+
+def facet_rows(ids):
+    return Property.objects.filter(id__in=ids).values_list("city", "property_type", "price", "status")
+
+
+def delete_properties(model, ids, result):
+    # images added since the images step
+    images = list(PropertyImage.objects.filter(property_id__in=ids).values_list("id", flat=True))
+    if images:
+        result.add("images", delete_images(PropertyImage, images, result))
+
+    deltas = Counter()
+    deltas.subtract(facets.tally(facet_rows(ids)))
+    facets.apply_deltas(deltas)
+    similarity.queue_refresh(
+        SimilarProperty.objects.filter(similar_id__in=ids).exclude(property_id__in=ids)
+        .values_list("property_id", flat=True)
+    )
+    return delete_rows(model, ids, result)
+
+
+def unlist(model, ids, result):
+    deltas = Counter()
+    deltas.subtract(facets.tally(facet_rows(ids)))
+    count = Property.objects.filter(id__in=ids).update(
+        status="INACTIVE", is_featured=False, version=F("version") + 1,
+    )
+    facets.apply_deltas(deltas)
+    result.users.update(Property.objects.filter(id__in=ids).values_list("seller_id", flat=True).distinct())
+    return count
+
+
+def unassign(field):
+    # on_delete=SET_NULL, a batch at a time
+    def handler(model, ids, result):
+        return model.objects.filter(id__in=ids).update(**{field: None})
+    return handler
+
+
+def user_steps(user_id):
+    # (label, rows left, handler), leaves first
+    return [
+        ("unlisted", Property.objects.filter(seller_id=user_id, status="AVAILABLE"), unlist),
+        ("payments", Payment.objects.filter(seller_id=user_id), delete_rows),
+        ("payments", Payment.objects.filter(booking__tenant_id=user_id), delete_rows),
+        ("ownerships", TenantOwnership.objects.filter(property__seller_id=user_id), delete_rows),
+        ("ownerships", TenantOwnership.objects.filter(tenant_id=user_id), delete_rows),
+        ("bookings", Booking.objects.filter(seller_id=user_id), delete_rows),
+        ("bookings", Booking.objects.filter(tenant_id=user_id), delete_tenant_bookings),
+        ("visits", VisitRequest.objects.filter(seller_id=user_id), delete_rows),
+        ("visits", VisitRequest.objects.filter(tenant_id=user_id), delete_rows),
+        ("archived payments", ArchivedPayment.objects.filter(seller_id=user_id), delete_rows),
+        ("archived payments", ArchivedPayment.objects.filter(booking__tenant_id=user_id), delete_rows),
+        ("archived bookings", ArchivedBooking.objects.filter(seller_id=user_id), delete_rows),
+        ("archived bookings", ArchivedBooking.objects.filter(tenant_id=user_id), delete_rows),
+        ("archived visits", ArchivedVisitRequest.objects.filter(seller_id=user_id), delete_rows),
+        ("archived visits", ArchivedVisitRequest.objects.filter(tenant_id=user_id), delete_rows),
+        ("unassigned visits", VisitRequest.objects.filter(agent_id=user_id), unassign("agent")),
+        ("unassigned visits", ArchivedVisitRequest.objects.filter(agent_id=user_id), unassign("agent")),
+        ("unassigned payments", Payment.objects.filter(approved_by_admin_id=user_id), unassign("approved_by_admin")),
+        (
+            "unassigned payments",
+            ArchivedPayment.objects.filter(approved_by_admin_id=user_id),
+            unassign("approved_by_admin"),
+        ),
+        ("images", PropertyImage.objects.filter(property__seller_id=user_id), delete_images),
+        ("properties", Property.objects.filter(seller_id=user_id), delete_properties),
+        # what is left hangs off the user directly and is small
+        ("users", User.objects.filter(id=user_id), delete_rows),
+    ]
+
+
+def property_steps(property_id):
+    return [
+        ("payments", Payment.objects.filter(booking__property_id=property_id), delete_rows),
+        ("ownerships", TenantOwnership.objects.filter(property_id=property_id), delete_rows),
+        ("bookings", Booking.objects.filter(property_id=property_id), delete_rows),
+        ("visits", VisitRequest.objects.filter(property_id=property_id), delete_rows),
+        ("archived payments", ArchivedPayment.objects.filter(booking__property_id=property_id), delete_rows),
+        ("archived bookings", ArchivedBooking.objects.filter(property_id=property_id), delete_rows),
+        ("archived visits", ArchivedVisitRequest.objects.filter(property_id=property_id), delete_rows),
+        ("images", PropertyImage.objects.filter(property_id=property_id), delete_images),
+        ("properties", Property.objects.filter(id=property_id), delete_properties),
+    ]
+
+
+def run_step(run, label, queryset, handler, batch_size, result, progress=None):
+    # the deleted user's own summary goes with it
+    deleted_user = run.object_id if run.kind == "USER" else None
+
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list("id", flat=True)[:batch_size])
+            if ids:
+                result.users = set()
+                with activity.suspended():
+                    result.add(label, handler(queryset.model, ids, result))
+                activity.mark_dirty(*(result.users - {deleted_user}))
+                DeletionRun.objects.filter(id=run.id).update(deleted=dict(result.deleted))
+        if not ids:
+            return
+        jobs.heartbeat()
+        if progress:
+            progress(result)
+
+
+def run_deletion(run, batch_size=None, progress=None):
+    # deletes what is left of a run's user or property; progress(result)
+    # after each batch
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    DeletionRun.objects.filter(id=run.id).update(status="RUNNING")
+    result = DeletionResult(run)
+    steps = user_steps(run.object_id) if run.kind == "USER" else property_steps(run.object_id)
+
+    try:
+        with cascading():
+            for label, queryset, handler in steps:
+                run_step(run, label, queryset, handler, batch_size, result, progress)
+    except Exception:
+        DeletionRun.objects.filter(id=run.id).update(status="FAILED", error=traceback.format_exc())
+        raise
+
+    DeletionRun.objects.filter(id=run.id).update(status="DONE", error="", finished_at=timezone.now())
+    return result
+
+
+def queue_deletion(obj, created_by=None):
+    # marks a User or Property and queues the rest; a second request for
+    # the same one returns the queued run
+    from .tasks import run_deletion as run_deletion_task
+
+    kind = "USER" if isinstance(obj, User) else "PROPERTY"
+    with transaction.atomic():
+        run = DeletionRun.objects.filter(kind=kind, object_id=obj.pk, status__in=["QUEUED", "RUNNING"]).first()
+        if run is not None:
+            return run
+
+        if kind == "USER":
+            User.objects.filter(id=obj.pk).update(is_active=False)
+            # update() sends no post_save, so the cached login is dropped here
+            bump_version(obj.pk)
+        elif obj.status != "INACTIVE" or obj.is_featured:
+            obj.status = "INACTIVE"
+            obj.is_featured = False
+            obj.save()
+
+        run = DeletionRun.objects.create(
+            kind=kind,
+            object_id=obj.pk,
+            label=(obj.username if kind == "USER" else obj.title)[:255],
+            created_by=created_by,
+        )
+        run_deletion_task.delay(run.id)
+    return run
@@ -0,0 +1,213 @@
+import csv
+import datetime
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import ArchivedBooking, ArchivedPayment, Booking, Payment
+from .streaming import async_chunks
+
+
+# full history exports for accounting: completed deals, payments, bookings,
+# live and archived
+#
+# rows are read with values_list(...).iterator(chunk_size=EXPORT_CHUNK_SIZE),
+# so no model instances are built and only one chunk of rows is held at a
+# time; the related names come from joins in the same query. Each export
+# walks an index on its date column in date order (payment_sent_idx,
+# payment_created_idx, booking_created_idx and their archive twins), so the
+# date range is a range scan and sqlite never sorts the whole table first.
+# The output is sent a chunk at a time as well, from the views
+# (StreamingHttpResponse) and from "manage.py export", which keeps memory
+# flat for millions of rows.
+#
+# dates are whole days in the site time zone; "to" is inclusive.
+
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+class Export:
+    def __init__(self, queryset, date_field, columns):
+        self.queryset = queryset
+        self.date_field = date_field
+        # (header, lookup) pairs
+        self.columns = columns
+
+    @property
+    def header(self):
+        return [name for name, _ in self.columns]
+
+    def rows(self, start=None, end=None):
+        filters = {}
+        if start is not None:
+            filters[f"{self.date_field}__gte"] = day_start(start)
+        if end is not None:
+            filters[f"{self.date_field}__lt"] = day_start(end + datetime.timedelta(days=1))
+
+        # one ordering column, so sqlite reads the rows straight off the index
+        return (
+            self.queryset()
+            .filter(**filters)
+            .order_by(self.date_field)
+            .values_list(*(lookup for _, lookup in self.columns))
+        )
+
+
+DEAL_COLUMNS = (
+    ("payment_id", "id"),
+    ("booking_id", "booking_id"),
+    ("property_id", "booking__property_id"),
+    ("property", "booking__property__title"),
+    ("seller", "seller__username"),
+    ("tenant", "booking__tenant__username"),
+    ("amount", "amount"),
+    ("platform_cut", "platform_cut"),
+    ("seller_amount", "seller_amount"),
+    ("approved_by", "approved_by_admin__username"),
+    ("approved_at", "approved_at"),
+    ("sent_at", "seller_amount_sent_at"),
+)
+
+PAYMENT_COLUMNS = (
+    ("payment_id", "id"),
+    ("booking_id", "booking_id"),
+    ("property_id", "booking__property_id"),
+    ("property", "booking__property__title"),
+    ("seller", "seller__username"),
+    ("tenant", "booking__tenant__username"),
+    ("status", "status"),
+    ("amount", "amount"),
+    ("platform_cut", "platform_cut"),
+    ("seller_amount", "seller_amount"),
+    ("approved_by", "approved_by_admin__username"),
+    ("approved_at", "approved_at"),
+    ("seller_amount_sent", "seller_amount_sent"),
+    ("sent_at", "seller_amount_sent_at"),
+    ("created_at", "created_at"),
+)
+
+BOOKING_COLUMNS = (
+    ("booking_id", "id"),
+    ("property_id", "property_id"),
+    ("property", "property__title"),
+    ("property_type", "property__property_type"),
+    ("seller", "seller__username"),
+    ("tenant", "tenant__username"),
+    ("status", "status"),
+    ("created_at", "created_at"),
+)
+
+# the archive tables (core/archive.py) have the same columns and indexes
+EXPORTS = {
+    "deals": Export(lambda: Payment.objects.filter(seller_amount_sent=True), "seller_amount_sent_at", DEAL_COLUMNS),
+    "payments": Export(lambda: Payment.objects.all(), "created_at", PAYMENT_COLUMNS),
+    "bookings": Export(lambda: Booking.objects.all(), "created_at", BOOKING_COLUMNS),
+    "archived-deals": Export(
+        lambda: ArchivedPayment.objects.filter(seller_amount_sent=True), "seller_amount_sent_at", DEAL_COLUMNS,
+    ),
+    "archived-payments": Export(lambda: ArchivedPayment.objects.all(), "created_at", PAYMENT_COLUMNS),
+    "archived-bookings": Export(lambda: ArchivedBooking.objects.all(), "created_at", BOOKING_COLUMNS),
+}
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def parse_day(value, name):
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ExportError(f"{name} must be a date (YYYY-MM-DD).")
+    return day
+
+
+def get_export(kind, fmt):
+    if kind not in EXPORTS:
+        raise ExportError(f"Unknown export {kind!r}; use {', '.join(EXPORTS)}.")
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; use {', '.join(FORMATS)}.")
+    return EXPORTS[kind]
+
+
+def filename(kind, fmt, start=None, end=None):
+    parts = [kind]
+    if start:
+        parts.append(f"from-{start.isoformat()}")
+    if end:
+        parts.append(f"to-{end.isoformat()}")
+    return f"{'_'.join(parts)}.{FORMATS[fmt][1]}"
+
+
+def plain(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, Decimal):
+        # a string, so amounts keep every digit
+        return str(value)
+    return value
+
+
+def cell(value):
+    # text starting like a formula is run by spreadsheet apps when the csv is
+    # opened, so it gets a leading ' and shows as typed; amounts (Decimals)
+    # are left as numbers
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return plain(value)
+
+
+class Lines:
+    # csv.writer target that hands back the formatted line
+    def write(self, line):
+        return line
+
+
+def formatter(export, fmt):
+    # returns (header line or "", function turning a row into a line)
+    if fmt == "csv":
+        writer = csv.writer(Lines())
+        return writer.writerow(export.header), lambda row: writer.writerow([cell(v) for v in row])
+
+    header = export.header
+
+    def line(row):
+        return json.dumps(dict(zip(header, map(plain, row))), ensure_ascii=False) + "\n"
+    return "", line
+
+
+def stream(kind, fmt, start=None, end=None, chunk_size=None):
+    # yields the export as text, about chunk_size rows at a time
+    export = get_export(kind, fmt)
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    header, line = formatter(export, fmt)
+
+    lines = [header] if header else []
+    for row in export.rows(start, end).iterator(chunk_size=chunk_size):
+        lines.append(line(row))
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+async def astream(kind, fmt, start=None, end=None, chunk_size=None):
+    # stream() for the async views
+    async for chunk in async_chunks(stream(kind, fmt, start, end, chunk_size)):
+        yield chunk
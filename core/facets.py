@@ -0,0 +1,169 @@
+import string
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Property, FacetCount
+
+
+# listing filter counts behind the tenant dashboard
+#
+# every AVAILABLE property adds one to each combination of its city,
+# property type and price bucket, with "" standing for "any" in each
+# position: (Dhaka, RENT, 25k-50k), (Dhaka, RENT, ""), (Dhaka, "", ""),
+# ("", "", "") and so on, eight rows per property. Property signals move
+# a property's counts whenever one of those values or its status changes,
+# so the listing page reads the finished numbers in one query.
+
+
+ANY = ""
+
+# (key, label, lower bound); a bucket runs up to the next one's bound
+PRICE_BUCKETS = [
+    ("lt10k", "Under ৳10,000", Decimal("0")),
+    ("10k-25k", "৳10,000 - 25,000", Decimal("10000")),
+    ("25k-50k", "৳25,000 - 50,000", Decimal("25000")),
+    ("50k-100k", "৳50,000 - 1 lakh", Decimal("50000")),
+    ("100k-1m", "৳1 - 10 lakh", Decimal("100000")),
+    ("1m-5m", "৳10 - 50 lakh", Decimal("1000000")),
+    ("5m-10m", "৳50 lakh - 1 crore", Decimal("5000000")),
+    ("10m+", "Over ৳1 crore", Decimal("10000000")),
+]
+
+PRICE_LABELS = {key: label for key, label, _ in PRICE_BUCKETS}
+
+
+def normalize_city(city):
+    # "dhaka ", "DHAKA" and "Dhaka" are one facet
+    return string.capwords((city or "").strip())
+
+
+def price_bucket(price):
+    bucket = PRICE_BUCKETS[0][0]
+    for key, _, lower in PRICE_BUCKETS:
+        if price is not None and Decimal(price) >= lower:
+            bucket = key
+    return bucket
+
+
+def facet_values(city, property_type, price, status):
+    # the (city, type, bucket) a property counts under, or None when it is
+    # not listed
+    if status != "AVAILABLE":
+        return None
+    return normalize_city(city), property_type, price_bucket(price)
+
+
+def combinations(values):
+    city, property_type, bucket = values
+    return [
+        (c, t, b)
+        for c in (city, ANY)
+        for t in (property_type, ANY)
+        for b in (bucket, ANY)
+    ]
+
+
+def tally(rows):
+    # Counter of facet key -> count for (city, type, price, status) rows
+    counts = Counter()
+    for row in rows:
+        values = facet_values(*row)
+        if values is not None:
+            counts.update(combinations(values))
+    return counts
+
+
+def apply(old, new):
+    # move one property's counts from its old facet values to its new ones
+    # (either can be None: not listed before / not listed any more)
+    deltas = Counter()
+    if old is not None:
+        deltas.subtract(combinations(old))
+    if new is not None:
+        deltas.update(combinations(new))
+    apply_deltas(deltas)
+
+
+def apply_deltas(deltas):
+    # {facet key: change}; also used for properties added in bulk
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        FacetCount.objects.bulk_create(
+            [
+                FacetCount(city=city, property_type=property_type, price_bucket=bucket)
+                for (city, property_type, bucket), delta in deltas.items()
+                if delta > 0
+            ],
+            ignore_conflicts=True,
+        )
+        for (city, property_type, bucket), delta in deltas.items():
+            FacetCount.objects.filter(
+                city=city, property_type=property_type, price_bucket=bucket,
+            ).update(count=Greatest(F("count") + delta, 0))
+
+
+def property_values(prop):
+    return facet_values(prop.city, prop.property_type, prop.price, prop.status)
+
+
+def rebuild(chunk_size=2000):
+    rows = Property.objects.filter(status="AVAILABLE").values_list(
+        "city", "property_type", "price", "status"
+    ).iterator(chunk_size=chunk_size)
+    counts = tally(rows)
+
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(
+            [
+                FacetCount(city=city, property_type=property_type, price_bucket=bucket, count=count)
+                for (city, property_type, bucket), count in counts.items()
+            ],
+            batch_size=500,
+        )
+    return len(counts)
+
+
+def for_listing():
+    # {"total", "cities", "types", "prices", ...} for the listing page;
+    # combinations (keyed "city|type|bucket") and price_bounds feed the
+    # filter script
+    # the whole (small) table; rows left at 0 by edits are skipped here
+    rows = [
+        row for row in FacetCount.objects.values_list("city", "property_type", "price_bucket", "count")
+        if row[3]
+    ]
+    type_labels = dict(Property.PROPERTY_TYPES)
+
+    cities, types, prices = [], [], []
+    total = 0
+    for city, property_type, bucket, count in rows:
+        if not city and not property_type and not bucket:
+            total = count
+        elif city and not property_type and not bucket:
+            cities.append({"value": city, "label": city, "count": count})
+        elif property_type and not city and not bucket:
+            types.append({"value": property_type, "label": type_labels.get(property_type, property_type), "count": count})
+        elif bucket and not city and not property_type:
+            prices.append({"value": bucket, "label": PRICE_LABELS.get(bucket, bucket), "count": count})
+
+    bucket_order = {key: i for i, (key, _, _) in enumerate(PRICE_BUCKETS)}
+    cities.sort(key=lambda facet: (-facet["count"], facet["value"]))
+    types.sort(key=lambda facet: facet["value"])
+    prices.sort(key=lambda facet: bucket_order.get(facet["value"], len(bucket_order)))
+
+    return {
+        "total": total,
+        "cities": cities,
+        "types": types,
+        "prices": prices,
+        "combinations": {"|".join(key): count for *key, count in rows},
+        "price_bounds": [[key, float(lower)] for key, _, lower in PRICE_BUCKETS],
+    }
@@ -0,0 +1,84 @@
+from django.core import exceptions
+from django.db import models
+from django.utils.functional import cached_property
+
+
+# choice field stored as a small integer
+#
+# the column holds a code (1, 2, 3 ...) while Python, templates and
+# queries keep using the string values: filter(status="AVAILABLE"),
+# prop.status == "AVAILABLE", get_status_display() all work unchanged.
+# Codes are listed explicitly so reordering choices never remaps rows;
+# new values get a new code and existing codes never change. An empty
+# string (e.g. a superuser created without a role) is stored as 0.
+#
+# a value outside the choices matches no rows in a filter, like it would
+# on a CharField, but saving one raises ValidationError instead of
+# writing a code nothing can read back.
+
+
+class CodedChoiceField(models.SmallIntegerField):
+    description = "String choice stored as a small integer code"
+
+    EMPTY_CODE = 0
+    # what an unknown value is looked up as; never stored
+    UNKNOWN_CODE = -1
+    # like CharField: a field without a default starts out as ""
+    empty_strings_allowed = True
+
+    def __init__(self, *args, codes=None, **kwargs):
+        self.codes = dict(codes or {})
+        self.values = {code: value for value, code in self.codes.items()}
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["codes"] = self.codes
+        return name, path, args, kwargs
+
+    @cached_property
+    def validators(self):
+        # the integer range validators of SmallIntegerField do not apply to
+        # the string values this field works with
+        return [*self.default_validators, *self._validators]
+
+    def to_value(self, code):
+        if code is None:
+            return None
+        if code == self.EMPTY_CODE:
+            return ""
+        try:
+            return self.values[code]
+        except KeyError:
+            raise ValueError(f"{self.model.__name__}.{self.name}: unknown code {code!r}")
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_value(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        try:
+            return self.to_value(int(value))
+        except (TypeError, ValueError):
+            raise exceptions.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if isinstance(value, str):
+            return self.codes.get(value, self.EMPTY_CODE if value == "" else self.UNKNOWN_CODE)
+        return value
+
+    def get_db_prep_save(self, value, connection):
+        value = models.Field.get_prep_value(self, value)
+        if isinstance(value, str) and value != "" and value not in self.codes:
+            raise exceptions.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return super().get_db_prep_save(value, connection)
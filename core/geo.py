@@ -0,0 +1,236 @@
+import csv
+import math
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.db.models import Q
+
+
+# offline geocoding and geohash helpers for property search
+#
+# coordinates come from a bundled gazetteer of Bangladeshi cities and
+# Dhaka/Chattogram areas (data/bd_gazetteer.csv), matched against the
+# property's address and city, so no network service is involved.
+# Each property also stores its geohash; a geohash prefix is a grid cell,
+# and every point inside a cell sorts between "prefix" and "prefix~", so
+# "which properties are near here" becomes a few index range scans on
+# the geohash column. Exact distances are checked in Python afterwards.
+
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / "data" / "bd_gazetteer.csv"
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+
+EARTH_RADIUS_KM = 6371.0088
+
+# most cells a search may be split into before a coarser precision is used
+MAX_SEARCH_CELLS = 24
+
+
+class Place:
+    def __init__(self, name, aliases, city, kind, latitude, longitude):
+        self.name = name
+        self.aliases = aliases
+        self.city = city
+        self.kind = kind
+        self.latitude = latitude
+        self.longitude = longitude
+
+    def __repr__(self):
+        return f"<Place {self.name}, {self.city}>"
+
+
+@lru_cache(maxsize=None)
+def gazetteer():
+    places = []
+    with open(GAZETTEER_PATH, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            places.append(Place(
+                name=row["name"],
+                aliases=[a for a in row["aliases"].split("|") if a],
+                city=row["city"],
+                kind=row["kind"],
+                latitude=float(row["latitude"]),
+                longitude=float(row["longitude"]),
+            ))
+    return places
+
+
+@lru_cache(maxsize=None)
+def name_patterns():
+    # longest names first, so "Mirpur DOHS" wins over "Mirpur"
+    patterns = []
+    for place in gazetteer():
+        for name in [place.name, *place.aliases]:
+            pattern = re.compile(r"\b%s\b" % re.escape(name.lower()))
+            patterns.append((len(name), pattern, place))
+    patterns.sort(key=lambda item: -item[0])
+    return [(pattern, place) for _, pattern, place in patterns]
+
+
+def find_place(text, city=None):
+    text = (text or "").lower()
+    city = (city or "").strip().lower()
+
+    matches = [place for pattern, place in name_patterns() if pattern.search(text)]
+
+    # a known city limits matches to its own areas ("Mirpur Road" in
+    # Chattogram is not Mirpur, Dhaka)
+    if city and any(place.city.lower() == city for place in gazetteer()):
+        matches = [place for place in matches if place.city.lower() == city]
+
+    return matches[0] if matches else None
+
+
+def geocode(address, city):
+    # an area named in the address first, then the city itself
+    place = find_place(address, city) or find_place(city)
+    if place is None:
+        return None
+    return place.latitude, place.longitude
+
+
+def locate(prop):
+    # sets latitude, longitude and geohash; what the geocode_property signal
+    # does on save, for properties created with bulk_create
+    point = geocode(prop.address, prop.city)
+    prop.latitude, prop.longitude = point or (None, None)
+    prop.geohash = geohash_encode(*point) if point else ""
+
+
+# geohash
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = bits * 2 + 1
+                lon_range[0] = mid
+            else:
+                bits = bits * 2
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = bits * 2 + 1
+                lat_range[0] = mid
+            else:
+                bits = bits * 2
+                lat_range[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def cell_size(precision):
+    # (lat degrees, lon degrees) covered by one cell
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def next_geohash(cell):
+    # the cell that sorts right after this one at the same precision
+    chars = list(cell)
+    for i in range(len(chars) - 1, -1, -1):
+        index = BASE32.index(chars[i])
+        if index < len(BASE32) - 1:
+            chars[i] = BASE32[index + 1]
+            return "".join(chars)
+        chars[i] = BASE32[0]
+    return None
+
+
+def covering_cells(min_lat, min_lon, max_lat, max_lon):
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        rows = math.floor(max_lat / lat_step) - math.floor(min_lat / lat_step) + 1
+        cols = math.floor(max_lon / lon_step) - math.floor(min_lon / lon_step) + 1
+        if rows * cols <= MAX_SEARCH_CELLS:
+            break
+
+    cells = set()
+    for row in range(rows):
+        lat = min(min_lat + row * lat_step, max_lat)
+        for col in range(cols):
+            lon = min(min_lon + col * lon_step, max_lon)
+            cells.add(geohash_encode(lat, lon, precision))
+    # the far corner can fall in a cell the stepping skipped
+    cells.add(geohash_encode(max_lat, max_lon, precision))
+    return sorted(cells)
+
+
+def geohash_ranges(min_lat, min_lon, max_lat, max_lon):
+    # [(gte, lt)] ranges on the geohash column; neighbouring cells that
+    # sort next to each other are merged into one range
+    ranges = []
+    for cell in covering_cells(min_lat, min_lon, max_lat, max_lon):
+        if ranges and next_geohash(ranges[-1][1]) == cell:
+            ranges[-1][1] = cell
+        else:
+            ranges.append([cell, cell])
+    return [(first, last + "~") for first, last in ranges]
+
+
+# distances
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    lon_delta = math.degrees(radius_km / (EARTH_RADIUS_KM * max(math.cos(math.radians(latitude)), 1e-6)))
+    return (
+        max(latitude - lat_delta, -90.0),
+        max(longitude - lon_delta, -180.0),
+        min(latitude + lat_delta, 90.0),
+        min(longitude + lon_delta, 180.0),
+    )
+
+
+# search
+
+def within_box(queryset, min_lat, min_lon, max_lat, max_lon):
+    # geohash ranges keep the scan on the index; the lat/lon conditions
+    # drop the parts of the edge cells that fall outside the box
+    cells = Q()
+    for low, high in geohash_ranges(min_lat, min_lon, max_lat, max_lon):
+        cells |= Q(geohash__gte=low, geohash__lt=high)
+    return queryset.filter(
+        cells,
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lon, longitude__lte=max_lon,
+    )
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    # [(distance_km, obj)] nearest first, exact distance checked here
+    found = []
+    for obj in within_box(queryset, *bounding_box(latitude, longitude, radius_km)):
+        distance = haversine_km(latitude, longitude, obj.latitude, obj.longitude)
+        if distance <= radius_km:
+            found.append((distance, obj))
+    found.sort(key=lambda item: item[0])
+    return found
@@ -0,0 +1,548 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from PIL import Image
+
+from . import activity, facets, geo, jobs, similarity
+from .models import (
+    ImportRun, Property, PropertyImage, User, missing_image_files, release_unsaved_images, retain_image_blobs,
+)
+from .storage import property_image_storage
+
+
+# bulk imports from CSV or JSONL: users, and properties with their images
+#
+# rows are streamed from the file and handled a batch at a time; a row
+# that fails is reported by its row number and skipped, the rest of the
+# file still loads. Each batch commits in one transaction together with
+# the run's position in the file, so a run that stops half way (or its
+# job, which is retried) carries on after the last committed row.
+#
+# users: two queries per batch find usernames and emails that are
+# already taken, the passwords are hashed across a process pool (PBKDF2 is
+# CPU bound at ~100 ms a password, so threads would not help) and the
+# batch goes in with one bulk_create. Of the User post_save handlers, the
+# seller page version ignores new users and a new user has no cached login
+# to drop, so nothing needs replaying.
+#
+# properties: the images come from a zip that is never extracted; a
+# thread pool streams each member through a temporary file (decompressing,
+# hashing and writing release the GIL) into the content-addressed storage.
+# Properties and images then go in with bulk_create, which sends no
+# signals, so the batch does what the handlers in models.py would: it
+# geocodes the properties, retains the image blobs, moves the listing facet
+# counts, queues the similar-listing refresh and marks the sellers'
+# summaries dirty. Images stored for rows that are dropped, or for a batch
+# that does not commit, are released again.
+
+
+USER_FIELDS = ("username", "email", "password", "role", "first_name", "last_name", "phone_number", "address")
+
+PROPERTY_FIELDS = ("seller", "title", "address", "city", "property_type", "price", "description", "images")
+
+IMPORT_ROLES = ("SELLER", "TENANT", "AGENT")
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+# image bytes kept in memory before the temporary file spills to disk
+SPOOL_SIZE = 1024 * 1024
+
+
+class ImportFileError(Exception):
+    pass
+
+
+class RowError(Exception):
+    pass
+
+
+class ImportResult:
+    def __init__(self, workers=1, run=None):
+        self.workers = workers
+        self.rows = 0
+        self.position = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.previous_seconds = 0.0
+        self.started = time.monotonic()
+
+        # a resumed run keeps its counts
+        if run is not None:
+            self.rows, self.position = run.rows, run.position
+            self.imported, self.failed, self.errors = run.imported, run.failed, list(run.errors)
+            self.previous_seconds = run.seconds
+
+    def error(self, row, message):
+        self.failed += 1
+        if len(self.errors) < settings.IMPORT_MAX_ERRORS:
+            self.errors.append([row, message])
+
+    @property
+    def seconds(self):
+        return self.previous_seconds + time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        seconds = self.seconds
+        return self.rows / seconds if seconds else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.imported} imported, {self.failed} failed of {self.rows} rows "
+            f"in {self.seconds:.1f}s ({self.rate:.0f} rows/s, {self.workers} workers)"
+        )
+
+
+def file_format(name):
+    ext = os.path.splitext(name)[1].lower()
+    if ext not in FORMATS:
+        raise ImportFileError("Use a .csv or .jsonl file.")
+    return FORMATS[ext]
+
+
+def read_rows(f, fmt):
+    # yields (row number, dict or None, error); the file is read line by
+    # line, never all at once
+    text = f if isinstance(f, io.TextIOBase) else io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "Each line must be a JSON object."
+            continue
+        yield number, row, None
+
+
+def batches(f, fmt, clean, result, batch_size):
+    # yields lists of (row number, cleaned values), skipping the rows a
+    # resumed run already committed; result.position is the number of rows
+    # read, bad ones included, when a batch is handed out. The last batch
+    # may be empty (trailing bad rows still move the position).
+    batch = []
+    for index, (number, row, error) in enumerate(read_rows(f, fmt)):
+        if index < result.position:
+            continue
+        result.rows += 1
+        result.position = index + 1
+
+        if error is None:
+            try:
+                batch.append((number, clean(row)))
+            except RowError as e:
+                error = str(e)
+        if error is not None:
+            result.error(number, error)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    yield batch
+
+
+# users
+
+def clean_user(row):
+    values = {field: str(row.get(field) or "").strip() for field in USER_FIELDS}
+
+    if not values["username"]:
+        raise RowError("Username is required.")
+    if len(values["username"]) > 150:
+        raise RowError("Username is longer than 150 characters.")
+    try:
+        UnicodeUsernameValidator()(values["username"])
+        validate_email(values["email"])
+    except ValidationError as e:
+        raise RowError(f"{e.messages[0]} ({values['username']!r}, {values['email']!r})")
+
+    if not values["password"]:
+        raise RowError("Password is required.")
+    values["role"] = values["role"].upper()
+    if values["role"] not in IMPORT_ROLES:
+        raise RowError(f"Role must be one of {', '.join(IMPORT_ROLES)}.")
+    if len(values["phone_number"]) > 15:
+        raise RowError("Phone number is longer than 15 characters.")
+    if len(values["first_name"]) > 150 or len(values["last_name"]) > 150:
+        raise RowError("Names are limited to 150 characters.")
+
+    values["phone_number"] = values["phone_number"] or None
+    values["address"] = values["address"] or None
+    return values
+
+
+def worker_pool(workers):
+    # spawn, not fork: imports also run inside job worker threads, and
+    # each child sets Django up for itself
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    )
+
+
+def hash_passwords(pool, passwords, workers=1):
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    chunk = max(1, len(passwords) // (workers * 4))
+    return list(pool.map(make_password, passwords, chunksize=chunk))
+
+
+def insert_users(batch, pool, result, checkpoint):
+    # batch: [(row number, cleaned values)]
+    taken_names = set(User.objects.filter(
+        username__in=[values["username"] for _, values in batch]
+    ).values_list("username", flat=True))
+    taken_emails = set(User.objects.filter(
+        email__in=[values["email"] for _, values in batch]
+    ).values_list("email", flat=True))
+
+    rows = []
+    for number, values in batch:
+        if values["username"] in taken_names:
+            result.error(number, f"Username {values['username']!r} is already taken.")
+        elif values["email"] in taken_emails:
+            result.error(number, f"Email {values['email']!r} is already registered.")
+        else:
+            taken_names.add(values["username"])
+            taken_emails.add(values["email"])
+            rows.append((number, values))
+
+    hashes = hash_passwords(pool, [values["password"] for _, values in rows], result.workers)
+    users = [User(**{**values, "password": password}) for (_, values), password in zip(rows, hashes)]
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+            result.imported += len(users)
+        except IntegrityError:
+            # someone registered one of the names since the check; one at a time
+            for (number, values), user in zip(rows, users):
+                user.pk = None
+                try:
+                    with transaction.atomic():
+                        user.save(force_insert=True)
+                    result.imported += 1
+                except IntegrityError:
+                    result.error(number, f"Username {values['username']!r} or its email is already taken.")
+        checkpoint(result)
+
+
+def import_users(f, fmt, workers=None, batch_size=None, checkpoint=None, result=None):
+    # f: an open file (binary or text); checkpoint(result) runs inside each
+    # batch's transaction
+    workers = workers or settings.IMPORT_WORKERS or os.cpu_count() or 1
+    result = result or ImportResult()
+    result.workers = workers
+
+    pool = worker_pool(workers)
+    try:
+        for batch in batches(f, fmt, clean_user, result, batch_size or settings.IMPORT_BATCH_SIZE):
+            insert_users(batch, pool, result, checkpoint or (lambda result: None))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return result
+
+
+def hash_rate(workers, sample=200):
+    # passwords hashed per second with this many workers
+    passwords = [f"password-{i}" for i in range(sample)]
+    pool = worker_pool(workers)
+    try:
+        # start the children before timing
+        hash_passwords(pool, passwords[:workers], workers)
+        started = time.monotonic()
+        hash_passwords(pool, passwords, workers)
+        return sample / (time.monotonic() - started)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+# properties
+
+class ImageArchive:
+    # the images zip; only its directory is held in memory, and each worker
+    # thread reads members through its own ZipFile (one is not safe to
+    # share between threads)
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.opened = []
+        self.lock = threading.Lock()
+        try:
+            with zipfile.ZipFile(path) as archive:
+                self.sizes = {info.filename: info.file_size for info in archive.infolist() if not info.is_dir()}
+        except (OSError, zipfile.BadZipFile) as e:
+            raise ImportFileError(f"Cannot read the images zip: {e}")
+
+    def zip(self):
+        archive = getattr(self.local, "archive", None)
+        if archive is None:
+            archive = self.local.archive = zipfile.ZipFile(self.path)
+            with self.lock:
+                self.opened.append(archive)
+        return archive
+
+    def store(self, member):
+        # -> the stored (content-addressed) name
+        if os.path.splitext(member)[1].lower() not in IMAGE_EXTENSIONS:
+            raise RowError(f"{member}: not an image file.")
+        if self.sizes[member] > settings.CHUNKED_UPLOAD_MAX_FILE_SIZE:
+            raise RowError(f"{member}: larger than {settings.CHUNKED_UPLOAD_MAX_FILE_SIZE} bytes.")
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as tmp:
+            try:
+                with self.zip().open(member) as source:
+                    shutil.copyfileobj(source, tmp, 64 * 1024)
+                tmp.seek(0)
+                Image.open(tmp).verify()
+            except (zipfile.BadZipFile, OSError, SyntaxError, ValueError):
+                raise RowError(f"{member}: not a readable image.")
+            tmp.seek(0)
+            return property_image_storage.save(
+                posixpath.join("property_images", posixpath.basename(member)), File(tmp),
+            )
+
+    def close(self):
+        for archive in self.opened:
+            archive.close()
+
+
+def clean_property(row, archive):
+    values = {field: str(row.get(field) or "").strip() for field in PROPERTY_FIELDS if field != "images"}
+
+    if not values["seller"]:
+        raise RowError("Seller (username) is required.")
+    for field, limit in (("title", 100), ("address", None), ("city", 50)):
+        if not values[field]:
+            raise RowError(f"{field.capitalize()} is required.")
+        if limit and len(values[field]) > limit:
+            raise RowError(f"{field.capitalize()} is longer than {limit} characters.")
+
+    values["property_type"] = values["property_type"].upper()
+    if values["property_type"] not in dict(Property.PROPERTY_TYPES):
+        raise RowError("Property type must be SELL or RENT.")
+    try:
+        values["price"] = Decimal(values["price"].replace(",", "")).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise RowError(f"Price {values['price']!r} is not a number.")
+    if not Decimal(0) <= values["price"] < Decimal(10) ** 13:
+        raise RowError("Price is out of range.")
+
+    # "a.jpg|b.jpg" in CSV, a list or the same string in JSONL
+    images = row.get("images") or []
+    if isinstance(images, str):
+        images = images.split("|")
+    values["images"] = [str(name).strip() for name in images if str(name).strip()]
+    missing = [name for name in values["images"] if name not in archive.sizes]
+    if missing:
+        raise RowError(f"{missing[0]} is not in the images zip.")
+    return values
+
+
+def insert_properties(batch, archive, pool, result, checkpoint):
+    sellers = dict(User.objects.filter(
+        username__in={values["seller"] for _, values in batch}, role="SELLER",
+    ).values_list("username", "id"))
+
+    rows = []
+    for number, values in batch:
+        if values["seller"] in sellers:
+            rows.append((number, values))
+        else:
+            result.error(number, f"No seller with username {values['seller']!r}.")
+
+    # every image of the batch at once, across the pool
+    futures = {
+        member: pool.submit(archive.store, member)
+        for member in {member for _, values in rows for member in values["images"]}
+    }
+    stored, broken = {}, {}
+    for member, future in futures.items():
+        try:
+            stored[member] = future.result()
+        except RowError as e:
+            broken[member] = str(e)
+
+    properties, members = [], []
+    for number, values in rows:
+        bad = [broken[member] for member in values["images"] if member in broken]
+        if bad:
+            result.error(number, bad[0])
+            continue
+        prop = Property(
+            seller_id=sellers[values["seller"]],
+            title=values["title"],
+            address=values["address"],
+            city=values["city"],
+            property_type=values["property_type"],
+            price=values["price"],
+            description=values["description"],
+        )
+        geo.locate(prop)
+        properties.append(prop)
+        members.append(values["images"])
+
+    try:
+        with transaction.atomic():
+            Property.objects.bulk_create(properties)
+            images = PropertyImage.objects.bulk_create([
+                PropertyImage(property=prop, image=stored[member])
+                for prop, names in zip(properties, members)
+                for member in names
+            ])
+
+            # what the Property / PropertyImage signals would have done
+            refs = Counter(image.image.name for image in images)
+            retain_image_blobs(refs)
+            # a file released by someone else since it was stored goes back
+            missing = set(missing_image_files(refs))
+            for member, name in stored.items():
+                if name in missing:
+                    archive.store(member)
+            facets.apply_deltas(facets.tally(
+                (prop.city, prop.property_type, prop.price, prop.status) for prop in properties
+            ))
+            similarity.queue_refresh(prop.pk for prop in properties)
+            activity.mark_dirty(*{prop.seller_id for prop in properties})
+
+            result.imported += len(properties)
+            checkpoint(result)
+    except Exception:
+        # nothing of the batch was saved
+        release_unsaved_images(set(stored.values()))
+        raise
+
+    # the images only dropped rows had
+    release_unsaved_images(set(stored.values()) - set(refs))
+
+
+def import_properties(f, fmt, archive_path, workers=None, batch_size=None, checkpoint=None, result=None):
+    workers = workers or settings.IMPORT_IMAGE_WORKERS or min(32, (os.cpu_count() or 1) * 4)
+    result = result or ImportResult()
+    result.workers = workers
+
+    archive = ImageArchive(archive_path)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        clean = lambda row: clean_property(row, archive)
+        for batch in batches(f, fmt, clean, result, batch_size or settings.IMPORT_BATCH_SIZE):
+            insert_properties(batch, archive, pool, result, checkpoint or (lambda result: None))
+    finally:
+        pool.shutdown()
+        archive.close()
+    return result
+
+
+# runs: uploads imported by a background job, or local files given to the
+# import commands
+
+def save_upload(upload, ext):
+    os.makedirs(settings.IMPORT_ROOT, exist_ok=True)
+    path = os.path.join(settings.IMPORT_ROOT, f"{timezone.now():%Y%m%d%H%M%S}-{os.urandom(4).hex()}{ext}")
+    with open(path, "wb") as out:
+        for chunk in upload.chunks():
+            out.write(chunk)
+    return path
+
+
+def queue_import(kind, upload, created_by, archive=None):
+    from .tasks import run_import
+
+    file_format(upload.name)
+    if kind == "PROPERTIES" and archive is None:
+        raise ImportFileError("Add the zip with the property images.")
+
+    run = ImportRun.objects.create(
+        kind=kind,
+        source=save_upload(upload, os.path.splitext(upload.name)[1].lower()),
+        filename=upload.name[:255],
+        archive=save_upload(archive, ".zip") if archive is not None else "",
+        created_by=created_by,
+    )
+    run_import.delay(run.id)
+    return run
+
+
+def resume_import(run):
+    from .tasks import run_import
+
+    ImportRun.objects.filter(id=run.id).update(status="QUEUED", finished_at=None)
+    run_import.delay(run.id)
+
+
+def uploaded(path):
+    # files saved by save_upload are removed once their run is done
+    return bool(path) and os.path.dirname(os.path.abspath(path)) == os.path.abspath(settings.IMPORT_ROOT)
+
+
+def run_import(run, workers=None, batch_size=None, progress=None):
+    # imports (the rest of) a run's file; progress(result) after each batch
+    ImportRun.objects.filter(id=run.id).update(status="RUNNING")
+    result = ImportResult(run=run)
+
+    def checkpoint(result):
+        ImportRun.objects.filter(id=run.id).update(
+            rows=result.rows, position=result.position, imported=result.imported, failed=result.failed,
+            errors=result.errors, workers=result.workers, seconds=result.seconds,
+        )
+        jobs.heartbeat()
+        if progress:
+            progress(result)
+
+    options = {"workers": workers, "batch_size": batch_size, "checkpoint": checkpoint, "result": result}
+    try:
+        with open(run.source, "rb") as f:
+            if run.kind == "USERS":
+                import_users(f, file_format(run.filename), **options)
+            else:
+                import_properties(f, file_format(run.filename), run.archive, **options)
+    except Exception:
+        ImportRun.objects.filter(id=run.id).update(status="FAILED")
+        raise
+
+    ImportRun.objects.filter(id=run.id).update(status="DONE", finished_at=timezone.now())
+    for path in (run.source, run.archive):
+        if uploaded(path):
+            os.remove(path)
+    return result
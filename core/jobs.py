@@ -0,0 +1,283 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Job
+
+
+# database-backed background jobs
+#
+# @task turns a function into a task; task.delay(...) inserts a Job row,
+# inside the caller's transaction when there is one, so a job never runs
+# for work that was rolled back. The runworkers command runs a pool of
+# workers, each claiming the highest priority ready jobs with a single
+# UPDATE ... RETURNING, which is atomic without any broker. A failed job
+# goes back in the queue with exponential backoff until max_attempts, then
+# stays FAILED with its traceback. Jobs whose worker died are requeued
+# once their lock is older than JOB_LOCK_TIMEOUT, or failed when that was
+# their last attempt; long tasks call heartbeat() at their checkpoints to
+# keep the lock fresh, so a slow run is not mistaken for a dead one.
+
+
+logger = logging.getLogger(__name__)
+
+tasks = {}
+
+# the job this thread is running, for heartbeat()
+_running = threading.local()
+
+
+class Task:
+    def __init__(self, func, name, priority, max_attempts, backoff, unique):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.unique = unique
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<Task {self.name}>"
+
+    def delay(self, *args, **kwargs):
+        return self.enqueue(args, kwargs)
+
+    def enqueue(self, args=(), kwargs=None, priority=None, countdown=0):
+        args, kwargs = list(args), kwargs or {}
+        run_at = timezone.now() + timedelta(seconds=countdown)
+
+        job = Job(
+            name=self.name,
+            args=args,
+            kwargs=kwargs,
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts,
+            run_at=run_at,
+        )
+        if not self.unique:
+            job.save()
+            return job
+
+        # unique tasks: one queued job per set of arguments is enough; one
+        # queued for later is brought forward, so the new work is not held
+        # back until then. The key's partial unique index (QUEUED rows only)
+        # turns a second insert at the same moment into an IntegrityError,
+        # and that request takes the other one's job.
+        job.unique_key = hashlib.sha256(
+            json.dumps([self.name, args, kwargs], sort_keys=True).encode()
+        ).hexdigest()
+        while True:
+            queued = Job.objects.filter(name=self.name, status="QUEUED", args=args, kwargs=kwargs).first()
+            if queued is not None:
+                if queued.run_at > run_at:
+                    Job.objects.filter(id=queued.id, status="QUEUED").update(run_at=run_at)
+                    queued.run_at = run_at
+                return queued
+            try:
+                with transaction.atomic():
+                    job.save()
+                return job
+            except IntegrityError:
+                job.pk = None
+
+
+def task(func=None, *, name=None, priority=0, max_attempts=3, backoff=None, unique=False):
+    # @task or @task(priority=5, max_attempts=5, backoff=10, unique=True)
+    def decorator(func):
+        task_name = name or f"{func.__module__}.{func.__qualname__}"
+        registered = Task(
+            func,
+            task_name,
+            priority,
+            max_attempts,
+            settings.JOB_RETRY_BACKOFF if backoff is None else backoff,
+            unique,
+        )
+        tasks[task_name] = registered
+        return registered
+
+    return decorator(func) if func is not None else decorator
+
+
+def discover():
+    # tasks live in each app's tasks.py
+    autodiscover_modules("tasks")
+
+
+def worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"[:100]
+
+
+def claim(worker, limit=1):
+    # marks up to `limit` ready jobs RUNNING for this worker and returns them
+    table = connection.ops.quote_name(Job._meta.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    queued, running = Job.STATUS_CODES["QUEUED"], Job.STATUS_CODES["RUNNING"]
+    skip_locked = " FOR UPDATE SKIP LOCKED" if connection.features.has_select_for_update_skip_locked else ""
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET status = %s, locked_by = %s, locked_at = %s, attempts = attempts + 1 "
+                f"WHERE id IN ("
+                f"SELECT id FROM {table} WHERE status = %s AND run_at <= %s "
+                f"ORDER BY priority DESC, run_at, id LIMIT %s{skip_locked}"
+                f") RETURNING id",
+                [running, worker, now, queued, now, limit],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+    return list(Job.objects.filter(id__in=ids).order_by("-priority", "run_at", "id")) if ids else []
+
+
+def run(job):
+    registered = tasks.get(job.name)
+    _running.job, _running.beat = job, time.monotonic()
+    try:
+        if registered is None:
+            raise LookupError(f"Unknown task {job.name!r}.")
+        registered.func(*job.args, **job.kwargs)
+    except Exception:
+        fail(job, registered, traceback.format_exc())
+        return False
+    finally:
+        _running.job = None
+
+    finish(job, status="DONE", finished_at=timezone.now(), last_error="")
+    return True
+
+
+def fail(job, registered, error):
+    logger.warning("Job %s #%s failed (attempt %s of %s)", job.name, job.id, job.attempts, job.max_attempts)
+
+    if registered is None or job.attempts >= job.max_attempts:
+        finish(job, status="FAILED", finished_at=timezone.now(), last_error=error)
+        return
+
+    # 1x, 2x, 4x ... the task's backoff
+    delay = registered.backoff * 2 ** (job.attempts - 1)
+    finish(
+        job,
+        status="QUEUED",
+        run_at=timezone.now() + timedelta(seconds=delay),
+        locked_by="",
+        locked_at=None,
+        last_error=error,
+        # a retry does not hold the key: a new job queued meanwhile keeps it
+        unique_key="",
+    )
+
+
+def finish(job, **values):
+    # only while this worker still holds the job: once requeue_stale has
+    # handed it on, the outcome belongs to the worker running it now
+    updated = Job.objects.filter(id=job.id, status="RUNNING", locked_by=job.locked_by).update(**values)
+    if not updated:
+        logger.warning(
+            "Job %s #%s was taken from %s before it finished; its %s result is dropped",
+            job.name, job.id, job.locked_by, values["status"],
+        )
+    return updated
+
+
+def heartbeat():
+    # called by long tasks between batches: moves the running job's lock
+    # forward, at most every JOB_HEARTBEAT_SECONDS; a no-op outside a job
+    job = getattr(_running, "job", None)
+    if job is None or time.monotonic() - _running.beat < settings.JOB_HEARTBEAT_SECONDS:
+        return
+    _running.beat = time.monotonic()
+    Job.objects.filter(id=job.id, status="RUNNING", locked_by=job.locked_by).update(locked_at=timezone.now())
+
+
+def requeue_stale():
+    # RUNNING jobs whose worker stopped without finishing them; the claim
+    # counted the attempt, so one that was on its last attempt fails
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    stale = Job.objects.filter(status="RUNNING", locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status="FAILED", finished_at=timezone.now(), last_error="The worker stopped before the job finished.",
+    )
+    if failed:
+        logger.warning("%s stale job(s) failed after their last attempt", failed)
+    return stale.update(status="QUEUED", locked_by="", locked_at=None, unique_key="")
+
+
+def drain(worker=None, batch_size=1):
+    # runs ready jobs in this thread until none are left; returns how many
+    worker = worker or worker_name()
+    count = 0
+    while True:
+        batch = claim(worker, batch_size)
+        if not batch:
+            return count
+        for job in batch:
+            run(job)
+            count += 1
+
+
+def work(index, batch_size, poll_interval, stop, exit_when_idle=False):
+    # one worker's loop, in a thread or a process of the runworkers pool
+    worker = worker_name(index)
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            if index == 0:
+                requeue_stale()
+
+            ran = drain(worker, batch_size)
+            if not ran:
+                if exit_when_idle:
+                    return
+                stop.wait(poll_interval)
+    finally:
+        connection.close()
+
+
+def run_pool(workers, mode="thread", batch_size=1, poll_interval=None, exit_when_idle=False):
+    poll_interval = settings.JOB_POLL_SECONDS if poll_interval is None else poll_interval
+
+    if mode == "process":
+        import multiprocessing
+
+        # children must not share the parent's database connection
+        connection.close()
+        stop = multiprocessing.Event()
+        pool = [
+            multiprocessing.Process(target=work, args=(i, batch_size, poll_interval, stop, exit_when_idle))
+            for i in range(workers)
+        ]
+    else:
+        stop = threading.Event()
+        pool = [
+            threading.Thread(target=work, args=(i, batch_size, poll_interval, stop, exit_when_idle), daemon=True)
+            for i in range(workers)
+        ]
+
+    for worker in pool:
+        worker.start()
+    try:
+        while any(worker.is_alive() for worker in pool):
+            for worker in pool:
+                worker.join(timeout=0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for worker in pool:
+            worker.join()
+
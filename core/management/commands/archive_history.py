@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core import archive
+
+
+class Command(BaseCommand):
+    help = "Move rejected visits and cancelled or completed bookings (with their payments) older than the retention window to the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Retention window (ARCHIVE_RETENTION_DAYS).")
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per transaction (ARCHIVE_BATCH_SIZE).")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the rows that are due.")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            due = archive.due_counts(options["days"])
+            self.stdout.write(f"{due['visits']} visits and {due['bookings']} bookings are due.")
+            return
+
+        def progress(result):
+            self.stdout.write(f"  {result}")
+
+        result = archive.archive(options["days"], options["batch_size"], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"{str(result).capitalize()}."))
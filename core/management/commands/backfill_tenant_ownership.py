@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.activity import mark_dirty
+from core.models import Booking, Payment, TenantOwnership
+
+
+class Command(BaseCommand):
+    help = "Create the TenantOwnership rows behind \"My Properties\" for purchases made before the table existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+
+        # completed bookings that have an approved payment but no ownership row
+        bookings = Booking.objects.filter(
+            status="COMPLETED",
+            payments__status="APPROVED",
+            ownership__isnull=True,
+        ).distinct().order_by("id").values_list("id", "tenant_id", "property_id")
+
+        created = 0
+        batch = []
+        for row in bookings.iterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                created += self.create_rows(batch)
+                batch = []
+        if batch:
+            created += self.create_rows(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created} ownership rows."))
+
+    def create_rows(self, batch):
+        # first approved payment of each booking, like the old view picked
+        payments = {}
+        for payment in Payment.objects.filter(
+            booking_id__in=[booking_id for booking_id, _, _ in batch],
+            status="APPROVED",
+        ).order_by("-id"):
+            payments[payment.booking_id] = payment
+
+        rows = [
+            TenantOwnership(
+                tenant_id=tenant_id,
+                property_id=property_id,
+                booking_id=booking_id,
+                payment=payments[booking_id],
+                amount=payments[booking_id].amount,
+                purchased_at=payments[booking_id].approved_at or payments[booking_id].created_at,
+            )
+            for booking_id, tenant_id, property_id in batch
+        ]
+
+        # ignore_conflicts skips rows another process added meanwhile, and
+        # bulk_create sends no signals for the tenants' summaries
+        booking_ids = [row.booking_id for row in rows]
+        with transaction.atomic():
+            before = set(TenantOwnership.objects.filter(booking_id__in=booking_ids).values_list("id", flat=True))
+            TenantOwnership.objects.bulk_create(rows, ignore_conflicts=True)
+            created = TenantOwnership.objects.filter(booking_id__in=booking_ids).exclude(id__in=before)
+            mark_dirty(*created.values_list("tenant_id", flat=True).distinct())
+            return created.count()
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, OuterRef, Subquery
+
+from core.models import Property, VisitRequest, Booking, Payment
+
+
+class Command(BaseCommand):
+    help = "Check that the seller copied onto visits, bookings and payments matches the property's seller."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true",
+                            help="Rewrite the rows that disagree instead of only reporting them.")
+
+    def handle(self, *args, **options):
+        property_seller = Property.objects.filter(id=OuterRef("property_id")).values("seller_id")[:1]
+        booking_property_seller = Property.objects.filter(
+            bookings=OuterRef("booking_id")
+        ).values("seller_id")[:1]
+
+        checks = [
+            ("visit requests", VisitRequest.objects.exclude(seller_id=F("property__seller_id")), property_seller),
+            ("bookings", Booking.objects.exclude(seller_id=F("property__seller_id")), property_seller),
+            ("payments", Payment.objects.exclude(seller_id=F("booking__property__seller_id")), booking_property_seller),
+        ]
+
+        mismatched = 0
+        for label, rows, correct_seller in checks:
+            ids = list(rows.values_list("id", flat=True))
+            if not ids:
+                self.stdout.write(f"{label}: ok")
+                continue
+
+            mismatched += len(ids)
+            sample = ", ".join(str(i) for i in ids[:10])
+            self.stdout.write(self.style.WARNING(f"{label}: {len(ids)} with the wrong seller (e.g. ids {sample})"))
+
+            if options["fix"]:
+                for start in range(0, len(ids), 500):
+                    rows.model.objects.filter(id__in=ids[start:start + 500]).update(
+                        seller_id=Subquery(correct_seller)
+                    )
+                self.stdout.write(f"{label}: fixed")
+
+        if mismatched and not options["fix"]:
+            raise CommandError(f"{mismatched} rows have the wrong seller; run again with --fix.")
+
+        self.stdout.write(self.style.SUCCESS("Seller copies are consistent."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = "Send the due notification emails from the outbox now (normally done by the deliver_outbox job)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        outbox.requeue_stale()
+        totals = outbox.Delivery()
+        while True:
+            result = outbox.deliver(options["batch_size"])
+            if not (result.sent or result.merged or result.deferred or result.failed):
+                break
+            for field in ("sent", "merged", "deferred", "failed"):
+                setattr(totals, field, getattr(totals, field) + getattr(result, field))
+
+        self.stdout.write(self.style.SUCCESS(f"Outbox: {totals}."))
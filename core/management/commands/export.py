@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import exports
+
+
+class Command(BaseCommand):
+    help = "Stream completed deals, payments or bookings to a CSV or JSONL file (or stdout), oldest first."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(exports.EXPORTS))
+        parser.add_argument("--format", choices=list(exports.FORMATS), default="csv")
+        parser.add_argument("--from", dest="start", help="First day to include (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="end", help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument("--output", "-o", help="File to write; defaults to stdout.")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Rows per fetch (EXPORT_CHUNK_SIZE).")
+
+    def handle(self, *args, **options):
+        try:
+            start = exports.parse_day(options["start"], "--from")
+            end = exports.parse_day(options["end"], "--to")
+        except exports.ExportError as e:
+            raise CommandError(str(e))
+
+        chunks = exports.stream(
+            options["kind"], options["format"], start, end, chunk_size=options["chunk_size"],
+        )
+
+        if not options["output"]:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+
+        with open(options["output"], "w", encoding="utf-8", newline="") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Exported {options['kind']} to {options['output']}."))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import geo
+from core.models import Property
+
+
+class Command(BaseCommand):
+    help = "Fill in latitude, longitude and geohash from the bundled gazetteer for properties that have none."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Geocode every property again, not only missing ones.")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+
+        properties = Property.objects.order_by("id").only("id", "address", "city", "latitude", "longitude", "geohash")
+        if not options["all"]:
+            properties = properties.filter(latitude__isnull=True)
+
+        located = missed = 0
+        batch = []
+        for prop in properties.iterator(chunk_size=chunk_size):
+            point = geo.geocode(prop.address, prop.city)
+            if point is None:
+                missed += 1
+                continue
+            prop.latitude, prop.longitude = point
+            prop.geohash = geo.geohash_encode(*point)
+            batch.append(prop)
+            if len(batch) >= chunk_size:
+                located += self.save_batch(batch)
+                batch = []
+        if batch:
+            located += self.save_batch(batch)
+
+        # bulk_update skips the save signals, so cached pages keep their
+        # version; coordinates are not shown on the detail page
+        self.stdout.write(self.style.SUCCESS(f"Geocoded {located} properties, {missed} addresses not found."))
+
+    def save_batch(self, batch):
+        with transaction.atomic():
+            Property.objects.bulk_update(batch, ["latitude", "longitude", "geohash"])
+        return len(batch)
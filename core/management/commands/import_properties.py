@@ -0,0 +1,72 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import imports
+from core.models import ImportRun
+
+
+class Command(BaseCommand):
+    help = (
+        "Import properties from a CSV or JSONL manifest and a zip of their images, in batches. "
+        "A run that stops can be continued with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest", nargs="?",
+                            help="Columns: " + ", ".join(imports.PROPERTY_FIELDS) + " (images: zip member names, '|' separated).")
+        parser.add_argument("--images", help="Zip with the image files named in the manifest.")
+        parser.add_argument("--resume", type=int, metavar="RUN_ID", help="Continue a stopped import run.")
+        parser.add_argument("--workers", type=int, default=None, help="Image threads (IMPORT_IMAGE_WORKERS).")
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per batch (IMPORT_BATCH_SIZE).")
+
+    def handle(self, *args, **options):
+        if options["resume"]:
+            run = ImportRun.objects.filter(id=options["resume"], kind="PROPERTIES").first()
+            if run is None:
+                raise CommandError(f"No property import run {options['resume']}.")
+            if run.status == "DONE":
+                raise CommandError(f"Import run {run.id} is already done.")
+            self.stdout.write(f"Resuming import run {run.id} after row {run.position}.")
+        else:
+            run = self.new_run(options["manifest"], options["images"])
+            self.stdout.write(f"Import run {run.id}.")
+
+        def progress(result):
+            self.stdout.write(f"  {result.rows} rows, {result.imported} imported ({result.rate:.0f} rows/s)")
+
+        try:
+            result = imports.run_import(
+                run, workers=options["workers"], batch_size=options["batch_size"], progress=progress,
+            )
+        except imports.ImportFileError as e:
+            raise CommandError(str(e))
+        except Exception as e:
+            run.refresh_from_db()
+            raise CommandError(
+                f"Import stopped after row {run.position} ({e!r}); continue with --resume {run.id}."
+            )
+
+        for row, message in sorted(result.errors):
+            self.stderr.write(f"row {row}: {message}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more errors")
+        self.stdout.write(self.style.SUCCESS(f"Properties: {result}."))
+
+    def new_run(self, manifest, images):
+        if not manifest or not images:
+            raise CommandError("Give a manifest and --images, or --resume RUN_ID.")
+        for path in (manifest, images):
+            if not os.path.exists(path):
+                raise CommandError(f"{path} does not exist.")
+        try:
+            imports.file_format(manifest)
+        except imports.ImportFileError as e:
+            raise CommandError(str(e))
+
+        return ImportRun.objects.create(
+            kind="PROPERTIES",
+            source=os.path.abspath(manifest),
+            filename=os.path.basename(manifest),
+            archive=os.path.abspath(images),
+        )
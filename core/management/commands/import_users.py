@@ -0,0 +1,54 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import imports
+
+
+class Command(BaseCommand):
+    help = "Import sellers, tenants and agents from a CSV or JSONL file, hashing passwords across a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="CSV (with a header row) or JSONL file.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--workers", type=int, default=None, help="Hashing processes (IMPORT_WORKERS, else one per core).")
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per bulk insert (IMPORT_BATCH_SIZE).")
+        parser.add_argument("--scaling", action="store_true",
+                            help="Only measure password hashing throughput for 1 worker up to one per core.")
+
+    def handle(self, *args, **options):
+        if options["scaling"]:
+            return self.scaling()
+
+        path = options["path"]
+        if not path:
+            raise CommandError("A file to import is required.")
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        try:
+            fmt = options["format"] or imports.file_format(path)
+        except imports.ImportFileError as e:
+            raise CommandError(str(e))
+
+        def progress(result):
+            self.stdout.write(f"  {result.rows} rows, {result.imported} imported ({result.rate:.0f} rows/s)")
+
+        with open(path, "rb") as f:
+            result = imports.import_users(
+                f, fmt, workers=options["workers"], batch_size=options["batch_size"], checkpoint=progress,
+            )
+
+        for row, message in sorted(result.errors):
+            self.stderr.write(f"row {row}: {message}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more errors")
+        self.stdout.write(self.style.SUCCESS(f"Users: {result}."))
+
+    def scaling(self):
+        cores = os.cpu_count() or 1
+        counts = sorted({1, *(2 ** i for i in range(1, cores.bit_length())), cores})
+        base = None
+        for workers in counts:
+            rate = imports.hash_rate(workers)
+            base = base or rate
+            self.stdout.write(f"{workers:>3} workers: {rate:7.1f} passwords/s ({rate / base:.1f}x)")
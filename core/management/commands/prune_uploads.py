@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core import uploads
+
+
+class Command(BaseCommand):
+    help = "Remove chunked uploads left unfinished, with their part files, and part files whose upload is gone."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=None, help="Idle time before an upload is removed (CHUNKED_UPLOAD_EXPIRY_HOURS).")
+
+    def handle(self, *args, **options):
+        sessions, files = uploads.prune(options["hours"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {sessions} upload(s) and {files} part file(s)."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.activity import refresh_summary
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-user activity summaries behind the seller and tenant dashboards."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids",
+                            help="Only rebuild these user ids (repeatable).")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(role__in=["SELLER", "TENANT"]).order_by("id")
+        if options["user_ids"]:
+            users = users.filter(id__in=options["user_ids"])
+
+        count = 0
+        for user_id in users.values_list("id", flat=True).iterator(chunk_size=options["chunk_size"]):
+            refresh_summary(user_id)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} activity summaries."))
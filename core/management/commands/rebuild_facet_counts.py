@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.facets import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recount the listing filter facets (city, type, price bucket) from the available properties."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rows = rebuild(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} facet counts."))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import similarity
+
+
+class Command(BaseCommand):
+    help = "Recompute the similar listings shown on the property page: queued changes only, or everything with --all."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rebuild every list instead of draining the queue.")
+        parser.add_argument("--top-k", type=int, default=similarity.TOP_K)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options["all"]:
+            count = similarity.rebuild(k=options["top_k"])
+        else:
+            count = similarity.refresh(k=options["top_k"])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {count} similar-property lists in {elapsed:.1f}s."))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from core.media import is_hashed_name
+from core.models import ImageBlob, PropertyImage
+from core.storage import property_image_storage
+
+
+class Command(BaseCommand):
+    help = "Move flat-named property images into content-addressed storage and rebuild image reference counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        storage = property_image_storage
+        moved = 0
+        missing = 0
+        legacy_names = set()
+
+        images = PropertyImage.objects.only("id", "image").order_by("id")
+        for img in images.iterator(chunk_size=options["chunk_size"]):
+            name = img.image.name
+            if not name or is_hashed_name(name):
+                continue
+            if not storage.exists(name):
+                missing += 1
+                continue
+
+            with storage.open(name) as f:
+                new_name = storage.save(name, f)
+
+            # update() skips the refcount signals; counts are rebuilt below
+            PropertyImage.objects.filter(pk=img.pk).update(image=new_name)
+            legacy_names.add(name)
+            moved += 1
+
+        with transaction.atomic():
+            ImageBlob.objects.all().delete()
+            counts = PropertyImage.objects.exclude(image="").values("image").annotate(n=Count("id"))
+            ImageBlob.objects.bulk_create(
+                [ImageBlob(name=row["image"], ref_count=row["n"]) for row in counts.iterator()],
+                batch_size=options["chunk_size"],
+            )
+
+        # old copies are not referenced by any row any more
+        for name in legacy_names:
+            storage.delete(name)
+
+        blobs = ImageBlob.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {moved} images ({missing} missing files), {blobs} unique files referenced."
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = "Run background job workers: a pool of threads or processes claiming jobs from the jobs table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+        parser.add_argument("--batch-size", type=int, default=1, help="Jobs claimed per UPDATE.")
+        parser.add_argument("--poll-interval", type=float, default=None,
+                            help="Seconds to wait when the queue is empty (JOB_POLL_SECONDS).")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--workers and --batch-size must be at least 1.")
+
+        jobs.discover()
+        self.stdout.write(
+            f"Starting {options['workers']} {options['mode']} worker(s) for {len(jobs.tasks)} task(s)."
+        )
+        jobs.run_pool(
+            options["workers"],
+            mode=options["mode"],
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+            exit_when_idle=options["once"],
+        )
+        self.stdout.write(self.style.SUCCESS("Workers stopped."))
@@ -0,0 +1,187 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+
+# serves uploaded media (property images) outside of DEBUG
+#
+# - streams the file with FileResponse (sendfile when the wsgi server has it)
+# - answers single "Range: bytes=a-b" requests with 206
+# - answers If-None-Match / If-Modified-Since with 304
+# - content-hashed names never change, so they get an immutable cache header
+# - with MEDIA_ACCEL_REDIRECT_PREFIX set, nginx sends the body instead of python
+
+
+# a file name whose stem is a hex digest is content-addressed
+HASHED_NAME_RE = re.compile(r"^[0-9a-f]{32,}$")
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def is_hashed_name(path):
+    stem = os.path.splitext(posixpath.basename(path))[0]
+    return bool(HASHED_NAME_RE.match(stem))
+
+
+def file_etag(path, stat):
+    # the digest is already a perfect validator for hashed names
+    if is_hashed_name(path):
+        return quote_etag(os.path.splitext(posixpath.basename(path))[0])
+    return quote_etag("%x-%x" % (stat.st_size, int(stat.st_mtime_ns)))
+
+
+def cache_control(path):
+    if is_hashed_name(path):
+        return "public, max-age=%d, immutable" % settings.MEDIA_CACHE_MAX_AGE
+    return "public, max-age=%d" % settings.MEDIA_DEFAULT_MAX_AGE
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) inclusive for a single byte range, None when the
+    header should be ignored (missing, malformed, multi-range), or False
+    when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # covers "bytes=0-1,5-6" too; serving the whole file is allowed
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        # weak comparison, as RFC 9110 asks for If-None-Match
+        return "*" in tags or etag in tags or ("W/" + etag) in tags
+
+    since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return since is not None and int(mtime) <= since
+
+
+def range_applies(request, etag, mtime):
+    # If-Range: only honour Range when the client's copy is still current
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+class RangeFile:
+    # file-like wrapper that reads at most `length` bytes from `start`
+
+    def __init__(self, f, start, length):
+        self.f = f
+        self.remaining = length
+        f.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+@require_safe
+def serve_media(request, path):
+    path = posixpath.normpath(path).lstrip("/")
+    # raises SuspiciousFileOperation (400) for paths outside MEDIA_ROOT
+    fullpath = safe_join(settings.MEDIA_ROOT, path)
+
+    try:
+        stat = os.stat(fullpath)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("Media file not found")
+    if not os.path.isfile(fullpath):
+        raise Http404("Media file not found")
+
+    size = stat.st_size
+    etag = file_etag(path, stat)
+    content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": cache_control(path),
+        "Accept-Ranges": "bytes",
+    }
+
+    if not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    # nginx handles ranges and the body itself for internal locations
+    accel_prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+    if accel_prefix:
+        response = HttpResponse(content_type=content_type)
+        # a URI: spaces, "?" and "#" in a name must not end or split it
+        response["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + quote(path)
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    byte_range = None
+    if range_applies(request, etag, stat.st_mtime):
+        byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = "bytes */%d" % size
+        return response
+
+    f = open(fullpath, "rb")
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(f, start, length), status=206, content_type=content_type)
+        response["Content-Range"] = "bytes %d-%d/%d" % (start, end, size)
+        response["Content-Length"] = length
+    else:
+        response = FileResponse(f, content_type=content_type)
+
+    response.block_size = STREAM_BLOCK_SIZE
+    for key, value in headers.items():
+        response[key] = value
+    return response
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.27 on 2026-10-19 02:41
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_images(apps, schema_editor):
+    # existing flat-named files get a blob row too, so deleting the last
+    # row that uses them cleans the file up
+    PropertyImage = apps.get_model("core", "PropertyImage")
+    ImageBlob = apps.get_model("core", "ImageBlob")
+
+    counts = PropertyImage.objects.exclude(image="").values("image").annotate(n=Count("id"))
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=row["image"], ref_count=row["n"]) for row in counts],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_merge_20260102_2025'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='propertyimage',
+            name='image',
+            field=models.ImageField(storage=core.storage.ContentAddressedStorage(), upload_to='property_images/'),
+        ),
+        migrations.RunPython(count_existing_images, migrations.RunPython.noop),
+    ]
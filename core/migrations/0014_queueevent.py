@@ -0,0 +1,25 @@
+# Generated by Django 4.2.27 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueueEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('PAYMENT', 'Payment'), ('VISIT', 'Visit Request'), ('BOOKING', 'Booking')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('status', models.CharField(max_length=10)),
+                ('created', models.BooleanField(default=False)),
+                ('label', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
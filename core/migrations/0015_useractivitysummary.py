@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-19 02:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_queueevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivitySummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('properties_total', models.PositiveIntegerField(default=0)),
+                ('properties_available', models.PositiveIntegerField(default=0)),
+                ('properties_booked', models.PositiveIntegerField(default=0)),
+                ('properties_sold', models.PositiveIntegerField(default=0)),
+                ('properties_inactive', models.PositiveIntegerField(default=0)),
+                ('bookings_received', models.PositiveIntegerField(default=0)),
+                ('visits_received', models.PositiveIntegerField(default=0)),
+                ('payments_received', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('payments_pending', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('visits_pending', models.PositiveIntegerField(default=0)),
+                ('visits_approved', models.PositiveIntegerField(default=0)),
+                ('visits_rejected', models.PositiveIntegerField(default=0)),
+                ('bookings_pending', models.PositiveIntegerField(default=0)),
+                ('bookings_confirmed', models.PositiveIntegerField(default=0)),
+                ('bookings_cancelled', models.PositiveIntegerField(default=0)),
+                ('bookings_completed', models.PositiveIntegerField(default=0)),
+                ('owned_properties', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
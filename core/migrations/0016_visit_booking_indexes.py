@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_useractivitysummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['property', 'status'], name='booking_property_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitrequest',
+            index=models.Index(fields=['tenant', '-created_at'], name='visit_tenant_created_idx'),
+        ),
+    ]
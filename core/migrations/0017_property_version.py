@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_visit_booking_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_property_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantOwnership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purchased_at', models.DateTimeField()),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ownership', to='core.booking')),
+                ('payment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ownership', to='core.payment')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ownerships', to='core.property')),
+                ('tenant', models.ForeignKey(limit_choices_to={'role': 'TENANT'}, on_delete=django.db.models.deletion.CASCADE, related_name='ownerships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant', '-purchased_at'], name='ownership_tenant_purchased_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_tenantownership'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['tenant', '-created_at'], name='booking_tenant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', '-created_at'], name='booking_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', '-approved_at'], name='payment_status_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('seller_amount_sent', True)), fields=['-seller_amount_sent_at'], name='payment_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['status', 'is_featured'], name='property_status_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['seller', '-created_at'], name='property_seller_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role'], name='user_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitrequest',
+            index=models.Index(fields=['property', 'tenant', 'status'], name='visit_property_tenant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitrequest',
+            index=models.Index(fields=['status', '-created_at'], name='visit_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,140 @@
+import core.fields
+from django.db import migrations, models
+
+
+# (model, field, choices, codes, default, legacy values)
+CODED_FIELDS = [
+    (
+        'user', 'role',
+        [('ADMIN', 'Admin'), ('SELLER', 'Seller'), ('TENANT', 'Tenant'), ('AGENT', 'Agent')],
+        {'ADMIN': 1, 'SELLER': 2, 'TENANT': 3, 'AGENT': 4},
+        None,
+        {},
+    ),
+    (
+        'property', 'status',
+        [('AVAILABLE', 'Available'), ('BOOKED', 'Booked'), ('SOLD', 'Sold'), ('INACTIVE', 'Inactive')],
+        {'AVAILABLE': 1, 'BOOKED': 2, 'SOLD': 3, 'INACTIVE': 4},
+        'AVAILABLE',
+        # from 0001_initial
+        {'NOT_AVAILABLE': 'INACTIVE'},
+    ),
+    (
+        'visitrequest', 'status',
+        [('PENDING', 'Pending'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected')],
+        {'PENDING': 1, 'APPROVED': 2, 'REJECTED': 3},
+        'PENDING',
+        {},
+    ),
+    (
+        'booking', 'status',
+        [('PENDING', 'Pending'), ('CONFIRMED', 'Confirmed'), ('CANCELLED', 'Cancelled'), ('COMPLETED', 'Completed')],
+        {'PENDING': 1, 'CONFIRMED': 2, 'CANCELLED': 3, 'COMPLETED': 4},
+        'PENDING',
+        {},
+    ),
+    (
+        'payment', 'status',
+        [('PENDING', 'Pending'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected')],
+        {'PENDING': 1, 'APPROVED': 2, 'REJECTED': 3},
+        'PENDING',
+        {},
+    ),
+]
+
+# indexes that contain one of the converted columns; dropped before the
+# string column goes and created again on the integer one
+STATUS_INDEXES = [
+    ('user', models.Index(fields=['role'], name='user_role_idx')),
+    ('property', models.Index(fields=['status', 'is_featured'], name='property_status_featured_idx')),
+    ('visitrequest', models.Index(fields=['property', 'tenant', 'status'], name='visit_property_tenant_idx')),
+    ('visitrequest', models.Index(fields=['status', '-created_at'], name='visit_status_created_idx')),
+    ('booking', models.Index(fields=['property', 'status'], name='booking_property_status_idx')),
+    ('booking', models.Index(fields=['status', '-created_at'], name='booking_status_created_idx')),
+    ('payment', models.Index(fields=['status', '-approved_at'], name='payment_status_approved_idx')),
+]
+
+
+def copy_to_codes(apps, schema_editor):
+    for model_name, field, choices, codes, default, legacy in CODED_FIELDS:
+        Model = apps.get_model('core', model_name)
+        code_field = field + '_code'
+
+        # the coded field turns the string into its code on write
+        for value in codes:
+            Model.objects.filter(**{field: value}).update(**{code_field: value})
+        for old, new in legacy.items():
+            Model.objects.filter(**{field: old}).update(**{code_field: new})
+
+        # blanks and anything unknown fall back to the default (or "unset")
+        Model.objects.filter(**{code_field + '__isnull': True}).update(**{code_field: default or ''})
+
+
+def copy_to_strings(apps, schema_editor):
+    for model_name, field, choices, codes, default, legacy in CODED_FIELDS:
+        Model = apps.get_model('core', model_name)
+        code_field = field + '_code'
+
+        for value in [*codes, '']:
+            Model.objects.filter(**{code_field: value}).update(**{field: value})
+
+
+def coded_field(choices, codes, default, **kwargs):
+    if default is not None:
+        kwargs['default'] = default
+    return core.fields.CodedChoiceField(choices=choices, codes=codes, **kwargs)
+
+
+def blank_default(model_name, field, choices, default):
+    # a column without a default can only be re-added (when migrating
+    # backwards) if it has one, so give it "" just before it is removed
+    if default is not None:
+        return ()
+    return (
+        migrations.AlterField(
+            model_name=model_name,
+            name=field,
+            field=models.CharField(max_length=10, choices=choices, default=''),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_hot_query_indexes'),
+    ]
+
+    operations = [
+        *[
+            migrations.RemoveIndex(model_name=model_name, name=index.name)
+            for model_name, index in STATUS_INDEXES
+        ],
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name=field + '_code',
+                field=coded_field(choices, codes, None, null=True),
+            )
+            for model_name, field, choices, codes, default, legacy in CODED_FIELDS
+        ],
+        migrations.RunPython(copy_to_codes, copy_to_strings),
+        *[
+            op
+            for model_name, field, choices, codes, default, legacy in CODED_FIELDS
+            for op in (
+                *blank_default(model_name, field, choices, default),
+                migrations.RemoveField(model_name=model_name, name=field),
+                migrations.RenameField(model_name=model_name, old_name=field + '_code', new_name=field),
+                migrations.AlterField(
+                    model_name=model_name,
+                    name=field,
+                    field=coded_field(choices, codes, default),
+                ),
+            )
+        ],
+        *[
+            migrations.AddIndex(model_name=model_name, index=index)
+            for model_name, index in STATUS_INDEXES
+        ],
+    ]
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def copy_sellers(apps, schema_editor):
+    Property = apps.get_model('core', 'Property')
+    VisitRequest = apps.get_model('core', 'VisitRequest')
+    Booking = apps.get_model('core', 'Booking')
+    Payment = apps.get_model('core', 'Payment')
+
+    property_seller = Property.objects.filter(id=OuterRef('property_id')).values('seller_id')[:1]
+    VisitRequest.objects.update(seller_id=Subquery(property_seller))
+    Booking.objects.update(seller_id=Subquery(property_seller))
+
+    booking_seller = Booking.objects.filter(id=OuterRef('booking_id')).values('seller_id')[:1]
+    Payment.objects.update(seller_id=Subquery(booking_seller))
+
+
+def seller_field(related_name, **kwargs):
+    return models.ForeignKey(
+        editable=False,
+        on_delete=django.db.models.deletion.CASCADE,
+        related_name=related_name,
+        to=settings.AUTH_USER_MODEL,
+        **kwargs
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_coded_status_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitrequest',
+            name='seller',
+            field=seller_field('received_visits', null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='seller',
+            field=seller_field('received_bookings', null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='seller',
+            field=seller_field('received_payments', null=True),
+        ),
+        migrations.RunPython(copy_sellers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='visitrequest',
+            name='seller',
+            field=seller_field('received_visits'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='seller',
+            field=seller_field('received_bookings'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='seller',
+            field=seller_field('received_payments'),
+        ),
+        migrations.AddIndex(
+            model_name='visitrequest',
+            index=models.Index(fields=['seller', '-created_at'], name='visit_seller_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['seller', '-created_at'], name='booking_seller_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['seller', 'status', '-seller_amount_sent_at'], name='payment_seller_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['seller', 'status', '-approved_at'], name='payment_seller_approved_idx'),
+        ),
+    ]
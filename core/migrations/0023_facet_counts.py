@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_property_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(blank=True, default='', max_length=50)),
+                ('property_type', models.CharField(blank=True, default='', max_length=10)),
+                ('price_bucket', models.CharField(blank=True, default='', max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('city', 'property_type', 'price_bucket'), name='facet_count_unique'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_facet_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityRefresh',
+            fields=[
+                ('property_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('queued_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarProperty',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='core.property')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.property')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='similarproperty',
+            constraint=models.UniqueConstraint(fields=('property', 'rank'), name='similar_property_rank_unique'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_similar_properties'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitrequest',
+            index=models.Index(fields=['preferred_date', 'agent', 'status'], name='visit_date_agent_idx'),
+        ),
+    ]
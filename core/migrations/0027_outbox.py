@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:11
+
+import core.fields
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50)),
+                ('recipient', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('dedupe_key', models.CharField(max_length=200, unique=True)),
+                ('status', core.fields.CodedChoiceField(choices=[('PENDING', 'Pending'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed')], codes={'FAILED': 4, 'PENDING': 1, 'SENDING': 2, 'SENT': 3}, default='PENDING')),
+                ('send_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'send_after', 'id'], name='outbox_due_idx'), models.Index(fields=['status', 'sent_at'], name='outbox_sent_idx'), models.Index(fields=['recipient', 'sent_at'], name='outbox_recipient_sent_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:17
+
+import core.fields
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', core.fields.CodedChoiceField(choices=[('USERS', 'Users')], codes={'USERS': 1})),
+                ('status', core.fields.CodedChoiceField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], codes={'DONE': 3, 'FAILED': 4, 'QUEUED': 1, 'RUNNING': 2}, default='QUEUED')),
+                ('source', models.CharField(max_length=500)),
+                ('filename', models.CharField(max_length=255)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('imported', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('workers', models.PositiveSmallIntegerField(default=1)),
+                ('seconds', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', '-created_at'], name='import_kind_created_idx')],
+            },
+        ),
+    ]
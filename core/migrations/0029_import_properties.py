@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:26
+
+import core.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_import_runs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importrun',
+            name='archive',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='importrun',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='importrun',
+            name='kind',
+            field=core.fields.CodedChoiceField(choices=[('USERS', 'Users'), ('PROPERTIES', 'Properties')], codes={'PROPERTIES': 2, 'USERS': 1}),
+        ),
+    ]
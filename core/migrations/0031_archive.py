@@ -0,0 +1,104 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:39
+
+import core.fields
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_amounts(apps, schema_editor):
+    TenantOwnership = apps.get_model('core', 'TenantOwnership')
+    Payment = apps.get_model('core', 'Payment')
+
+    amount = Payment.objects.filter(id=OuterRef('payment_id')).values('amount')[:1]
+    TenantOwnership.objects.update(amount=Subquery(amount))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_export_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', core.fields.CodedChoiceField(choices=[('PENDING', 'Pending'), ('CONFIRMED', 'Confirmed'), ('CANCELLED', 'Cancelled'), ('COMPLETED', 'Completed')], codes={'CANCELLED': 3, 'COMPLETED': 4, 'CONFIRMED': 2, 'PENDING': 1})),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='core.property')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_received_bookings', to=settings.AUTH_USER_MODEL)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tenantownership',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+        migrations.RunPython(copy_amounts, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tenantownership',
+            name='booking',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ownership', to='core.booking'),
+        ),
+        migrations.AlterField(
+            model_name='tenantownership',
+            name='payment',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ownership', to='core.payment'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedVisitRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('preferred_date', models.DateField()),
+                ('status', core.fields.CodedChoiceField(choices=[('PENDING', 'Pending'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected')], codes={'APPROVED': 2, 'PENDING': 1, 'REJECTED': 3})),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('agent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_visits', to='core.property')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_received_visits', to=settings.AUTH_USER_MODEL)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_visits', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant', '-created_at'], name='archvisit_tenant_created_idx'), models.Index(fields=['seller'], name='archvisit_seller_idx'), models.Index(fields=['created_at'], name='archvisit_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('platform_cut', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('seller_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('status', core.fields.CodedChoiceField(choices=[('PENDING', 'Pending'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected')], codes={'APPROVED': 2, 'PENDING': 1, 'REJECTED': 3})),
+                ('approved_at', models.DateTimeField(blank=True, null=True)),
+                ('seller_amount_sent', models.BooleanField(default=False)),
+                ('seller_amount_sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('approved_by_admin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='core.archivedbooking')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_payments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', 'status'], name='archpayment_seller_status_idx'), models.Index(fields=['created_at'], name='archpayment_created_idx'), models.Index(condition=models.Q(('seller_amount_sent', True)), fields=['-seller_amount_sent_at'], name='archpayment_sent_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['tenant', '-created_at'], name='archbooking_tenant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['seller'], name='archbooking_seller_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['created_at'], name='archbooking_created_idx'),
+        ),
+    ]
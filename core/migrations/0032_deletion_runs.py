@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:47
+
+import core.fields
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', core.fields.CodedChoiceField(choices=[('USER', 'User'), ('PROPERTY', 'Property')], codes={'PROPERTY': 2, 'USER': 1})),
+                ('status', core.fields.CodedChoiceField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], codes={'DONE': 3, 'FAILED': 4, 'QUEUED': 1, 'RUNNING': 2}, default='QUEUED')),
+                ('object_id', models.BigIntegerField()),
+                ('label', models.CharField(max_length=255)),
+                ('deleted', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', '-created_at'], name='deletion_kind_created_idx'), models.Index(fields=['kind', 'object_id'], name='deletion_object_idx')],
+            },
+        ),
+    ]
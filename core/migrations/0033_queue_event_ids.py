@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_deletion_runs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='queueevent',
+            name='label',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_queue_event_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='locked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
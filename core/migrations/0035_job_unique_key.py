@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_upload_session_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='unique_key',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'QUEUED'), models.Q(('unique_key', ''), _negated=True)), fields=('unique_key',), name='job_unique_queued'),
+        ),
+    ]
@@ -1,7 +1,15 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_init, pre_delete, pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+
+from .fields import CodedChoiceField
+from .storage import property_image_storage
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -11,7 +19,10 @@ class User(AbstractUser):
     ("AGENT", "Agent"),
     )
 
-    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    # stored codes (core/fields.py); never change an existing code
+    ROLE_CODES = {"ADMIN": 1, "SELLER": 2, "TENANT": 3, "AGENT": 4}
+
+    role = CodedChoiceField(choices=ROLE_CHOICES, codes=ROLE_CODES)
 
     phone_number = models.CharField(
         max_length=15,
@@ -24,9 +35,23 @@ class User(AbstractUser):
         null=True
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # role lists and counts on the admin pages
+            models.Index(fields=["role"], name="user_role_idx"),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.role})"
 
+    def get_session_auth_hash(self):
+        # a user from the login cache carries the hash instead of the
+        # password it is made from (core/user_cache.py), until a password
+        # is set on it
+        if "password" not in self.__dict__ and hasattr(self, "_session_auth_hash"):
+            return self._session_auth_hash
+        return super().get_session_auth_hash()
+
 
 class Property(models.Model):
 
@@ -37,6 +62,8 @@ class Property(models.Model):
         ("INACTIVE", "Inactive"),
     )
 
+    STATUS_CODES = {"AVAILABLE": 1, "BOOKED": 2, "SOLD": 3, "INACTIVE": 4}
+
     PROPERTY_TYPES = (
         ("SELL", "For Sale"),
         ("RENT", "For Rent"),
@@ -63,9 +90,9 @@ class Property(models.Model):
         decimal_places=2
     )
 
-    status = models.CharField(
-        max_length=20,
+    status = CodedChoiceField(
         choices=STATUS_CHOICES,
+        codes=STATUS_CODES,
         default="AVAILABLE"
     )
 
@@ -75,6 +102,33 @@ class Property(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # filled from the address by core/geo.py; the geohash cell backs the
+    # nearby / bounding box search
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default="", editable=False)
+
+    # bumped on every change to the property, its images or its seller;
+    # part of the cache key for the property detail page
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # home page (featured + available) and the tenant listing (available)
+            models.Index(fields=["status", "is_featured"], name="property_status_featured_idx"),
+            # seller pages, newest first
+            models.Index(fields=["seller", "-created_at"], name="property_seller_created_idx"),
+            # nearby search: geohash range scans over available properties
+            models.Index(fields=["status", "geohash"], name="property_status_geohash_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # the signals below read the stored row under a lock and move the
+        # facet counts from it, in the same transaction as the write, so
+        # two saves of one property apply one after the other
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.title} ({self.status})"
 
@@ -85,12 +139,69 @@ class PropertyImage(models.Model):
         related_name="images"
     )
 
-    image = models.ImageField(upload_to="property_images/")
+    # files are named by content hash and shared between rows (see ImageBlob)
+    image = models.ImageField(upload_to="property_images/", storage=property_image_storage)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Image for {self.property.title}"
 
+
+# one row per stored image file, counting the PropertyImage rows using it
+class ImageBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+# resumable chunked upload of one image (see core/uploads.py)
+class UploadSession(models.Model):
+
+    STATUS_CHOICES = (
+        ("ACTIVE", "Active"),
+        ("COMPLETE", "Complete"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions"
+    )
+
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions"
+    )
+
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+
+    # hex sha256 of the whole file, checked on finalize (optional)
+    sha256 = models.CharField(max_length=64, blank=True)
+
+    received = models.PositiveBigIntegerField(default=0)
+
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default="ACTIVE"
+    )
+
+    # set while one request writes or finalizes (see core/uploads.py)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.filename} ({self.received}/{self.total_size})"
+
 class VisitRequest(models.Model):
 
     STATUS_CHOICES = (
@@ -99,6 +210,8 @@ class VisitRequest(models.Model):
         ('REJECTED', 'Rejected'),
     )
 
+    STATUS_CODES = {'PENDING': 1, 'APPROVED': 2, 'REJECTED': 3}
+
     property = models.ForeignKey(
         Property,
         on_delete=models.CASCADE,
@@ -112,6 +225,14 @@ class VisitRequest(models.Model):
         limit_choices_to={'role': 'TENANT'},
     )
 
+    # copy of property.seller, so seller pages filter on one indexed column
+    seller = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='received_visits',
+        editable=False,
+    )
+
     # Agent assigned by admin after approval
     agent = models.ForeignKey(
         User,
@@ -124,14 +245,33 @@ class VisitRequest(models.Model):
 
     preferred_date = models.DateField()
 
-    status = models.CharField(
-        max_length=10,
+    status = CodedChoiceField(
         choices=STATUS_CHOICES,
+        codes=STATUS_CODES,
         default='PENDING'
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # tenant_my_visits: a tenant's visits, newest first
+            models.Index(fields=['tenant', '-created_at'], name='visit_tenant_created_idx'),
+            # "does this tenant already have a visit for this property"
+            models.Index(fields=['property', 'tenant', 'status'], name='visit_property_tenant_idx'),
+            # admin queue: visits by status, newest first
+            models.Index(fields=['status', '-created_at'], name='visit_status_created_idx'),
+            # seller_appointments, newest first
+            models.Index(fields=['seller', '-created_at'], name='visit_seller_created_idx'),
+            # agent loads per date for automatic assignment (core/assignment.py)
+            models.Index(fields=['preferred_date', 'agent', 'status'], name='visit_date_agent_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.seller_id:
+            self.seller_id = self.property.seller_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Visit: {self.property.title} → {self.tenant.username}"
 
@@ -146,6 +286,8 @@ class Booking(models.Model):
         ('COMPLETED', 'Completed'),
     )
 
+    STATUS_CODES = {'PENDING': 1, 'CONFIRMED': 2, 'CANCELLED': 3, 'COMPLETED': 4}
+
     property = models.ForeignKey(
         Property,
         on_delete=models.CASCADE,
@@ -159,14 +301,41 @@ class Booking(models.Model):
         limit_choices_to={'role': 'TENANT'},
     )
 
-    status = models.CharField(
-        max_length=10,
+    # copy of property.seller, so seller pages filter on one indexed column
+    seller = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='received_bookings',
+        editable=False,
+    )
+
+    status = CodedChoiceField(
         choices=STATUS_CHOICES,
+        codes=STATUS_CODES,
         default='PENDING'
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # "is this property confirmed for anyone" checks
+            models.Index(fields=['property', 'status'], name='booking_property_status_idx'),
+            # tenant_my_bookings: a tenant's bookings, newest first
+            models.Index(fields=['tenant', '-created_at'], name='booking_tenant_created_idx'),
+            # admin queue: bookings by status, newest first
+            models.Index(fields=['status', '-created_at'], name='booking_status_created_idx'),
+            # seller_bookings and the seller dashboard, newest first
+            models.Index(fields=['seller', '-created_at'], name='booking_seller_created_idx'),
+            # bookings export (core/exports.py), by date
+            models.Index(fields=['created_at'], name='booking_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.seller_id:
+            self.seller_id = self.property.seller_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.property.title} → {self.tenant.username} ({self.status})"
 
@@ -180,12 +349,22 @@ class Payment(models.Model):
         ('REJECTED', 'Rejected'),
     )
 
+    STATUS_CODES = {'PENDING': 1, 'APPROVED': 2, 'REJECTED': 3}
+
     booking = models.ForeignKey(
         Booking,
         on_delete=models.CASCADE,
         related_name='payments'
     )
 
+    # copy of booking.seller (the property's seller)
+    seller = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='received_payments',
+        editable=False,
+    )
+
     amount = models.DecimalField(max_digits=15, decimal_places=2)
 
     platform_cut = models.DecimalField(
@@ -200,9 +379,9 @@ class Payment(models.Model):
         default=0
     )
 
-    status = models.CharField(
-        max_length=10,
+    status = CodedChoiceField(
         choices=STATUS_CHOICES,
+        codes=STATUS_CODES,
         default='PENDING'
     )
 
@@ -229,15 +408,570 @@ class Payment(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # admin and seller payment lists by status, newest approval first
+            models.Index(fields=["status", "-approved_at"], name="payment_status_approved_idx"),
+            # completed deals, newest first; partial, because django filters on the
+            # bare boolean column, which sqlite will not look up in a normal index
+            models.Index(
+                fields=["-seller_amount_sent_at"],
+                condition=models.Q(seller_amount_sent=True),
+                name="payment_sent_idx",
+            ),
+            # seller_payments: sent (newest first) and waiting (newest approval first)
+            models.Index(fields=["seller", "status", "-seller_amount_sent_at"], name="payment_seller_sent_idx"),
+            models.Index(fields=["seller", "status", "-approved_at"], name="payment_seller_approved_idx"),
+            # payments export (core/exports.py), by date
+            models.Index(fields=["created_at"], name="payment_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.seller_id:
+            self.seller_id = self.booking.seller_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Payment {self.id} ({self.status})"
 
 
+# read model behind "My Properties": one row per completed purchase,
+# written together with the payment in initiate_payment
+class TenantOwnership(models.Model):
+    tenant = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="ownerships",
+        limit_choices_to={"role": "TENANT"},
+    )
+
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name="ownerships"
+    )
+
+    # cleared when the booking and payment move to the archive
+    # (core/archive.py); the amount and date are kept here
+    booking = models.OneToOneField(
+        Booking,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="ownership"
+    )
+
+    payment = models.OneToOneField(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="ownership"
+    )
+
+    amount = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0
+    )
+
+    purchased_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tenant", "-purchased_at"], name="ownership_tenant_purchased_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.tenant.username} owns {self.property.title}"
+
+
+# compact change log read by the admin queue event stream (core/notify.py)
+class QueueEvent(models.Model):
+
+    KIND_CHOICES = (
+        ("PAYMENT", "Payment"),
+        ("VISIT", "Visit Request"),
+        ("BOOKING", "Booking"),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    status = models.CharField(max_length=10)
+    created = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} {self.status}"
+
+
+# headline numbers for the seller / tenant dashboards (core/activity.py)
+class UserActivitySummary(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="activity_summary"
+    )
+
+    # seller side
+    properties_total = models.PositiveIntegerField(default=0)
+    properties_available = models.PositiveIntegerField(default=0)
+    properties_booked = models.PositiveIntegerField(default=0)
+    properties_sold = models.PositiveIntegerField(default=0)
+    properties_inactive = models.PositiveIntegerField(default=0)
+    bookings_received = models.PositiveIntegerField(default=0)
+    visits_received = models.PositiveIntegerField(default=0)
+    payments_received = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    payments_pending = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    # tenant side
+    visits_pending = models.PositiveIntegerField(default=0)
+    visits_approved = models.PositiveIntegerField(default=0)
+    visits_rejected = models.PositiveIntegerField(default=0)
+    bookings_pending = models.PositiveIntegerField(default=0)
+    bookings_confirmed = models.PositiveIntegerField(default=0)
+    bookings_cancelled = models.PositiveIntegerField(default=0)
+    bookings_completed = models.PositiveIntegerField(default=0)
+    owned_properties = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Activity summary for {self.user_id}"
+
+
+# listing filter counts per city / type / price bucket (core/facets.py);
+# "" in a column means any value, and only AVAILABLE properties count
+class FacetCount(models.Model):
+    city = models.CharField(max_length=50, blank=True, default="")
+    property_type = models.CharField(max_length=10, blank=True, default="")
+    price_bucket = models.CharField(max_length=10, blank=True, default="")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["city", "property_type", "price_bucket"],
+                name="facet_count_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.city or '*'} / {self.property_type or '*'} / {self.price_bucket or '*'}: {self.count}"
+
+
+# precomputed "similar properties" for the detail page (core/similarity.py)
+class SimilarProperty(models.Model):
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name="similar_links"
+    )
+    similar = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["property", "rank"], name="similar_property_rank_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} ~ {self.similar_id} (#{self.rank})"
+
+
+# properties whose similar listings need recomputing; drained by the
+# refresh_similar_properties command. A plain id, not a foreign key: rows
+# are queued from pre_delete for properties that may go in the same delete
+class SimilarityRefresh(models.Model):
+    property_id = models.BigIntegerField(primary_key=True)
+    queued_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Refresh similar properties of {self.property_id}"
+
+
+# notification emails, written in the same transaction as the change they
+# announce and sent in batches by a background job (core/outbox.py)
+class OutboxMessage(models.Model):
+
+    STATUS_CHOICES = (
+        ("PENDING", "Pending"),
+        ("SENDING", "Sending"),
+        ("SENT", "Sent"),
+        ("FAILED", "Failed"),
+    )
+
+    STATUS_CODES = {"PENDING": 1, "SENDING": 2, "SENT": 3, "FAILED": 4}
+
+    kind = models.CharField(max_length=50)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+
+    # e.g. "visit_approved:42"; the same notification is only queued once
+    dedupe_key = models.CharField(max_length=200, unique=True)
+
+    status = CodedChoiceField(
+        choices=STATUS_CHOICES,
+        codes=STATUS_CODES,
+        default="PENDING"
+    )
+    send_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # delivery: next messages due
+            models.Index(fields=["status", "send_after", "id"], name="outbox_due_idx"),
+            # rate limits: recent sends overall and per recipient
+            models.Index(fields=["status", "sent_at"], name="outbox_sent_idx"),
+            models.Index(fields=["recipient", "sent_at"], name="outbox_recipient_sent_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} to {self.recipient} ({self.status})"
+
+
+# background jobs run by the runworkers command (core/jobs.py)
+class Job(models.Model):
+
+    STATUS_CHOICES = (
+        ("QUEUED", "Queued"),
+        ("RUNNING", "Running"),
+        ("DONE", "Done"),
+        ("FAILED", "Failed"),
+    )
+
+    STATUS_CODES = {"QUEUED": 1, "RUNNING": 2, "DONE": 3, "FAILED": 4}
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+
+    status = CodedChoiceField(
+        choices=STATUS_CHOICES,
+        codes=STATUS_CODES,
+        default="QUEUED"
+    )
+
+    # higher runs first; run_at also holds the retry backoff
+    priority = models.SmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    # unique tasks: a hash of the name and arguments, so two requests at
+    # once cannot both queue the job
+    unique_key = models.CharField(max_length=64, blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # workers: next ready job
+            models.Index(fields=["status", "-priority", "run_at", "id"], name="job_ready_idx"),
+            # requeueing jobs of workers that died
+            models.Index(fields=["status", "locked_at"], name="job_locked_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["unique_key"],
+                condition=models.Q(status="QUEUED") & ~models.Q(unique_key=""),
+                name="job_unique_queued",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+
+# one bulk import from an uploaded or local file (core/imports.py)
+class ImportRun(models.Model):
+
+    KIND_CHOICES = (
+        ("USERS", "Users"),
+        ("PROPERTIES", "Properties"),
+    )
+
+    KIND_CODES = {"USERS": 1, "PROPERTIES": 2}
+
+    STATUS_CHOICES = (
+        ("QUEUED", "Queued"),
+        ("RUNNING", "Running"),
+        ("DONE", "Done"),
+        ("FAILED", "Failed"),
+    )
+
+    STATUS_CODES = {"QUEUED": 1, "RUNNING": 2, "DONE": 3, "FAILED": 4}
+
+    kind = CodedChoiceField(choices=KIND_CHOICES, codes=KIND_CODES)
+    status = CodedChoiceField(
+        choices=STATUS_CHOICES,
+        codes=STATUS_CODES,
+        default="QUEUED"
+    )
+
+    # the manifest (an upload under IMPORT_ROOT or a local path), its
+    # original name, and the images zip for property imports
+    source = models.CharField(max_length=500)
+    filename = models.CharField(max_length=255)
+    archive = models.CharField(max_length=500, blank=True)
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+
+    rows = models.PositiveIntegerField(default=0)
+    # manifest rows committed so far; a resumed run starts after them
+    position = models.PositiveIntegerField(default=0)
+    imported = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # [[row number, message], ...], the first IMPORT_MAX_ERRORS only
+    errors = models.JSONField(default=list, blank=True)
+
+    workers = models.PositiveSmallIntegerField(default=1)
+    seconds = models.FloatField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # latest runs of a kind on the import pages
+            models.Index(fields=["kind", "-created_at"], name="import_kind_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} import #{self.id} ({self.status})"
+
+
+# one deletion of a user or a property with everything under it, run in
+# batches by a background job (core/deletion.py)
+class DeletionRun(models.Model):
+
+    KIND_CHOICES = (
+        ("USER", "User"),
+        ("PROPERTY", "Property"),
+    )
+
+    KIND_CODES = {"USER": 1, "PROPERTY": 2}
+
+    STATUS_CHOICES = (
+        ("QUEUED", "Queued"),
+        ("RUNNING", "Running"),
+        ("DONE", "Done"),
+        ("FAILED", "Failed"),
+    )
+
+    STATUS_CODES = {"QUEUED": 1, "RUNNING": 2, "DONE": 3, "FAILED": 4}
+
+    kind = CodedChoiceField(choices=KIND_CHOICES, codes=KIND_CODES)
+    status = CodedChoiceField(
+        choices=STATUS_CHOICES,
+        codes=STATUS_CODES,
+        default="QUEUED"
+    )
+
+    # no foreign key: the run outlives the row; label is its name then
+    object_id = models.BigIntegerField()
+    label = models.CharField(max_length=255)
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+
+    # {"bookings": 120, "image files": 30, ...}: removed so far
+    deleted = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # latest runs of a kind on the admin pages
+            models.Index(fields=["kind", "-created_at"], name="deletion_kind_created_idx"),
+            # a run already queued for the same user or property
+            models.Index(fields=["kind", "object_id"], name="deletion_object_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} deletion #{self.id} ({self.status})"
+
+
+# archived history (core/archive.py): finished visits, bookings and their
+# payments older than ARCHIVE_RETENTION_DAYS move here, keeping their ids,
+# so the hot tables above only hold open work and recent rows
+class ArchivedVisitRequest(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name="archived_visits"
+    )
+
+    tenant = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_visits"
+    )
+
+    seller = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_received_visits"
+    )
+
+    agent = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+
+    preferred_date = models.DateField()
+    status = CodedChoiceField(choices=VisitRequest.STATUS_CHOICES, codes=VisitRequest.STATUS_CODES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # history pages, newest first; seller counts for the summaries
+            models.Index(fields=["tenant", "-created_at"], name="archvisit_tenant_created_idx"),
+            models.Index(fields=["seller"], name="archvisit_seller_idx"),
+            models.Index(fields=["created_at"], name="archvisit_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived visit {self.id} ({self.status})"
+
+
+class ArchivedBooking(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name="archived_bookings"
+    )
+
+    tenant = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_bookings"
+    )
+
+    seller = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_received_bookings"
+    )
+
+    status = CodedChoiceField(choices=Booking.STATUS_CHOICES, codes=Booking.STATUS_CODES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tenant", "-created_at"], name="archbooking_tenant_created_idx"),
+            models.Index(fields=["seller"], name="archbooking_seller_idx"),
+            # admin history and the archived bookings export, by date
+            models.Index(fields=["created_at"], name="archbooking_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived booking {self.id} ({self.status})"
+
+
+class ArchivedPayment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+
+    booking = models.ForeignKey(
+        ArchivedBooking,
+        on_delete=models.CASCADE,
+        related_name="payments"
+    )
+
+    seller = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_payments"
+    )
+
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    platform_cut = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    seller_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    status = CodedChoiceField(choices=Payment.STATUS_CHOICES, codes=Payment.STATUS_CODES)
+
+    approved_by_admin = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+
+    approved_at = models.DateTimeField(null=True, blank=True)
+    seller_amount_sent = models.BooleanField(default=False)
+    seller_amount_sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # seller payout totals for the summaries
+            models.Index(fields=["seller", "status"], name="archpayment_seller_status_idx"),
+            # archived payments and deals exports, by date
+            models.Index(fields=["created_at"], name="archpayment_created_idx"),
+            models.Index(
+                fields=["-seller_amount_sent_at"],
+                condition=models.Q(seller_amount_sent=True),
+                name="archpayment_sent_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Archived payment {self.id} ({self.status})"
+
+
 # Signal to auto-update property status when bookings are deleted
 
 @receiver(pre_delete, sender=Booking)
 def reset_property_on_booking_delete(sender, instance, **kwargs):
-   
+    from .deletion import in_cascade
+    # a cascade (core/deletion.py) reopens the properties once per batch
+    if in_cascade():
+        return
+
     # Only reset if this was a CONFIRMED or PENDING booking
     if instance.status in ['CONFIRMED', 'PENDING']:
         # Check if there are other active bookings for this property
@@ -252,6 +986,311 @@ def reset_property_on_booking_delete(sender, instance, **kwargs):
             instance.property.save()
 
 
+# Signals to keep image reference counts and delete unused files
+#
+# a file is only deleted once the transaction that dropped its last row
+# has committed, and then only if its count is still 0, checked under the
+# write lock that the delete holds while the file goes. A row added at the
+# same moment for the same content (storage.save hands back the existing
+# name) either keeps the file, or finds it gone and writes it again.
+
+def retain_image_blob(name, content=None):
+    retain_image_blobs({name: 1})
+    # content: the uploaded file, to put back a file removed by a release
+    # that committed between storage.save and this count
+    if content is not None and missing_image_files([name]):
+        property_image_storage.restore(name, content)
+
+
+def release_image_blob(name):
+    release_image_blobs({name: 1})
+
+
+def retain_image_blobs(counts):
+    # retain_image_blob for rows added in bulk: {name: new rows}
+    names_by_count = {}
+    for name, count in counts.items():
+        names_by_count.setdefault(count, []).append(name)
+
+    with transaction.atomic():
+        ImageBlob.objects.bulk_create([ImageBlob(name=name) for name in counts], ignore_conflicts=True)
+        for count, names in names_by_count.items():
+            ImageBlob.objects.filter(name__in=names).update(ref_count=F("ref_count") + count)
+
+
+def missing_image_files(names):
+    return [name for name in names if not property_image_storage.exists(name)]
+
+
+def delete_unused_images(names):
+    # one short transaction per name: the DELETE takes the write lock, so
+    # no row can take the name again until its file is gone
+    deleted = 0
+    for name in names:
+        with transaction.atomic():
+            if ImageBlob.objects.filter(name=name, ref_count=0).delete()[0]:
+                property_image_storage.delete(name)
+                deleted += 1
+    return deleted
+
+
+def release_unsaved_images(names):
+    # files stored for rows that were never saved (dropped, or rolled back):
+    # released like a last reference, so a file a saved row holds stays
+    ImageBlob.objects.bulk_create([ImageBlob(name=name) for name in names], ignore_conflicts=True)
+    return delete_unused_images(names)
+
+
+def release_image_blobs(counts):
+    # release_image_blob for rows deleted in bulk: {name: deleted rows};
+    # returns how many files go, once the transaction commits
+    names_by_count = {}
+    for name, count in counts.items():
+        names_by_count.setdefault(count, []).append(name)
+
+    with transaction.atomic():
+        for count, names in names_by_count.items():
+            ImageBlob.objects.filter(name__in=names).update(ref_count=Greatest(F("ref_count") - count, 0))
+        unused = list(ImageBlob.objects.filter(name__in=list(counts), ref_count=0).values_list("name", flat=True))
+
+    transaction.on_commit(lambda: delete_unused_images(unused))
+    return len(unused)
+
+
+@receiver(post_init, sender=PropertyImage)
+def remember_image_name(sender, instance, **kwargs):
+    # the stored name as loaded, to count a replaced image on save
+    value = instance.__dict__.get("image")
+    instance._image_name = getattr(value, "name", value) or ""
+
+
+@receiver(pre_save, sender=PropertyImage)
+def remember_image_upload(sender, instance, **kwargs):
+    # a file about to be stored, still open for retain_image_blob
+    image = instance.image
+    instance._image_upload = image.file if image and not image._committed else None
+
+
+@receiver(post_save, sender=PropertyImage)
+def retain_image_on_save(sender, instance, created, **kwargs):
+    name = instance.image.name or ""
+    if name != instance._image_name:
+        if name:
+            retain_image_blob(name, instance._image_upload)
+        if instance._image_name and not created:
+            release_image_blob(instance._image_name)
+        instance._image_name = name
+    instance._image_upload = None
+
+
+@receiver(post_delete, sender=PropertyImage)
+def release_image_on_delete(sender, instance, **kwargs):
+    from .deletion import in_cascade
+    if instance.image and not in_cascade():
+        release_image_blob(instance.image.name)
+
+
+
+# Signals to move cached property pages to a new version
+
+@receiver(pre_save, sender=Property)
+def bump_property_version(sender, instance, **kwargs):
+    # incremented in SQL, an in-memory copy may be behind an image change.
+    # The instance keeps the expression after the save (nothing reads the
+    # number back, the page takes it from tenant_flags); refresh_from_db()
+    # if you need it.
+    if instance.pk:
+        instance.version = F("version") + 1
+
+
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+def bump_version_on_image_change(sender, instance, **kwargs):
+    from .deletion import in_cascade
+    if in_cascade():
+        return
+    Property.objects.filter(id=instance.property_id).update(version=F("version") + 1)
+
+
+@receiver(post_save, sender=User)
+def bump_version_on_seller_change(sender, instance, created, update_fields=None, **kwargs):
+    # login only touches last_login, which the page does not show
+    if created or instance.role != "SELLER" or update_fields == frozenset(["last_login"]):
+        return
+    Property.objects.filter(seller=instance).update(version=F("version") + 1)
+
+
+
+# Signal to drop cached logged-in users (core/user_cache.py)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_cache_version(sender, instance, **kwargs):
+    from .user_cache import bump_version
+    bump_version(instance.id)
+
+
+# Signal to remember a property's stored values before it is updated
+# (one query, locking the row until Property.save commits; the handlers
+# below compare against it)
+
+PROPERTY_TRACKED_FIELDS = (
+    "seller_id", "address", "city", "property_type", "price", "status", "title", "description",
+)
+
+
+@receiver(pre_save, sender=Property)
+def remember_previous_property(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = (
+            Property.objects.select_for_update().filter(pk=instance.pk).values(*PROPERTY_TRACKED_FIELDS).first()
+        )
+
+
+
+# Signal to geocode properties from the bundled gazetteer (core/geo.py)
+
+@receiver(pre_save, sender=Property)
+def geocode_property(sender, instance, **kwargs):
+    from . import geo
+
+    previous = instance._previous
+    moved = previous is None or (previous["address"], previous["city"]) != (instance.address, instance.city)
+    if moved or instance.latitude is None:
+        point = geo.geocode(instance.address, instance.city)
+        instance.latitude, instance.longitude = point or (None, None)
+
+    instance.geohash = ""
+    if instance.latitude is not None and instance.longitude is not None:
+        instance.geohash = geo.geohash_encode(instance.latitude, instance.longitude)
+
+
+
+# Signals to keep the listing facet counts current
+
+@receiver(post_save, sender=Property)
+def facets_on_property_save(sender, instance, created, **kwargs):
+    from .facets import apply, facet_values, property_values
+
+    previous = instance._previous
+    old = previous and facet_values(
+        previous["city"], previous["property_type"], previous["price"], previous["status"]
+    )
+    apply(old, property_values(instance))
+
+
+@receiver(post_delete, sender=Property)
+def facets_on_property_delete(sender, instance, **kwargs):
+    from .deletion import in_cascade
+    from .facets import apply, property_values
+
+    if in_cascade():
+        return
+    apply(property_values(instance), None)
+
+
+
+# Signals to queue similar-listing refreshes
+
+@receiver(post_save, sender=Property)
+def similarity_on_property_save(sender, instance, created, **kwargs):
+    from .similarity import FEATURE_FIELDS, queue_refresh
+
+    previous = instance._previous
+    if previous is None or any(previous[f] != getattr(instance, f) for f in FEATURE_FIELDS):
+        queue_refresh([instance.pk])
+
+
+@receiver(pre_delete, sender=Property)
+def similarity_on_property_delete(sender, instance, **kwargs):
+    from .deletion import in_cascade
+    from .similarity import queue_refresh
+
+    if in_cascade():
+        return
+    # properties listing this one lose a neighbour
+    queue_refresh(
+        SimilarProperty.objects.filter(similar=instance).exclude(property=instance)
+        .values_list("property_id", flat=True)
+    )
+
+
+
+# Signals to keep the copied seller on visits, bookings and payments
+
+@receiver(post_save, sender=Property)
+def move_property_to_new_seller(sender, instance, created, **kwargs):
+    previous = instance._previous and instance._previous["seller_id"]
+    if created or previous is None or previous == instance.seller_id:
+        return
+    VisitRequest.objects.filter(property=instance).update(seller_id=instance.seller_id)
+    Booking.objects.filter(property=instance).update(seller_id=instance.seller_id)
+    Payment.objects.filter(booking__property=instance).update(seller_id=instance.seller_id)
+    ArchivedVisitRequest.objects.filter(property=instance).update(seller_id=instance.seller_id)
+    ArchivedBooking.objects.filter(property=instance).update(seller_id=instance.seller_id)
+    ArchivedPayment.objects.filter(booking__property=instance).update(seller_id=instance.seller_id)
+
+    from .activity import mark_dirty
+    mark_dirty(previous)
+
+
+
+# Signals to feed the admin queue event stream (new rows and status
+# changes only; the status as loaded is kept on the instance, no query)
+
+QUEUE_EVENT_KINDS = {Payment: "PAYMENT", VisitRequest: "VISIT", Booking: "BOOKING"}
+
+
+@receiver(post_init, sender=Payment)
+@receiver(post_init, sender=VisitRequest)
+@receiver(post_init, sender=Booking)
+def remember_queue_status(sender, instance, **kwargs):
+    # a deferred status counts as changed
+    instance._queue_status = instance.__dict__.get("status")
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=VisitRequest)
+@receiver(post_save, sender=Booking)
+def publish_queue_event(sender, instance, created, **kwargs):
+    from .notify import publish
+
+    if created or instance.status != instance._queue_status:
+        publish(QUEUE_EVENT_KINDS[sender], instance, created)
+        instance._queue_status = instance.status
+
+
+
+# Signals to keep the per-user activity summaries current
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def summary_on_property_change(sender, instance, **kwargs):
+    from .activity import mark_dirty
+    mark_dirty(instance.seller_id)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=VisitRequest)
+@receiver(post_delete, sender=VisitRequest)
+def summary_on_tenant_activity(sender, instance, **kwargs):
+    from .activity import mark_dirty
+    mark_dirty(instance.tenant_id, instance.seller_id)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def summary_on_payment_change(sender, instance, **kwargs):
+    from .activity import mark_dirty
+    from .deletion import in_cascade
+    if in_cascade():
+        return
+    tenant_id = Booking.objects.filter(id=instance.booking_id).values_list("tenant_id", flat=True).first()
+    mark_dirty(tenant_id, instance.seller_id)
+
+
 """
 SQL Equivalent for Models (Reference)
 
@@ -263,7 +1302,7 @@ CREATE TABLE core_user (
     email VARCHAR(254),
     first_name VARCHAR(150),
     last_name VARCHAR(150),
-    role VARCHAR(10) CHECK (role IN ('ADMIN','SELLER','TENANT','AGENT')),
+    role SMALLINT,  -- 0 unset, 1 ADMIN, 2 SELLER, 3 TENANT, 4 AGENT
     phone_number VARCHAR(15),
     address TEXT,
     is_active BOOLEAN DEFAULT TRUE,
@@ -272,6 +1311,7 @@ CREATE TABLE core_user (
     last_login DATETIME,
     date_joined DATETIME
 );
+CREATE INDEX user_role_idx ON core_user (role);
 
 
 TABLE: core_property
@@ -283,12 +1323,19 @@ CREATE TABLE core_property (
     city VARCHAR(50),
     property_type VARCHAR(10) CHECK (property_type IN ('SELL','RENT')),
     price DECIMAL(15,2),
-    status VARCHAR(20) CHECK (status IN ('AVAILABLE','BOOKED','SOLD','INACTIVE')) DEFAULT 'AVAILABLE',
+    status SMALLINT DEFAULT 1,  -- 1 AVAILABLE, 2 BOOKED, 3 SOLD, 4 INACTIVE
     description TEXT,
     is_featured BOOLEAN DEFAULT FALSE,
     created_at DATETIME,
+    latitude REAL,
+    longitude REAL,
+    geohash VARCHAR(12) DEFAULT '',
+    version INTEGER UNSIGNED DEFAULT 1,
     FOREIGN KEY (seller_id) REFERENCES core_user(id) ON DELETE CASCADE
 );
+CREATE INDEX property_status_featured_idx ON core_property (status, is_featured);
+CREATE INDEX property_seller_created_idx ON core_property (seller_id, created_at DESC);
+CREATE INDEX property_status_geohash_idx ON core_property (status, geohash);
 
 
 TABLE: core_propertyimage
@@ -301,19 +1348,235 @@ CREATE TABLE core_propertyimage (
 );
 
 
+TABLE: core_imageblob
+CREATE TABLE core_imageblob (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255) UNIQUE NOT NULL,
+    ref_count INTEGER UNSIGNED DEFAULT 0,
+    created_at DATETIME
+);
+
+
+TABLE: core_uploadsession
+CREATE TABLE core_uploadsession (
+    id CHAR(32) PRIMARY KEY,
+    owner_id INTEGER NOT NULL,
+    property_id INTEGER NOT NULL,
+    filename VARCHAR(255),
+    total_size BIGINT UNSIGNED,
+    sha256 VARCHAR(64),
+    received BIGINT UNSIGNED DEFAULT 0,
+    status VARCHAR(10) CHECK (status IN ('ACTIVE','COMPLETE')) DEFAULT 'ACTIVE',
+    locked_at DATETIME NULL,
+    created_at DATETIME,
+    updated_at DATETIME,
+    FOREIGN KEY (owner_id) REFERENCES core_user(id) ON DELETE CASCADE,
+    FOREIGN KEY (property_id) REFERENCES core_property(id) ON DELETE CASCADE
+);
+
+
+TABLE: core_tenantownership
+CREATE TABLE core_tenantownership (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant_id INTEGER NOT NULL,
+    property_id INTEGER NOT NULL,
+    booking_id INTEGER UNIQUE,  -- NULL once archived
+    payment_id INTEGER UNIQUE,  -- NULL once archived
+    amount DECIMAL(15,2) DEFAULT 0,
+    purchased_at DATETIME,
+    FOREIGN KEY (tenant_id) REFERENCES core_user(id) ON DELETE CASCADE,
+    FOREIGN KEY (property_id) REFERENCES core_property(id) ON DELETE CASCADE,
+    FOREIGN KEY (booking_id) REFERENCES core_booking(id) ON DELETE SET NULL,
+    FOREIGN KEY (payment_id) REFERENCES core_payment(id) ON DELETE SET NULL
+);
+CREATE INDEX ownership_tenant_purchased_idx ON core_tenantownership (tenant_id, purchased_at DESC);
+
+
+TABLE: core_queueevent
+CREATE TABLE core_queueevent (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind VARCHAR(10) CHECK (kind IN ('PAYMENT','VISIT','BOOKING')),
+    object_id BIGINT,
+    status VARCHAR(10),
+    created BOOLEAN DEFAULT FALSE,
+    created_at DATETIME
+);
+
+
+TABLE: core_useractivitysummary
+CREATE TABLE core_useractivitysummary (
+    user_id INTEGER PRIMARY KEY,
+    properties_total INTEGER UNSIGNED DEFAULT 0,
+    properties_available INTEGER UNSIGNED DEFAULT 0,
+    properties_booked INTEGER UNSIGNED DEFAULT 0,
+    properties_sold INTEGER UNSIGNED DEFAULT 0,
+    properties_inactive INTEGER UNSIGNED DEFAULT 0,
+    bookings_received INTEGER UNSIGNED DEFAULT 0,
+    visits_received INTEGER UNSIGNED DEFAULT 0,
+    payments_received DECIMAL(15,2) DEFAULT 0,
+    payments_pending DECIMAL(15,2) DEFAULT 0,
+    visits_pending INTEGER UNSIGNED DEFAULT 0,
+    visits_approved INTEGER UNSIGNED DEFAULT 0,
+    visits_rejected INTEGER UNSIGNED DEFAULT 0,
+    bookings_pending INTEGER UNSIGNED DEFAULT 0,
+    bookings_confirmed INTEGER UNSIGNED DEFAULT 0,
+    bookings_cancelled INTEGER UNSIGNED DEFAULT 0,
+    bookings_completed INTEGER UNSIGNED DEFAULT 0,
+    owned_properties INTEGER UNSIGNED DEFAULT 0,
+    total_spent DECIMAL(15,2) DEFAULT 0,
+    last_activity_at DATETIME,
+    updated_at DATETIME,
+    FOREIGN KEY (user_id) REFERENCES core_user(id) ON DELETE CASCADE
+);
+
+
+TABLE: core_facetcount
+CREATE TABLE core_facetcount (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    city VARCHAR(50) DEFAULT '',           -- '' = any city
+    property_type VARCHAR(10) DEFAULT '',  -- '' = any type
+    price_bucket VARCHAR(10) DEFAULT '',   -- '' = any price
+    count INTEGER UNSIGNED DEFAULT 0,
+    CONSTRAINT facet_count_unique UNIQUE (city, property_type, price_bucket)
+);
+
+
+TABLE: core_similarproperty
+CREATE TABLE core_similarproperty (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    property_id INTEGER NOT NULL,
+    similar_id INTEGER NOT NULL,
+    rank SMALLINT UNSIGNED NOT NULL,  -- 1 = most similar
+    score REAL NOT NULL,
+    CONSTRAINT similar_property_rank_unique UNIQUE (property_id, rank),
+    FOREIGN KEY (property_id) REFERENCES core_property(id) ON DELETE CASCADE,
+    FOREIGN KEY (similar_id) REFERENCES core_property(id) ON DELETE CASCADE
+);
+
+
+TABLE: core_similarityrefresh
+CREATE TABLE core_similarityrefresh (
+    property_id INTEGER PRIMARY KEY,  -- no foreign key, see the model
+    queued_at DATETIME NOT NULL
+);
+
+
+TABLE: core_outboxmessage
+CREATE TABLE core_outboxmessage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind VARCHAR(50) NOT NULL,
+    recipient VARCHAR(254) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body TEXT NOT NULL,
+    dedupe_key VARCHAR(200) NOT NULL UNIQUE,
+    status SMALLINT DEFAULT 1,  -- 1 PENDING, 2 SENDING, 3 SENT, 4 FAILED
+    send_after DATETIME NOT NULL,
+    attempts SMALLINT UNSIGNED DEFAULT 0,
+    last_error TEXT,
+    created_at DATETIME NOT NULL,
+    locked_at DATETIME,
+    sent_at DATETIME
+);
+CREATE INDEX outbox_due_idx ON core_outboxmessage (status, send_after, id);
+CREATE INDEX outbox_sent_idx ON core_outboxmessage (status, sent_at);
+CREATE INDEX outbox_recipient_sent_idx ON core_outboxmessage (recipient, sent_at);
+
+
+TABLE: core_job
+CREATE TABLE core_job (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(200) NOT NULL,        -- registered task, e.g. core.tasks.refresh_similar_properties
+    args TEXT NOT NULL DEFAULT '[]',   -- JSON
+    kwargs TEXT NOT NULL DEFAULT '{}', -- JSON
+    status SMALLINT DEFAULT 1,         -- 1 QUEUED, 2 RUNNING, 3 DONE, 4 FAILED
+    priority SMALLINT DEFAULT 0,
+    run_at DATETIME NOT NULL,
+    attempts SMALLINT UNSIGNED DEFAULT 0,
+    max_attempts SMALLINT UNSIGNED DEFAULT 3,
+    last_error TEXT,
+    locked_by VARCHAR(100),
+    locked_at DATETIME,
+    unique_key VARCHAR(64) DEFAULT '',  -- sha256 of name + arguments, unique tasks only
+    created_at DATETIME NOT NULL,
+    finished_at DATETIME
+);
+CREATE INDEX job_ready_idx ON core_job (status, priority DESC, run_at, id);
+CREATE INDEX job_locked_idx ON core_job (status, locked_at);
+CREATE UNIQUE INDEX job_unique_queued ON core_job (unique_key) WHERE status = 1 AND unique_key != '';
+
+-- a worker claims jobs (core/jobs.py)
+UPDATE core_job SET status = 2, locked_by = ?, locked_at = ?, attempts = attempts + 1
+WHERE id IN (
+    SELECT id FROM core_job WHERE status = 1 AND run_at <= ?
+    ORDER BY priority DESC, run_at, id LIMIT ?
+) RETURNING id;
+
+-- and records the outcome, only while it still holds the job
+UPDATE core_job SET status = 3, finished_at = ?, last_error = ''
+WHERE id = ? AND status = 2 AND locked_by = ?;
+
+
+TABLE: core_importrun
+CREATE TABLE core_importrun (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind SMALLINT NOT NULL,     -- 1 USERS, 2 PROPERTIES
+    status SMALLINT DEFAULT 1,  -- 1 QUEUED, 2 RUNNING, 3 DONE, 4 FAILED
+    source VARCHAR(500) NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    archive VARCHAR(500),       -- images zip (PROPERTIES)
+    created_by_id INTEGER,
+    rows INTEGER UNSIGNED DEFAULT 0,
+    position INTEGER UNSIGNED DEFAULT 0,  -- rows committed; resume point
+    imported INTEGER UNSIGNED DEFAULT 0,
+    failed INTEGER UNSIGNED DEFAULT 0,
+    errors TEXT NOT NULL DEFAULT '[]',  -- JSON
+    workers SMALLINT UNSIGNED DEFAULT 1,
+    seconds REAL DEFAULT 0,
+    created_at DATETIME NOT NULL,
+    finished_at DATETIME,
+    FOREIGN KEY (created_by_id) REFERENCES core_user(id) ON DELETE SET NULL
+);
+CREATE INDEX import_kind_created_idx ON core_importrun (kind, created_at DESC);
+
+
+TABLE: core_deletionrun
+CREATE TABLE core_deletionrun (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind SMALLINT NOT NULL,     -- 1 USER, 2 PROPERTY
+    status SMALLINT DEFAULT 1,  -- 1 QUEUED, 2 RUNNING, 3 DONE, 4 FAILED
+    object_id BIGINT NOT NULL,  -- the user or property; no FK, it is deleted
+    label VARCHAR(255) NOT NULL,
+    created_by_id INTEGER,
+    deleted TEXT NOT NULL DEFAULT '{}',  -- JSON, rows removed by table
+    error TEXT,
+    created_at DATETIME NOT NULL,
+    finished_at DATETIME,
+    FOREIGN KEY (created_by_id) REFERENCES core_user(id) ON DELETE SET NULL
+);
+CREATE INDEX deletion_kind_created_idx ON core_deletionrun (kind, created_at DESC);
+CREATE INDEX deletion_object_idx ON core_deletionrun (kind, object_id);
+
+
 TABLE: core_visitrequest
 CREATE TABLE core_visitrequest (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     property_id INTEGER NOT NULL,
     tenant_id INTEGER NOT NULL,
+    seller_id INTEGER NOT NULL,  -- copy of core_property.seller_id
     agent_id INTEGER,
     preferred_date DATE,
-    status VARCHAR(10) CHECK (status IN ('PENDING','APPROVED','REJECTED')) DEFAULT 'PENDING',
+    status SMALLINT DEFAULT 1,  -- 1 PENDING, 2 APPROVED, 3 REJECTED
     created_at DATETIME,
     FOREIGN KEY (property_id) REFERENCES core_property(id) ON DELETE CASCADE,
     FOREIGN KEY (tenant_id) REFERENCES core_user(id) ON DELETE CASCADE,
+    FOREIGN KEY (seller_id) REFERENCES core_user(id) ON DELETE CASCADE,
     FOREIGN KEY (agent_id) REFERENCES core_user(id) ON DELETE SET NULL
 );
+CREATE INDEX visit_tenant_created_idx ON core_visitrequest (tenant_id, created_at DESC);
+CREATE INDEX visit_property_tenant_idx ON core_visitrequest (property_id, tenant_id, status);
+CREATE INDEX visit_status_created_idx ON core_visitrequest (status, created_at DESC);
+CREATE INDEX visit_seller_created_idx ON core_visitrequest (seller_id, created_at DESC);
+CREATE INDEX visit_date_agent_idx ON core_visitrequest (preferred_date, agent_id, status);
 
 
 TABLE: core_booking
@@ -321,29 +1584,107 @@ CREATE TABLE core_booking (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     property_id INTEGER NOT NULL,
     tenant_id INTEGER NOT NULL,
-    status VARCHAR(10) CHECK (status IN ('PENDING','CONFIRMED','CANCELLED','COMPLETED')) DEFAULT 'PENDING',
+    seller_id INTEGER NOT NULL,  -- copy of core_property.seller_id
+    status SMALLINT DEFAULT 1,  -- 1 PENDING, 2 CONFIRMED, 3 CANCELLED, 4 COMPLETED
     created_at DATETIME,
     FOREIGN KEY (property_id) REFERENCES core_property(id) ON DELETE CASCADE,
-    FOREIGN KEY (tenant_id) REFERENCES core_user(id) ON DELETE CASCADE
+    FOREIGN KEY (tenant_id) REFERENCES core_user(id) ON DELETE CASCADE,
+    FOREIGN KEY (seller_id) REFERENCES core_user(id) ON DELETE CASCADE
 );
+CREATE INDEX booking_property_status_idx ON core_booking (property_id, status);
+CREATE INDEX booking_tenant_created_idx ON core_booking (tenant_id, created_at DESC);
+CREATE INDEX booking_status_created_idx ON core_booking (status, created_at DESC);
+CREATE INDEX booking_seller_created_idx ON core_booking (seller_id, created_at DESC);
+CREATE INDEX booking_created_idx ON core_booking (created_at);
 
 
 TABLE: core_payment
 CREATE TABLE core_payment (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     booking_id INTEGER NOT NULL,
+    seller_id INTEGER NOT NULL,  -- copy of core_booking.seller_id
     amount DECIMAL(15,2),
     platform_cut DECIMAL(15,2) DEFAULT 0,
     seller_amount DECIMAL(15,2) DEFAULT 0,
-    status VARCHAR(10) CHECK (status IN ('PENDING','APPROVED','REJECTED')) DEFAULT 'PENDING',
+    status SMALLINT DEFAULT 1,  -- 1 PENDING, 2 APPROVED, 3 REJECTED
     approved_by_admin_id INTEGER,
     approved_at DATETIME,
     seller_amount_sent BOOLEAN DEFAULT FALSE,
     seller_amount_sent_at DATETIME,
     created_at DATETIME,
     FOREIGN KEY (booking_id) REFERENCES core_booking(id) ON DELETE CASCADE,
+    FOREIGN KEY (seller_id) REFERENCES core_user(id) ON DELETE CASCADE,
+    FOREIGN KEY (approved_by_admin_id) REFERENCES core_user(id) ON DELETE SET NULL
+);
+CREATE INDEX payment_status_approved_idx ON core_payment (status, approved_at DESC);
+CREATE INDEX payment_sent_idx ON core_payment (seller_amount_sent_at DESC) WHERE seller_amount_sent;
+CREATE INDEX payment_seller_sent_idx ON core_payment (seller_id, status, seller_amount_sent_at DESC);
+CREATE INDEX payment_seller_approved_idx ON core_payment (seller_id, status, approved_at DESC);
+CREATE INDEX payment_created_idx ON core_payment (created_at);
+
+
+TABLE: core_archivedvisitrequest
+-- finished rows moved out of core_visitrequest by core/archive.py, same ids
+CREATE TABLE core_archivedvisitrequest (
+    id INTEGER PRIMARY KEY,
+    property_id INTEGER NOT NULL,
+    tenant_id INTEGER NOT NULL,
+    seller_id INTEGER NOT NULL,
+    agent_id INTEGER,
+    preferred_date DATE,
+    status SMALLINT NOT NULL,  -- 3 REJECTED
+    created_at DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    FOREIGN KEY (property_id) REFERENCES core_property(id) ON DELETE CASCADE,
+    FOREIGN KEY (tenant_id) REFERENCES core_user(id) ON DELETE CASCADE,
+    FOREIGN KEY (seller_id) REFERENCES core_user(id) ON DELETE CASCADE,
+    FOREIGN KEY (agent_id) REFERENCES core_user(id) ON DELETE SET NULL
+);
+CREATE INDEX archvisit_tenant_created_idx ON core_archivedvisitrequest (tenant_id, created_at DESC);
+CREATE INDEX archvisit_seller_idx ON core_archivedvisitrequest (seller_id);
+CREATE INDEX archvisit_created_idx ON core_archivedvisitrequest (created_at);
+
+
+TABLE: core_archivedbooking
+CREATE TABLE core_archivedbooking (
+    id INTEGER PRIMARY KEY,
+    property_id INTEGER NOT NULL,
+    tenant_id INTEGER NOT NULL,
+    seller_id INTEGER NOT NULL,
+    status SMALLINT NOT NULL,  -- 3 CANCELLED, 4 COMPLETED
+    created_at DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    FOREIGN KEY (property_id) REFERENCES core_property(id) ON DELETE CASCADE,
+    FOREIGN KEY (tenant_id) REFERENCES core_user(id) ON DELETE CASCADE,
+    FOREIGN KEY (seller_id) REFERENCES core_user(id) ON DELETE CASCADE
+);
+CREATE INDEX archbooking_tenant_created_idx ON core_archivedbooking (tenant_id, created_at DESC);
+CREATE INDEX archbooking_seller_idx ON core_archivedbooking (seller_id);
+CREATE INDEX archbooking_created_idx ON core_archivedbooking (created_at);
+
+
+TABLE: core_archivedpayment
+CREATE TABLE core_archivedpayment (
+    id INTEGER PRIMARY KEY,
+    booking_id INTEGER NOT NULL,
+    seller_id INTEGER NOT NULL,
+    amount DECIMAL(15,2) NOT NULL,
+    platform_cut DECIMAL(15,2) DEFAULT 0,
+    seller_amount DECIMAL(15,2) DEFAULT 0,
+    status SMALLINT NOT NULL,  -- 2 APPROVED (sent), 3 REJECTED
+    approved_by_admin_id INTEGER,
+    approved_at DATETIME,
+    seller_amount_sent BOOLEAN DEFAULT FALSE,
+    seller_amount_sent_at DATETIME,
+    created_at DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    FOREIGN KEY (booking_id) REFERENCES core_archivedbooking(id) ON DELETE CASCADE,
+    FOREIGN KEY (seller_id) REFERENCES core_user(id) ON DELETE CASCADE,
     FOREIGN KEY (approved_by_admin_id) REFERENCES core_user(id) ON DELETE SET NULL
 );
+CREATE INDEX archpayment_seller_status_idx ON core_archivedpayment (seller_id, status);
+CREATE INDEX archpayment_created_idx ON core_archivedpayment (created_at);
+CREATE INDEX archpayment_sent_idx ON core_archivedpayment (seller_amount_sent_at DESC) WHERE seller_amount_sent;
 
 
 Signal Logic (pre_delete Booking)
@@ -360,4 +1701,84 @@ IF booking.status IN ('PENDING','CONFIRMED') THEN
         WHERE id = booking.property_id;
     END IF;
 END IF;
+
+
+Signal Logic (post_save / post_delete PropertyImage)
+
+-- on insert, or on update when the image changed (then the old name is released as below)
+INSERT OR IGNORE INTO core_imageblob (name, ref_count) VALUES (image.name, 0);
+UPDATE core_imageblob SET ref_count = ref_count + ? WHERE name IN (image.name);
+
+-- on delete
+UPDATE core_imageblob SET ref_count = MAX(ref_count - ?, 0) WHERE name IN (image.name);
+SELECT name FROM core_imageblob WHERE name IN (image.name) AND ref_count = 0;
+-- after commit, one transaction per name; the file is removed from disk before it commits
+DELETE FROM core_imageblob WHERE name = image.name AND ref_count = 0;
+
+-- files stored for rows never saved (release_unsaved_images, e.g. imports)
+INSERT OR IGNORE INTO core_imageblob (name, ref_count) VALUES (name, 0);
+-- then one transaction per name as above
+DELETE FROM core_imageblob WHERE name = name AND ref_count = 0;
+
+
+Signal Logic (property page version)
+
+-- pre_save Property (updates only)
+UPDATE core_property SET ..., version = version + 1 WHERE id = property.id;
+
+-- post_save / post_delete PropertyImage
+UPDATE core_property SET version = version + 1 WHERE id = image.property_id;
+
+-- post_save User (sellers, except last_login-only saves)
+UPDATE core_property SET version = version + 1 WHERE seller_id = user.id;
+
+
+Signal Logic (post_save / post_delete User, cached logged-in user)
+
+-- no SQL: bumps the user's version in the "auth" cache, now and again on
+-- commit, so CachedUserBackend loads the row once more
+SELECT * FROM core_user WHERE id = ?;  -- next request only
+
+
+Signal Logic (pre_save Property)
+
+-- Property.save runs in one transaction (BEGIN ... COMMIT); the stored
+-- values the other handlers compare against (updates only), row locked
+SELECT seller_id, address, city, property_type, price, status, title, description
+FROM core_property WHERE id = property.id FOR UPDATE;  -- sqlite: the write lock of the transaction
+
+-- new property, address/city changed or no coordinates yet: latitude and
+-- longitude come from core/data/bd_gazetteer.csv (no query), then
+geohash = geohash_encode(latitude, longitude)   -- '' when not found
+
+
+Signal Logic (post_save / post_delete Property, listing facets)
+
+-- for each of the 8 (city|'', type|'', bucket|'') keys of the old values
+-- (if the property was AVAILABLE) and of the new ones (if it is now),
+-- skipping keys both share
+INSERT OR IGNORE INTO core_facetcount (city, property_type, price_bucket, count) VALUES (?, ?, ?, 0);
+UPDATE core_facetcount SET count = MAX(count + ?, 0)
+WHERE city = ? AND property_type = ? AND price_bucket = ?;
+
+
+Signal Logic (similar listings refresh queue)
+
+-- post_save Property: new, or city/type/price/status/title/description changed
+INSERT INTO core_similarityrefresh (property_id, queued_at) VALUES (property.id, ?)
+ON CONFLICT (property_id) DO UPDATE SET queued_at = excluded.queued_at;
+
+-- pre_delete Property: the lists that show it
+INSERT INTO core_similarityrefresh (property_id, queued_at)
+SELECT property_id, ? FROM core_similarproperty WHERE similar_id = property.id AND property_id != property.id
+ON CONFLICT (property_id) DO UPDATE SET queued_at = excluded.queued_at;
+
+
+Signal Logic (post_save Property, when the seller changed)
+
+UPDATE core_visitrequest SET seller_id = property.seller_id WHERE property_id = property.id;
+UPDATE core_booking SET seller_id = property.seller_id WHERE property_id = property.id;
+UPDATE core_payment SET seller_id = property.seller_id
+WHERE booking_id IN (SELECT id FROM core_booking WHERE property_id = property.id);
+-- and the same three updates on core_archivedvisitrequest, core_archivedbooking, core_archivedpayment
 """
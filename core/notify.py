@@ -0,0 +1,123 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import QueueEvent
+
+
+# change notifier for the admin work queues
+#
+# a Payment, VisitRequest or Booking that is created or changes status
+# appends one small row to core_queueevent (other saves add nothing, and
+# the row holds only ids, so no related rows are read). Open admin pages
+# hold a server-sent events stream that polls for rows with a higher id (a
+# primary-key range scan that usually returns nothing) and pushes them to
+# the browser, which then fetches just the changed queue rows
+# (views.admin_queue_rows) instead of reloading the whole page and
+# rerunning every queue query.
+#
+# under ASGI the stream stays open for QUEUE_EVENTS_STREAM_SECONDS. A WSGI
+# worker would be tied up for all that time, so there the endpoint answers
+# with what is new and closes, and EventSource reconnects after
+# QUEUE_EVENTS_RETRY_SECONDS.
+
+
+def publish(kind, instance, created):
+    event = QueueEvent.objects.create(
+        kind=kind,
+        object_id=instance.id,
+        status=instance.status,
+        created=created,
+    )
+
+    # keep the table small; a cheap delete every few hundred events
+    if event.id % settings.QUEUE_EVENTS_PRUNE_EVERY == 0:
+        cutoff = timezone.now() - timedelta(seconds=settings.QUEUE_EVENTS_RETENTION)
+        QueueEvent.objects.filter(created_at__lt=cutoff).delete()
+
+    return event
+
+
+def publish_many(kind, instances):
+    # one insert for a batch of saves made with bulk_update, which sends no
+    # post_save signals
+    return QueueEvent.objects.bulk_create([
+        QueueEvent(kind=kind, object_id=instance.id, status=instance.status)
+        for instance in instances
+    ])
+
+
+def event_payload(event):
+    return {
+        "kind": event.kind,
+        "id": event.object_id,
+        "status": event.status,
+        "created": event.created,
+    }
+
+
+def format_sse(event):
+    return f"id: {event.id}\nevent: {event.kind.lower()}\ndata: {json.dumps(event_payload(event))}\n\n"
+
+
+def events_after(last_id, kinds=None):
+    events = QueueEvent.objects.filter(id__gt=last_id).order_by("id")
+    if kinds:
+        events = events.filter(kind__in=kinds)
+    return events[:100]
+
+
+def latest_event_id():
+    return QueueEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+
+def event_batch(last_id, kinds=None):
+    # the WSGI answer: what is new, then the id to resume from, which
+    # EventSource sends back as Last-Event-ID when it reconnects
+    if last_id is None:
+        last_id = latest_event_id()
+
+    parts = [f"retry: {int(settings.QUEUE_EVENTS_RETRY_SECONDS * 1000)}\n\n"]
+    for event in events_after(last_id, kinds):
+        last_id = event.id
+        parts.append(format_sse(event))
+    parts.append(f"id: {last_id}\n\n")
+    return "".join(parts)
+
+
+async def alatest_event_id():
+    last = await QueueEvent.objects.order_by("-id").values_list("id", flat=True).afirst()
+    return last or 0
+
+
+async def event_stream(last_id, kinds=None):
+    # ends after QUEUE_EVENTS_STREAM_SECONDS; EventSource reconnects on its
+    # own and sends Last-Event-ID, so nothing is missed in between
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.QUEUE_EVENTS_STREAM_SECONDS
+    idle = 0.0
+
+    # tells the browser how long to wait before reconnecting
+    yield f"retry: {int(settings.QUEUE_EVENTS_RETRY_SECONDS * 1000)}\n\n"
+
+    while loop.time() < deadline:
+        sent = False
+        async for event in events_after(last_id, kinds):
+            last_id = event.id
+            sent = True
+            yield format_sse(event)
+
+        if sent:
+            idle = 0.0
+            continue
+
+        # comment line keeps proxies from closing an idle connection
+        if idle >= 15:
+            idle = 0.0
+            yield ": keep-alive\n\n"
+
+        await asyncio.sleep(settings.QUEUE_EVENTS_POLL_SECONDS)
+        idle += settings.QUEUE_EVENTS_POLL_SECONDS
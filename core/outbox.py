@@ -0,0 +1,183 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db import connection, transaction
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+
+# transactional notification outbox
+#
+# views call notify() next to the state change they announce, inside the
+# same transaction: the message row commits or rolls back with it, and a
+# dedupe key keeps a retried or double-clicked action from queueing the
+# same notification twice. Subject and body are rendered from
+# templates/emails/<kind>_subject.txt and <kind>.txt at that point.
+#
+# The deliver_outbox job claims due messages (UPDATE ... RETURNING, like
+# core/jobs.py), holds back what would go over the global per-minute or
+# per-recipient hourly limits, collapses identical messages to the same
+# recipient into one email, and sends the rest over one backend
+# connection. Failures are retried with backoff up to OUTBOX_MAX_ATTEMPTS.
+
+
+logger = logging.getLogger(__name__)
+
+
+class Delivery:
+    def __init__(self):
+        self.sent = 0
+        self.merged = 0
+        self.deferred = 0
+        self.failed = 0
+
+    def __str__(self):
+        return f"{self.sent} sent, {self.merged} merged, {self.deferred} deferred, {self.failed} failed"
+
+
+def message(kind, user, key, **context):
+    # an unsaved OutboxMessage, or None for users without an email address
+    if not user.email:
+        return None
+    context["user"] = user
+    return OutboxMessage(
+        kind=kind,
+        recipient=user.email,
+        subject=" ".join(render_to_string(f"emails/{kind}_subject.txt", context).split())[:255],
+        body=render_to_string(f"emails/{kind}.txt", context),
+        dedupe_key=f"{kind}:{key}"[:200],
+    )
+
+
+def notify(kind, user, key, **context):
+    notify_many([message(kind, user, key, **context)])
+
+
+def notify_many(messages):
+    from .tasks import deliver_outbox
+
+    messages = [m for m in messages if m is not None]
+    if not messages:
+        return
+    # a key that is already queued (or sent) is skipped
+    OutboxMessage.objects.bulk_create(messages, ignore_conflicts=True)
+    deliver_outbox.delay()
+
+
+def claim(limit):
+    table = connection.ops.quote_name(OutboxMessage._meta.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    pending, sending = OutboxMessage.STATUS_CODES["PENDING"], OutboxMessage.STATUS_CODES["SENDING"]
+    skip_locked = " FOR UPDATE SKIP LOCKED" if connection.features.has_select_for_update_skip_locked else ""
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET status = %s, locked_at = %s, attempts = attempts + 1 "
+                f"WHERE id IN ("
+                f"SELECT id FROM {table} WHERE status = %s AND send_after <= %s "
+                f"ORDER BY send_after, id LIMIT %s{skip_locked}"
+                f") RETURNING id",
+                [sending, now, pending, now, limit],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+    return list(OutboxMessage.objects.filter(id__in=ids).order_by("id")) if ids else []
+
+
+def requeue_stale():
+    # SENDING messages of a worker that stopped half way; they may go out
+    # twice, which beats never
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    return OutboxMessage.objects.filter(status="SENDING", locked_at__lt=cutoff).update(
+        status="PENDING", locked_at=None,
+    )
+
+
+def room_this_minute(now):
+    sent = OutboxMessage.objects.filter(status="SENT", sent_at__gte=now - timedelta(minutes=1)).count()
+    return max(settings.OUTBOX_MAX_PER_MINUTE - sent, 0)
+
+
+def sent_last_hour(recipients, now):
+    rows = OutboxMessage.objects.filter(
+        recipient__in=recipients,
+        sent_at__gte=now - timedelta(hours=1),
+    ).values("recipient").annotate(sent=Count("id")).order_by()
+    return {row["recipient"]: row["sent"] for row in rows}
+
+
+def deliver(batch_size=None):
+    # sends one batch of due messages; returns a Delivery with the counts
+    result = Delivery()
+    now = timezone.now()
+
+    limit = min(batch_size or settings.OUTBOX_BATCH_SIZE, room_this_minute(now))
+    if limit <= 0:
+        return result
+    batch = claim(limit)
+    if not batch:
+        return result
+
+    # over the per-recipient limit: try again in an hour
+    sent = sent_last_hour({m.recipient for m in batch}, now)
+    due, deferred = [], []
+    for m in batch:
+        if sent.get(m.recipient, 0) >= settings.OUTBOX_MAX_PER_RECIPIENT_PER_HOUR:
+            deferred.append(m.id)
+            continue
+        sent[m.recipient] = sent.get(m.recipient, 0) + 1
+        due.append(m)
+    if deferred:
+        OutboxMessage.objects.filter(id__in=deferred).update(
+            status="PENDING", send_after=now + timedelta(hours=1), attempts=0, locked_at=None,
+        )
+        result.deferred = len(deferred)
+
+    # identical messages to one recipient go out once
+    groups = {}
+    for m in due:
+        groups.setdefault((m.recipient, m.subject, m.body), []).append(m)
+
+    delivered, failed = [], []
+    with mail.get_connection() as backend:
+        for (recipient, subject, body), group in groups.items():
+            email = mail.EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [recipient])
+            try:
+                backend.send_messages([email])
+            except Exception as e:
+                logger.warning("Outbox message %s to %s failed: %s", group[0].id, recipient, e)
+                failed.extend((m, repr(e)) for m in group)
+                continue
+            delivered.extend(group)
+            result.merged += len(group) - 1
+
+    if delivered:
+        OutboxMessage.objects.filter(id__in=[m.id for m in delivered]).update(
+            status="SENT", sent_at=timezone.now(), last_error="",
+        )
+        result.sent = len(delivered) - result.merged
+
+    for m, error in failed:
+        if m.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            OutboxMessage.objects.filter(id=m.id).update(status="FAILED", last_error=error)
+        else:
+            retry_at = timezone.now() + timedelta(seconds=settings.OUTBOX_RETRY_BACKOFF * 2 ** (m.attempts - 1))
+            OutboxMessage.objects.filter(id=m.id).update(
+                status="PENDING", send_after=retry_at, locked_at=None, last_error=error,
+            )
+    result.failed = len(failed)
+
+    return result
+
+
+def next_due():
+    # when the earliest pending message may go out, or None
+    return OutboxMessage.objects.filter(status="PENDING").order_by("send_after").values_list(
+        "send_after", flat=True
+    ).first()
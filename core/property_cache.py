@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from .models import Property, PropertyImage, VisitRequest, Booking, SimilarProperty
+
+
+# property detail page data
+#
+# the property, its seller and its gallery are the same for every tenant,
+# so they are cached under the property's version (bumped by the signals in
+# models.py on any change). Each request then runs one query: the current
+# version plus the tenant's visit/booking flags, all from the property row,
+# and one for the similar listings (precomputed by core/similarity.py).
+#
+# Only the fields the page shows are loaded, so the cached copy carries no
+# seller password hash or other account data; a field added to the template
+# has to be added to PAGE_FIELDS too, or every render would load it again.
+
+SIMILAR_SHOWN = 4
+
+PAGE_FIELDS = (
+    "title", "address", "city", "property_type", "price", "status", "description", "created_at",
+    "seller__username", "seller__email", "seller__phone_number",
+)
+
+
+def cache_key(property_id, version):
+    return f"property-detail:{property_id}:{version}"
+
+
+def tenant_flags(property_id, tenant):
+    # values() instead of a model instance: nothing tenant-specific ends up on
+    # the cached property object
+    visits = VisitRequest.objects.filter(property=OuterRef("pk"), tenant=tenant)
+    bookings = Booking.objects.filter(
+        property=OuterRef("pk"),
+        tenant=tenant,
+        status__in=["PENDING", "CONFIRMED", "COMPLETED"],
+    )
+
+    return Property.objects.filter(id=property_id).values(
+        "version",
+        has_pending_visit=Exists(visits.filter(status="PENDING")),
+        has_approved_visit=Exists(visits.filter(status="APPROVED")),
+        has_booking=Exists(bookings),
+    )
+
+
+def load_page(property_id):
+    prop = Property.objects.select_related("seller").only(*PAGE_FIELDS).get(id=property_id)
+    images = list(PropertyImage.objects.filter(property_id=property_id).only("image").order_by("id"))
+    return prop, images
+
+
+def get_page(property_id, version):
+    key = cache_key(property_id, version)
+    page = cache.get(key)
+    if page is None:
+        page = load_page(property_id)
+        cache.set(key, page, settings.PROPERTY_DETAIL_CACHE_SECONDS)
+    return page
+
+
+def similar_listings(property_id):
+    # precomputed neighbours that are still on the market, best first
+    return list(
+        SimilarProperty.objects.filter(property_id=property_id, similar__status="AVAILABLE")
+        .select_related("similar")
+        .order_by("rank")[:SIMILAR_SHOWN]
+    )
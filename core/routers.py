@@ -0,0 +1,27 @@
+# database routing
+#
+# django_session lives in its own SQLite file (DATABASES["sessions"]), so
+# logins and session updates never wait on the main database's write lock
+# and the main file only holds application data.
+
+
+class SessionRouter:
+    app_label = "sessions"
+    database = "sessions"
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return self.database
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return self.database
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if app_label == self.app_label:
+            return db == self.database
+        if db == self.database:
+            return False
+        return None
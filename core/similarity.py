@@ -0,0 +1,235 @@
+import math
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .facets import normalize_city
+from .models import Property, SimilarProperty, SimilarityRefresh
+
+
+# "similar properties" for the detail page
+#
+# every AVAILABLE property becomes one row of a feature matrix made of
+# weighted blocks: price (log scale between the fixed SIMILAR_PRICE_BOUNDS,
+# as a point on a quarter circle so the dot product of two prices is cos of
+# their distance), city and type
+# (one-hot) and the title/description words (hashed term frequencies).
+# Each block has unit length, so the dot product of two rows is the
+# weighted sum of the per-block similarities, between 0 and 1 after
+# dividing by the total weight. Top-k neighbours are found a block of rows
+# at a time with one matrix product per block and stored in
+# SimilarProperty; the detail page reads them in one query.
+#
+# Property signals queue a property in SimilarityRefresh when one of the
+# FEATURE_FIELDS changes; refresh() (run by the refresh_similar_properties
+# job) then recomputes only the lists that could have moved. A row's
+# features depend on that property alone, so the other rows, and the
+# scores stored for them, stay valid.
+
+
+FEATURE_FIELDS = ("city", "property_type", "price", "status", "title", "description")
+
+TOP_K = 8
+BLOCK_SIZE = 1024
+TEXT_DIMENSIONS = 512
+
+WEIGHTS = {"price": 3.0, "city": 2.0, "type": 2.0, "text": 1.0}
+
+STOP_WORDS = {
+    "the", "and", "for", "with", "this", "that", "are", "has", "have", "from",
+    "near", "all", "very", "our", "your", "you", "its", "can", "will", "per",
+}
+
+# refresh() rebuilds everything once this share of the lists is affected
+FULL_REBUILD_SHARE = 0.5
+
+
+def tokens(text):
+    return [
+        word for word in re.findall(r"[a-z0-9]+", (text or "").lower())
+        if len(word) > 2 and word not in STOP_WORDS
+    ]
+
+
+def unit_rows(block):
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return block / norms
+
+
+def one_hot(values):
+    vocabulary = {value: i for i, value in enumerate(sorted(set(values)))}
+    block = np.zeros((len(values), len(vocabulary)), dtype=np.float32)
+    block[np.arange(len(values)), [vocabulary[value] for value in values]] = 1
+    return block
+
+
+def price_block(prices):
+    low, high = (math.log1p(bound) for bound in settings.SIMILAR_PRICE_BOUNDS)
+    prices = np.log1p(np.maximum(np.asarray(prices, dtype=np.float64), 0))
+    scaled = np.clip((prices - low) / (high - low), 0, 1)
+    angle = scaled * (math.pi / 2)
+    return np.stack([np.cos(angle), np.sin(angle)], axis=1).astype(np.float32)
+
+
+def text_block(texts):
+    # hashing trick with a stable hash (crc32), so no vocabulary to keep
+    block = np.zeros((len(texts), TEXT_DIMENSIONS), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word, count in Counter(tokens(text)).items():
+            block[row, zlib.crc32(word.encode()) % TEXT_DIMENSIONS] += 1 + math.log(count)
+    return unit_rows(block)
+
+
+def feature_matrix(rows):
+    # rows: (id, city, property_type, price, title, description)
+    # -> (ids array, float32 matrix with one unit-weighted row per property)
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    if not rows:
+        return ids, np.zeros((0, 0), dtype=np.float32)
+
+    blocks = {
+        "price": price_block([float(row[3]) for row in rows]),
+        "city": one_hot([normalize_city(row[1]) for row in rows]),
+        "type": one_hot([row[2] for row in rows]),
+        "text": text_block([f"{row[4]} {row[5]}" for row in rows]),
+    }
+    total = sum(WEIGHTS.values())
+    matrix = np.hstack([
+        blocks[name] * np.float32(math.sqrt(weight / total))
+        for name, weight in WEIGHTS.items()
+    ])
+    return ids, matrix
+
+
+def nearest(matrix, rows, k=TOP_K, block_size=BLOCK_SIZE):
+    # yields (row, neighbour rows, scores) for the given row positions,
+    # best first, never the row itself
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        for row in rows:
+            yield row, np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        return
+
+    rows = np.asarray(rows, dtype=np.int64)
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        scores = matrix[block_rows] @ matrix.T
+        scores[np.arange(len(block_rows)), block_rows] = -np.inf
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        # best score first, equal scores by id (rows are in id order)
+        order = np.lexsort((top, -top_scores), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        for i, row in enumerate(block_rows):
+            yield row, top[i], top_scores[i]
+
+
+def load_matrix():
+    rows = list(
+        Property.objects.filter(status="AVAILABLE").order_by("id").values_list(
+            "id", "city", "property_type", "price", "title", "description",
+        )
+    )
+    return feature_matrix(rows)
+
+
+def neighbour_rows(ids, matrix, rows, k):
+    return [
+        SimilarProperty(
+            property_id=int(ids[row]),
+            similar_id=int(ids[neighbour]),
+            rank=rank,
+            score=round(float(score), 6),
+        )
+        for row, neighbours, scores in nearest(matrix, rows, k)
+        for rank, (neighbour, score) in enumerate(zip(neighbours, scores), start=1)
+    ]
+
+
+def rebuild(k=TOP_K):
+    started = timezone.now()
+    ids, matrix = load_matrix()
+    links = neighbour_rows(ids, matrix, range(len(ids)), k)
+
+    with transaction.atomic():
+        SimilarProperty.objects.all().delete()
+        SimilarProperty.objects.bulk_create(links, batch_size=1000)
+        SimilarityRefresh.objects.filter(queued_at__lte=started).delete()
+    return len(ids)
+
+
+def queue_refresh(property_ids):
+    from .tasks import refresh_similar_properties
+
+    property_ids = set(property_ids)
+    if not property_ids:
+        return
+
+    now = timezone.now()
+    SimilarityRefresh.objects.bulk_create(
+        [SimilarityRefresh(property_id=property_id, queued_at=now) for property_id in property_ids],
+        update_conflicts=True,
+        unique_fields=["property_id"],
+        update_fields=["queued_at"],
+    )
+    # a background job drains the queue (one queued job at a time)
+    refresh_similar_properties.delay()
+
+
+def refresh(k=TOP_K):
+    # recompute the lists that queued changes can have moved; returns how
+    # many lists were rewritten
+    started = timezone.now()
+    queued = set(SimilarityRefresh.objects.filter(queued_at__lte=started).values_list("property_id", flat=True))
+    if not queued:
+        return 0
+
+    ids, matrix = load_matrix()
+    position = {int(property_id): row for row, property_id in enumerate(ids)}
+    changed = [position[property_id] for property_id in queued if property_id in position]
+
+    # lists that point at a changed (or no longer available) property
+    affected = set(
+        SimilarProperty.objects.filter(similar_id__in=queued).values_list("property_id", flat=True)
+    )
+    affected |= queued
+
+    # lists a changed property now belongs in: it beats their current k-th
+    # neighbour, or they are not full yet
+    if changed and len(ids) > 1:
+        best = matrix @ matrix[changed].T
+        best[changed, np.arange(len(changed))] = -np.inf
+        best = best.max(axis=1)
+
+        full = min(k, len(ids) - 1)
+        kth = np.full(len(ids), -np.inf, dtype=np.float32)
+        for property_id, count, low in SimilarProperty.objects.values("property_id").annotate(
+            count=Count("id"), low=Min("score")
+        ).values_list("property_id", "count", "low"):
+            if property_id in position and count >= full:
+                kth[position[property_id]] = low
+        affected |= {int(property_id) for property_id in ids[best > kth]}
+
+    if len(affected) >= FULL_REBUILD_SHARE * max(len(ids), 1):
+        rebuild(k)
+        return len(ids)
+
+    rows = sorted(position[property_id] for property_id in affected if property_id in position)
+    links = neighbour_rows(ids, matrix, rows, k)
+
+    with transaction.atomic():
+        SimilarProperty.objects.filter(property_id__in=affected).delete()
+        SimilarProperty.objects.bulk_create(links, batch_size=1000)
+        SimilarityRefresh.objects.filter(property_id__in=queued, queued_at__lte=started).delete()
+    return len(affected)
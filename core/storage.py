@@ -0,0 +1,64 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# content-addressed storage for property images
+#
+# a file is named after the sha256 of its bytes and sharded into nested
+# directories, e.g. property_images/3f/a9/3fa9...e1.jpg, so no directory
+# ever holds more than a few hundred entries. Uploading the same photo
+# twice gives the same name, and the second copy is never written.
+# How many rows point at a name is tracked by ImageBlob (see models.py).
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    shard_depth = 2
+    shard_width = 2
+
+    def digest(self, content):
+        sha = hashlib.sha256()
+        for chunk in content.chunks():
+            sha.update(chunk)
+        content.seek(0)
+        return sha.hexdigest()
+
+    def hashed_name(self, name, digest):
+        # keep the upload_to directory, drop the client's file name
+        directory = posixpath.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        shards = [
+            digest[i * self.shard_width:(i + 1) * self.shard_width]
+            for i in range(self.shard_depth)
+        ]
+        return posixpath.join(directory, *shards, digest + ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        name = self.hashed_name(name, self.digest(content))
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def restore(self, name, content):
+        # writes a file back under the name it was stored as, e.g. when a
+        # release removed it just as a new row took the name again
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        if os.path.splitext(posixpath.basename(name))[0] != self.digest(content):
+            raise ValueError(f"{name} does not match the content.")
+        if self.exists(name):
+            return name
+        return super().save(name, content)
+
+
+property_image_storage = ContentAddressedStorage()
@@ -0,0 +1,110 @@
+import itertools
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import SafeString
+
+
+# streamed rendering for the big admin tables (users, properties, deals)
+#
+# the page template is rendered first with a Rows object in place of each
+# table body; {% if rows %} reads the first row, and {{ rows }} prints a
+# placeholder. That page is sent right away, cut at the placeholders, and
+# each table body follows as it is rendered from queryset.iterator(), a
+# chunk of STREAM_ROWS_CHUNK_SIZE rows at a time through a row template
+# ("{% for ... in rows %}"). The browser shows the head and the first rows
+# while the rest are still being read, and only one chunk of rows is in
+# memory at any time.
+#
+# with STREAM_ADMIN_TABLES off the same pieces are joined into a normal
+# response. The CSRF token is created before the response is returned,
+# since the cookie is set on the way out and row forms use it later.
+
+
+PLACEHOLDER = re.compile(r"<!--rows:(\d+)-->")
+
+
+class Rows:
+    def __init__(self, queryset, template):
+        self.queryset = queryset
+        self.template = template
+        self.key = None
+        self.rows = None
+        self.first = None
+
+    def start(self):
+        if self.rows is None:
+            self.rows = self.queryset.iterator(chunk_size=settings.STREAM_ROWS_CHUNK_SIZE)
+            self.first = next(self.rows, None)
+
+    def __bool__(self):
+        self.start()
+        return self.first is not None
+
+    def __str__(self):
+        return SafeString(f"<!--rows:{self.key}-->")
+
+    def chunks(self):
+        self.start()
+        if self.first is None:
+            return
+        rows = itertools.chain([self.first], self.rows)
+        while chunk := list(itertools.islice(rows, settings.STREAM_ROWS_CHUNK_SIZE)):
+            yield chunk
+
+
+def page_chunks(request, template_name, context):
+    # renders the page now; the table bodies are rendered as it is iterated
+    get_token(request)
+    tables = [value for value in context.values() if isinstance(value, Rows)]
+    for key, table in enumerate(tables):
+        table.key = key
+
+    parts = PLACEHOLDER.split(render_to_string(template_name, context, request))
+    return render_parts(request, parts, tables)
+
+
+def render_parts(request, parts, tables):
+    # parts alternate page text and table keys
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            yield part
+            continue
+        template = get_template(tables[int(part)].template)
+        for chunk in tables[int(part)].chunks():
+            yield template.render({"rows": chunk}, request)
+
+
+def streaming_response(chunks):
+    response = StreamingHttpResponse(chunks)
+    # nginx would otherwise buffer the whole page
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def render_page(request, template_name, context):
+    chunks = page_chunks(request, template_name, context)
+    if not settings.STREAM_ADMIN_TABLES:
+        return HttpResponse("".join(chunks))
+    return streaming_response(chunks)
+
+
+async def arender_page(request, template_name, context):
+    # render_page() for the async views: the page and every chunk are
+    # rendered in the sync thread, where the queryset iterators live
+    chunks = await sync_to_async(page_chunks)(request, template_name, context)
+    if not settings.STREAM_ADMIN_TABLES:
+        return HttpResponse(await sync_to_async("".join)(chunks))
+    return streaming_response(async_chunks(chunks))
+
+
+async def async_chunks(chunks):
+    # ASGI reads a sync iterator into memory before sending it, so it gets
+    # an async one that takes each chunk from the sync thread
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
@@ -0,0 +1,45 @@
+from django.utils import timezone
+
+from .jobs import heartbeat, task
+from . import deletion, imports, outbox, similarity
+
+
+# background tasks run by the runworkers command (core/jobs.py)
+
+
+@task(unique=True, priority=-5)
+def refresh_similar_properties():
+    # drains SimilarityRefresh; queued by the property signals
+    similarity.refresh()
+
+
+@task(unique=True, priority=5)
+def deliver_outbox():
+    # sends due notification emails batch by batch, then comes back for
+    # the ones held by rate limits or retry backoff
+    outbox.requeue_stale()
+    while True:
+        result = outbox.deliver()
+        if not (result.sent or result.merged or result.deferred or result.failed):
+            break
+        heartbeat()
+
+    due = outbox.next_due()
+    if due is not None:
+        deliver_outbox.enqueue(countdown=max((due - timezone.now()).total_seconds(), 10))
+
+
+@task(max_attempts=3)
+def run_import(run_id):
+    # a retry carries on after the last committed batch
+    from .models import ImportRun
+
+    imports.run_import(ImportRun.objects.get(id=run_id))
+
+
+@task(max_attempts=5)
+def run_deletion(run_id):
+    # a retry deletes whatever the last attempt left
+    from .models import DeletionRun
+
+    deletion.run_deletion(DeletionRun.objects.get(id=run_id))
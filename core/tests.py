@@ -1,3 +1,1835 @@
-from django.test import TestCase
+import csv
+import datetime
+import hashlib
+import json
+import pickle
+import re
+import os
+import tempfile
+import uuid
+import zipfile
+from collections import Counter
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models.query import QuerySet
+from django.db.models.signals import pre_save
+from django.db.migrations.loader import MigrationLoader
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from . import (
+    activity, async_views, exports, facets, geo, imports, jobs, outbox, property_cache, similarity, tasks, user_cache,
+    views,
+)
+from .models import (
+    User, Property, VisitRequest, Booking, Payment, FacetCount, SimilarProperty, SimilarityRefresh,
+    QueueEvent, Job, OutboxMessage, ImportRun, ImageBlob, PropertyImage, TenantOwnership,
+    ArchivedBooking, ArchivedPayment, ArchivedVisitRequest, DeletionRun, UserActivitySummary, UploadSession,
+)
+from .storage import ContentAddressedStorage, property_image_storage
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is sqlite specific")
+class QueryPlanTests(TestCase):
+    """Every query behind the main pages should be answered from an index."""
+
+    databases = {"default", "sessions"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        cls.seller = User.objects.create_user("seller", password="x", role="SELLER")
+        cls.tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        cls.agent = User.objects.create_user("agent", password="x", role="AGENT")
+
+        cls.property = Property.objects.create(
+            seller=cls.seller, title="Flat", address="Road 1", city="Dhaka",
+            property_type="SELL", price=1000, is_featured=True,
+        )
+        cls.booking = Booking.objects.create(property=cls.property, tenant=cls.tenant, status="CONFIRMED")
+        VisitRequest.objects.create(
+            property=cls.property, tenant=cls.tenant, agent=cls.agent,
+            preferred_date=datetime.date.today(), status="APPROVED",
+        )
+        Payment.objects.create(
+            booking=cls.booking, amount=1000, status="APPROVED", approved_at=timezone.now(),
+            seller_amount_sent=True, seller_amount_sent_at=timezone.now(),
+        )
+        archived = ArchivedBooking.objects.create(
+            id=1000, property=cls.property, tenant=cls.tenant, seller=cls.seller,
+            status="CANCELLED", created_at=timezone.now(),
+        )
+        ArchivedPayment.objects.create(
+            id=1000, booking=archived, seller=cls.seller, amount=1000, status="REJECTED", created_at=timezone.now(),
+        )
+        ArchivedVisitRequest.objects.create(
+            id=1000, property=cls.property, tenant=cls.tenant, seller=cls.seller,
+            preferred_date=datetime.date.today(), status="REJECTED", created_at=timezone.now(),
+        )
+
+    def query_plans(self, user, url):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            # streamed pages run their row queries as they are read
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT"):
+                    continue
+                # captured sql has the parameters inlined already
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                yield sql, [row[3] for row in cursor.fetchall()]
+
+    def assertIndexed(self, user, name, *args):
+        url = reverse(name, args=args)
+        for sql, plan in self.query_plans(user, url):
+            for step in plan:
+                table = step.split()[1] if len(step.split()) > 1 else ""
+
+                # a scan without WHERE is a deliberate full listing
+                if step.startswith("SCAN") and "USING" not in step and " WHERE " in sql:
+                    self.fail(f"{name}: full scan of {table}\n{sql}\n{plan}")
+
+                if "TEMP B-TREE" in step:
+                    self.fail(f"{name}: {step}\n{sql}\n{plan}")
+
+    def test_home(self):
+        self.assertIndexed(self.tenant, "home")
+
+    def test_admin_pages(self):
+        for name in (
+            "admin-dashboard", "admin-payments", "admin-deals", "admin-users",
+            "admin-properties", "admin-add-property", "admin-visit-requests", "admin-bookings",
+            "admin-history",
+        ):
+            with self.subTest(view=name):
+                self.assertIndexed(self.admin, name)
+
+    def test_tenant_pages(self):
+        for name in (
+            "tenant-dashboard", "tenant-my-visits", "tenant-my-bookings", "tenant-my-properties", "tenant-history",
+        ):
+            with self.subTest(view=name):
+                self.assertIndexed(self.tenant, name)
+
+        self.assertIndexed(self.tenant, "property-detail", self.property.id)
+        self.assertIndexed(self.tenant, "payment-confirmation", self.booking.id)
+
+    def test_seller_pages(self):
+        for name in (
+            "seller-dashboard", "seller_properties", "seller_appointments",
+            "seller_bookings", "seller_payments",
+        ):
+            with self.subTest(view=name):
+                self.assertIndexed(self.seller, name)
+
+        self.assertIndexed(self.seller, "seller_edit_property", self.property.id)
+
+
+class SellerCopyTests(TestCase):
+    """Visits, bookings and payments carry their property's seller."""
+
+    def test_seller_follows_property(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        other = User.objects.create_user("other", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        prop = Property.objects.create(
+            seller=seller, title="Flat", address="Road 1", city="Dhaka",
+            property_type="RENT", price=500,
+        )
+        visit = VisitRequest.objects.create(property=prop, tenant=tenant, preferred_date=datetime.date.today())
+        booking = Booking.objects.create(property=prop, tenant=tenant)
+        payment = Payment.objects.create(booking=booking, amount=500)
+
+        self.assertEqual(
+            [visit.seller_id, booking.seller_id, payment.seller_id],
+            [seller.id, seller.id, seller.id],
+        )
+
+        prop.seller = other
+        prop.save()
+        for obj in (visit, booking, payment):
+            obj.refresh_from_db()
+            self.assertEqual(obj.seller_id, other.id)
+
+        call_command("check_seller_consistency", stdout=StringIO())
+
+        Booking.objects.filter(id=booking.id).update(seller=seller)
+        with self.assertRaises(CommandError):
+            call_command("check_seller_consistency", stdout=StringIO())
+        call_command("check_seller_consistency", "--fix", stdout=StringIO())
+        booking.refresh_from_db()
+        self.assertEqual(booking.seller_id, other.id)
+
+
+class CodedChoiceFieldTests(TestCase):
+    """Coded choices read and write as strings, store small ints, and reject unknown values."""
+
+    databases = {"default", "sessions"}
+
+    def raw_status(self, prop):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT status FROM core_property WHERE id = %s", [prop.id])
+            return cursor.fetchone()[0]
+
+    def test_round_trip(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        prop = Property.objects.create(
+            seller=seller, title="Flat", address="Road 1", city="Dhaka", property_type="RENT", price=500,
+        )
+        Property.objects.filter(id=prop.id).update(status="SOLD")
+        self.assertEqual(self.raw_status(prop), 3)
+
+        prop = Property.objects.get(id=prop.id)
+        self.assertEqual((prop.status, prop.get_status_display()), ("SOLD", "Sold"))
+        self.assertEqual(list(Property.objects.filter(status__in=["SOLD", "BOOKED"])), [prop])
+        self.assertEqual(Property.objects.values_list("status", flat=True).get(), "SOLD")
+
+        # a superuser made without a role
+        admin = User.objects.create_superuser("root", password="x")
+        self.assertEqual(User.objects.get(id=admin.id).role, "")
+
+    def test_unknown_values_and_codes(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        self.assertFalse(User.objects.filter(role="BOGUS").exists())
+        self.assertEqual(list(User.objects.filter(role__in=["BOGUS", "SELLER"])), [seller])
+
+        with self.assertRaises(ValidationError), transaction.atomic():
+            User.objects.create_user("bogus", password="x", role="BOGUS")
+        with self.assertRaises(ValidationError), transaction.atomic():
+            User.objects.filter(id=seller.id).update(role="BOGUS")
+
+        # a code no choice has, written outside the ORM
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE core_user SET role = 99 WHERE id = %s", [seller.id])
+        with self.assertRaisesMessage(ValueError, "unknown code 99"):
+            User.objects.get(id=seller.id)
+
+    def test_admin_add_user_rejects_unknown_role(self):
+        admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        self.client.force_login(admin)
+        response = self.client.post(reverse("admin-add-user"), {
+            "username": "new", "email": "new@example.com", "phone": "1", "role": "BOGUS", "password": "secret1",
+        })
+        self.assertContains(response, "Invalid role selected.")
+        self.assertFalse(User.objects.filter(username="new").exists())
+
+
+class CodedChoiceMigrationTests(TransactionTestCase):
+    """0020 turns the old string columns into codes and back."""
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([("core", target)])
+        return executor.loader.project_state([("core", target)]).apps
+
+    def test_forwards_and_backwards(self):
+        latest = MigrationLoader(connection).graph.leaf_nodes("core")[0][1]
+        self.addCleanup(self.migrate, latest)
+
+        apps = self.migrate("0019_hot_query_indexes")
+        OldUser, OldProperty = apps.get_model("core", "User"), apps.get_model("core", "Property")
+        seller = OldUser.objects.create(username="seller", role="SELLER")
+        OldUser.objects.create(username="root", role="")
+        for status in ("SOLD", "NOT_AVAILABLE", "WHATEVER"):
+            OldProperty.objects.create(
+                seller=seller, title=status, address="Road 1", city="Dhaka", property_type="RENT", price=1,
+                status=status,
+            )
+
+        apps = self.migrate("0020_coded_status_fields")
+        Property = apps.get_model("core", "Property")
+        # legacy values are renamed, unknown ones fall back to the default
+        self.assertEqual(
+            dict(Property.objects.values_list("title", "status")),
+            {"SOLD": "SOLD", "NOT_AVAILABLE": "INACTIVE", "WHATEVER": "AVAILABLE"},
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT username, role FROM core_user ORDER BY username")
+            self.assertEqual(cursor.fetchall(), [("root", 0), ("seller", 2)])
+
+        apps = self.migrate("0019_hot_query_indexes")
+        Property = apps.get_model("core", "Property")
+        self.assertEqual(
+            dict(Property.objects.values_list("title", "status")),
+            {"SOLD": "SOLD", "NOT_AVAILABLE": "INACTIVE", "WHATEVER": "AVAILABLE"},
+        )
+
+
+class PropertySearchTests(TestCase):
+    """Properties are geocoded on save and found by radius or bounding box."""
+
+    databases = {"default", "sessions"}
+
+    def test_radius_and_bbox_search(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+
+        def create(title, address, city):
+            return Property.objects.create(
+                seller=seller, title=title, address=address, city=city,
+                property_type="RENT", price=500,
+            )
+
+        gulshan = create("Gulshan flat", "Road 90, Gulshan 2", "Dhaka")
+        banani = create("Banani flat", "House 5, Banani", "Dhaka")
+        uttara = create("Uttara flat", "Sector 7, Uttara", "Dhaka")
+        create("Ctg flat", "Agrabad", "Chittagong")
+        nowhere = create("Unknown", "Somewhere", "Atlantis")
+
+        self.assertEqual(gulshan.geohash, geo.geohash_encode(gulshan.latitude, gulshan.longitude))
+        self.assertIsNone(nowhere.latitude)
+        self.assertEqual(nowhere.geohash, "")
+
+        # moving the property geocodes it again
+        banani.address = "Mirpur 10"
+        banani.save()
+        self.assertEqual(banani.latitude, geo.find_place("Mirpur").latitude)
+
+        self.client.force_login(tenant)
+        url = reverse("property-search")
+
+        response = self.client.get(url, {"near": "Gulshan", "radius_km": 3})
+        self.assertEqual([r["id"] for r in response.json()["results"]], [gulshan.id])
+
+        response = self.client.get(url, {"lat": gulshan.latitude, "lon": gulshan.longitude, "radius_km": 10})
+        results = response.json()["results"]
+        self.assertEqual([r["id"] for r in results], [gulshan.id, banani.id, uttara.id])
+        self.assertEqual(results, sorted(results, key=lambda r: r["distance_km"]))
+
+        response = self.client.get(url, {"bbox": "23.7,90.3,23.9,90.5"})
+        self.assertEqual({r["id"] for r in response.json()["results"]}, {gulshan.id, banani.id, uttara.id})
+
+        # the limit applies in SQL, the count to every match
+        response = self.client.get(url, {"bbox": "23.7,90.3,23.9,90.5", "limit": 2})
+        self.assertEqual((response.json()["count"], len(response.json()["results"])), (3, 2))
+
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {"bbox": "1,2,3"}).status_code, 400)
+        for params in ({"bbox": "-inf,0,1,inf"}, {"lat": "nan", "lon": 90}, {"lat": 23, "lon": 90, "radius_km": "inf"},
+                       {"bbox": "23.7,90.3,23.9,90.5", "limit": 0}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+
+class FacetCountTests(TestCase):
+    """Listing facet counts follow property writes and match a full rebuild."""
+
+    def counts(self):
+        return dict(
+            ((row.city, row.property_type, row.price_bucket), row.count)
+            for row in FacetCount.objects.filter(count__gt=0)
+        )
+
+    def test_incremental_counts_match_rebuild(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+
+        def create(city, property_type, price):
+            return Property.objects.create(
+                seller=seller, title="Flat", address="Road 1", city=city,
+                property_type=property_type, price=price,
+            )
+
+        flat = create("Dhaka", "RENT", 30000)
+        create("dhaka ", "RENT", 12000)
+        house = create("Sylhet", "SELL", 4000000)
+
+        self.assertEqual(self.counts()[("Dhaka", "RENT", "")], 2)
+        self.assertEqual(self.counts()[("", "", "")], 3)
+
+        flat.city = "Khulna"
+        flat.price = 60000
+        flat.save()
+        house.status = "BOOKED"
+        house.save()
+        create("Sylhet", "SELL", 900000).delete()
+
+        counts = self.counts()
+        self.assertEqual(counts[("Dhaka", "", "")], 1)
+        self.assertEqual(counts[("Khulna", "RENT", "50k-100k")], 1)
+        self.assertNotIn(("Sylhet", "", ""), counts)
+        self.assertEqual(counts[("", "", "")], 2)
+
+        FacetCount.objects.update(count=0)
+        call_command("rebuild_facet_counts", stdout=StringIO())
+        self.assertEqual(self.counts(), counts)
+
+        listing = facets.for_listing()
+        self.assertEqual(listing["total"], 2)
+        self.assertEqual([facet["value"] for facet in listing["prices"]], ["10k-25k", "50k-100k"])
+
+    def test_counts_move_from_the_stored_row(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        flat, _ = (
+            Property.objects.create(
+                seller=seller, title=title, address="Road 1", city="Dhaka", property_type="RENT", price=30000,
+            )
+            for title in ("Flat", "House")
+        )
+
+        # the stored values are read in the save's own transaction, with the
+        # row locked, so a copy loaded before another save moves nothing twice
+        depth = []
+
+        def remember(sender, instance, **kwargs):
+            depth.append(len(connection.savepoint_ids))
+        outer = len(connection.savepoint_ids)
+        pre_save.connect(remember, sender=Property)
+        self.addCleanup(pre_save.disconnect, remember, sender=Property)
+
+        first, second = Property.objects.get(id=flat.id), Property.objects.get(id=flat.id)
+        first.status = "SOLD"
+        first.save()
+        second.status = "SOLD"
+        second.save()
+
+        self.assertEqual(depth, [outer + 1, outer + 1])
+        self.assertEqual(self.counts()[("Dhaka", "RENT", "25k-50k")], 1)
+        counts = self.counts()
+        call_command("rebuild_facet_counts", stdout=StringIO())
+        self.assertEqual(self.counts(), counts)
+
+
+class SimilarPropertyTests(TestCase):
+    """Neighbour lists are rebuilt in full or refreshed from the queue."""
+
+    databases = {"default", "sessions"}
+
+    def test_refresh_matches_rebuild(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+
+        def create(title, city, property_type, price, description=""):
+            return Property.objects.create(
+                seller=seller, title=title, address="Road 1", city=city,
+                property_type=property_type, price=price, description=description,
+            )
+
+        flat = create("Lake view flat", "Dhaka", "RENT", 30000, "Three bed flat with lake view")
+        twin = create("Lake view apartment", "Dhaka", "RENT", 32000, "Three bed apartment, lake view")
+        create("Office floor", "Chattogram", "SELL", 9000000, "Commercial floor near port")
+        create("Duplex", "Sylhet", "SELL", 15000000, "Duplex house with garden")
+
+        def lists():
+            return list(SimilarProperty.objects.order_by("property_id", "rank").values_list(
+                "property_id", "similar_id", "rank",
+            ))
+
+        call_command("refresh_similar_properties", "--all", stdout=StringIO())
+        self.assertEqual(flat.similar_links.get(rank=1).similar_id, twin.id)
+        self.assertFalse(SimilarityRefresh.objects.exists())
+
+        # a close match appears, another listing leaves the market
+        closer = create("Lake view flat", "Dhaka", "RENT", 30500, "Three bed flat with lake view")
+        twin.status = "BOOKED"
+        twin.save()
+        call_command("refresh_similar_properties", stdout=StringIO())
+        incremental = lists()
+
+        self.assertEqual(flat.similar_links.get(rank=1).similar_id, closer.id)
+        self.assertFalse(SimilarProperty.objects.filter(similar=twin).exists())
+
+        similarity.rebuild()
+        self.assertEqual(incremental, lists())
+
+        self.client.force_login(tenant)
+        response = self.client.get(reverse("property-detail", args=[flat.id]))
+        self.assertEqual(response.context["similar"][0].similar_id, closer.id)
+
+
+    def test_extreme_price_refresh_matches_rebuild(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        cities, words = ["Dhaka", "Sylhet", "Khulna"], ["lake", "garden", "roof", "corner"]
+        for i in range(16):
+            Property.objects.create(
+                seller=seller, title=f"Flat {words[i % 4]} view", address="Road 1", city=cities[i % 3],
+                property_type="RENT" if i % 2 else "SELL", price=20000 + 7000 * i,
+            )
+
+        def lists():
+            return list(SimilarProperty.objects.order_by("property_id", "rank").values_list(
+                "property_id", "similar_id", "rank", "score",
+            ))
+
+        similarity.rebuild()
+        # a new highest price, far from everything else: few lists take it,
+        # and the others must not have moved either
+        Property.objects.create(
+            seller=seller, title="Palace", address="Road 2", city="Rajshahi", property_type="SELL",
+            price=800000000, description="Riverside estate",
+        )
+        self.assertLess(similarity.refresh(), 8)
+        incremental = lists()
+
+        similarity.rebuild()
+        self.assertEqual(incremental, lists())
+
+
+class AgentAssignmentTests(TestCase):
+    """Batch assignment spreads visits over agents up to their daily capacity."""
+
+    databases = {"default", "sessions"}
+
+    @override_settings(AGENT_DAILY_VISIT_CAPACITY=2)
+    def test_least_loaded_agents_within_capacity(self):
+        admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        busy = User.objects.create_user("busy", password="x", role="AGENT")
+        free = User.objects.create_user("free", password="x", role="AGENT")
+        prop = Property.objects.create(
+            seller=seller, title="Flat", address="Road 1", city="Dhaka",
+            property_type="RENT", price=500,
+        )
+        day = timezone.localdate() + datetime.timedelta(days=1)
+
+        VisitRequest.objects.create(property=prop, tenant=tenant, agent=busy, preferred_date=day, status="APPROVED")
+        pending = [
+            VisitRequest.objects.create(property=prop, tenant=tenant, preferred_date=day)
+            for _ in range(4)
+        ]
+        past = VisitRequest.objects.create(
+            property=prop, tenant=tenant, preferred_date=day - datetime.timedelta(days=3),
+        )
+
+        self.client.force_login(admin)
+        response = self.client.get(reverse("admin-visit-requests"))
+        visit = next(v for v in response.context["pending_visits"] if v.preferred_date == day)
+        workload = visit.agent_workload
+        self.assertEqual([(agent.id, load) for agent, load in workload], [(free.id, 0), (busy.id, 1)])
+
+        events = QueueEvent.objects.count()
+        response = self.client.post(reverse("admin-visit-requests"), {"action": "auto_assign"})
+        self.assertIn("assigned=3", response["Location"])
+
+        # free takes two, busy one more, the last waits for room
+        approved = VisitRequest.objects.filter(id__in=[v.id for v in pending], status="APPROVED")
+        agents = Counter(approved.values_list("agent_id", flat=True))
+        self.assertEqual(agents, {free.id: 2, busy.id: 1})
+        self.assertEqual(VisitRequest.objects.filter(id__in=[v.id for v in pending], status="PENDING").count(), 1)
+        self.assertEqual(VisitRequest.objects.get(id=past.id).status, "PENDING")
+        self.assertEqual(QueueEvent.objects.count(), events + 3)
+
+
+class ActivitySummaryTests(TestCase):
+    """Summaries are recomputed once per transaction for the users a write touched."""
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x", role="SELLER")
+        self.tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.property = Property.objects.create(
+                seller=self.seller, title="Flat", address="Road 1", city="Dhaka", property_type="RENT", price=1000,
+            )
+
+    def test_one_refresh_per_transaction(self):
+        with mock.patch.object(activity, "refresh_summary", wraps=activity.refresh_summary) as refresh, \
+                mock.patch.object(activity, "flush", wraps=activity.flush) as flush, \
+                self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                VisitRequest.objects.create(
+                    property=self.property, tenant=self.tenant, preferred_date=datetime.date.today(),
+                )
+                Booking.objects.create(property=self.property, tenant=self.tenant, status="PENDING")
+                self.property.status = "BOOKED"
+                self.property.save()
+
+        self.assertEqual(flush.call_count, 1)
+        self.assertEqual(sorted(call.args[0] for call in refresh.call_args_list), [self.seller.id, self.tenant.id])
+
+        seller = UserActivitySummary.objects.get(user=self.seller)
+        self.assertEqual(
+            (seller.properties_total, seller.properties_booked, seller.visits_received, seller.bookings_received),
+            (1, 1, 1, 1),
+        )
+        tenant = UserActivitySummary.objects.get(user=self.tenant)
+        self.assertEqual((tenant.visits_pending, tenant.bookings_pending), (1, 1))
+
+    def test_rolled_back_savepoint(self):
+        # the flush queued inside the savepoint goes with it; the next
+        # write queues another
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    VisitRequest.objects.create(
+                        property=self.property, tenant=self.tenant, preferred_date=datetime.date.today(),
+                    )
+                    raise RuntimeError
+                Booking.objects.create(property=self.property, tenant=self.tenant, status="PENDING")
+
+        tenant = UserActivitySummary.objects.get(user=self.tenant)
+        self.assertEqual((tenant.visits_pending, tenant.bookings_pending), (0, 1))
+
+
+class TenantVisitTests(TestCase):
+    """My Visits offers booking only after an approved visit, once, while nobody holds the property."""
+
+    databases = {"default", "sessions"}
+
+    def test_booking_eligibility(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        other = User.objects.create_user("other", password="x", role="TENANT")
+
+        def visit(title, status="APPROVED"):
+            prop = Property.objects.create(
+                seller=seller, title=title, address="Road 1", city="Dhaka", property_type="RENT", price=1000,
+            )
+            VisitRequest.objects.create(
+                property=prop, tenant=tenant, preferred_date=datetime.date.today(), status=status,
+            )
+            return prop
+
+        visit("Open")
+        visit("Pending", status="PENDING")
+        Booking.objects.create(property=visit("Booked"), tenant=tenant, status="PENDING")
+        Booking.objects.create(property=visit("Taken"), tenant=other, status="CONFIRMED")
+        owned = visit("Owned")
+        booking = Booking.objects.create(property=owned, tenant=tenant, status="COMPLETED")
+        TenantOwnership.objects.create(
+            tenant=tenant, property=owned, booking=booking, amount=1000, purchased_at=timezone.now(),
+        )
+
+        self.client.force_login(tenant)
+        response = self.client.get(reverse("tenant-my-visits"))
+        flags = {
+            visit.property.title: (visit.can_book, visit.already_booked, visit.property_confirmed)
+            for visit in response.context["visits"]
+        }
+        # bought properties are listed under My Properties instead
+        self.assertEqual(flags, {
+            "Open": (True, False, False),
+            "Pending": (False, False, False),
+            "Booked": (False, True, False),
+            "Taken": (False, False, True),
+        })
+
+
+class OwnershipBackfillTests(TestCase):
+    """The backfill adds the missing ownership rows and reports only the rows it added."""
+
+    def test_backfill(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+
+        def purchase(title):
+            prop = Property.objects.create(
+                seller=seller, title=title, address="Road 1", city="Dhaka", property_type="RENT", price=1000,
+                status="SOLD",
+            )
+            booking = Booking.objects.create(property=prop, tenant=tenant, status="COMPLETED")
+            payment = Payment.objects.create(
+                booking=booking, amount=1000, status="APPROVED", approved_at=timezone.now(),
+            )
+            return prop, booking, payment
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase("Flat")
+            # an ownership row already holds this payment, so its insert is skipped
+            prop, _, payment = purchase("House")
+            TenantOwnership.objects.all().delete()
+            TenantOwnership.objects.create(
+                tenant=tenant, property=prop, payment=payment, amount=1000, purchased_at=timezone.now(),
+            )
+        self.assertEqual(activity.get_summary(tenant).owned_properties, 1)
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("backfill_tenant_ownership", stdout=out)
+        self.assertIn("Created 1 ownership rows.", out.getvalue())
+        self.assertEqual(
+            sorted(TenantOwnership.objects.values_list("property__title", flat=True)), ["Flat", "House"],
+        )
+        self.assertEqual(activity.get_summary(tenant).owned_properties, 2)
+
+        out = StringIO()
+        call_command("backfill_tenant_ownership", stdout=out)
+        self.assertIn("Created 0 ownership rows.", out.getvalue())
+
+
+class QueueEventTests(TestCase):
+    """Queue changes reach the admin pages as events, then as fresh rows."""
+
+    databases = {"default", "sessions"}
+
+    def setUp(self):
+        self.admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        self.tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        self.prop = Property.objects.create(
+            seller=seller, title="Flat", address="Road 1", city="Dhaka",
+            property_type="RENT", price=500,
+        )
+        self.client.force_login(self.admin)
+
+    def test_only_new_rows_and_status_changes_publish(self):
+        booking = Booking.objects.create(property=self.prop, tenant=self.tenant)
+        self.assertEqual(QueueEvent.objects.filter(object_id=booking.id, created=True).count(), 1)
+
+        events = QueueEvent.objects.count()
+        booking.save()
+        Booking.objects.get(id=booking.id).save()
+        self.assertEqual(QueueEvent.objects.count(), events)
+
+        booking.status = "CONFIRMED"
+        booking.save()
+        self.assertEqual(QueueEvent.objects.latest("id").status, "CONFIRMED")
+
+    def test_events_answer_and_close(self):
+        first = Booking.objects.create(property=self.prop, tenant=self.tenant)
+        last_id = QueueEvent.objects.latest("id").id
+        second = Booking.objects.create(property=self.prop, tenant=self.tenant)
+
+        response = self.client.get(
+            reverse("admin-queue-events"), {"kinds": "BOOKING"}, HTTP_LAST_EVENT_ID=str(last_id),
+        )
+        body = response.content.decode()
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertIn(f'"id": {second.id}', body)
+        self.assertNotIn(f'"id": {first.id}', body)
+        self.assertTrue(body.endswith(f"id: {QueueEvent.objects.latest('id').id}\n\n"))
+
+        # nothing new since: just the id to resume from
+        response = self.client.get(reverse("admin-queue-events"), {"kinds": "BOOKING"})
+        self.assertNotIn("data:", response.content.decode())
+
+    def test_rows_for_pending_items_only(self):
+        pending = Booking.objects.create(property=self.prop, tenant=self.tenant)
+        done = Booking.objects.create(property=self.prop, tenant=self.tenant, status="CANCELLED")
+
+        response = self.client.get(reverse("admin-queue-rows"), {"kind": "BOOKING", "ids": f"{pending.id},{done.id}"})
+        self.assertContains(response, f'data-queue-row="BOOKING-{pending.id}"')
+        self.assertNotContains(response, f'data-queue-row="BOOKING-{done.id}"')
+
+        visit = VisitRequest.objects.create(
+            property=self.prop, tenant=self.tenant, preferred_date=timezone.localdate(),
+        )
+        response = self.client.get(reverse("admin-queue-rows"), {"kind": "VISIT", "ids": str(visit.id)})
+        self.assertContains(response, f'data-queue-row="VISIT-{visit.id}"')
+
+        response = self.client.get(reverse("admin-queue-rows"), {"kind": "BOOKING", "ids": "1,x"})
+        self.assertEqual(response.status_code, 400)
+
+
+calls = []
+
+
+@jobs.task(name="tests.record", unique=True)
+def record(value):
+    calls.append(value)
+
+
+@jobs.task(name="tests.explode", max_attempts=2, backoff=60)
+def explode():
+    raise RuntimeError("boom")
+
+
+class JobTests(TestCase):
+    """Jobs are claimed by priority, retried with backoff and dead workers' jobs requeued."""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_run_retry_and_priority(self):
+        first = record.delay("low")
+        self.assertEqual(record.delay("low"), first)
+        record.enqueue(["high"], priority=10)
+        failing = explode.delay()
+
+        claimed = jobs.claim("tests", limit=1)
+        self.assertEqual([job.args for job in claimed], [["high"]])
+        self.assertEqual(claimed[0].status, "RUNNING")
+        jobs.run(claimed[0])
+
+        with self.assertLogs("core.jobs", "WARNING"):
+            self.assertEqual(jobs.drain("tests"), 2)
+        self.assertEqual(calls, ["high", "low"])
+        self.assertEqual(Job.objects.filter(status="DONE").count(), 2)
+
+        # first failure waits out the backoff, the second one is final
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), ("QUEUED", 1))
+        self.assertGreater(failing.run_at, timezone.now() + datetime.timedelta(seconds=50))
+        self.assertIn("boom", failing.last_error)
+
+        Job.objects.filter(id=failing.id).update(run_at=timezone.now())
+        with self.assertLogs("core.jobs", "WARNING"):
+            jobs.drain("tests")
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), ("FAILED", 2))
+
+    def test_requeue_stale(self):
+        job = record.delay("lost")
+        jobs.claim("dead-worker")
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        jobs.drain("tests")
+        self.assertEqual(calls, ["lost"])
+
+        # lost on its last attempt: failed, not run again
+        last = explode.delay()
+        Job.objects.filter(id=last.id).update(attempts=1)
+        jobs.claim("dead-worker")
+        Job.objects.filter(id=last.id).update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+        with self.assertLogs("core.jobs", "WARNING"):
+            self.assertEqual(jobs.requeue_stale(), 0)
+        last.refresh_from_db()
+        self.assertEqual((last.status, last.attempts), ("FAILED", 2))
+
+    def test_unique_job_queued_once_by_concurrent_requests(self):
+        existing = record.delay("race")
+
+        # the other request's insert lands between this one's lookup and insert
+        first = QuerySet.first
+        missed = []
+
+        def first_after_race(queryset):
+            if not missed:
+                missed.append(queryset)
+                return None
+            return first(queryset)
+
+        with mock.patch.object(QuerySet, "first", first_after_race):
+            self.assertEqual(record.delay("race"), existing)
+        self.assertEqual(Job.objects.filter(name=existing.name).count(), 1)
+
+        # a retry goes back without the key and is still found by its arguments
+        [claimed] = jobs.claim("tests")
+        with self.assertLogs("core.jobs", "WARNING"):
+            jobs.fail(claimed, record, "boom")
+        self.assertEqual(record.delay("race"), existing)
+
+    def test_slow_worker_does_not_overwrite_the_new_one(self):
+        job = record.delay("slow")
+        [first] = jobs.claim("slow-worker")
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+        jobs.requeue_stale()
+        [second] = jobs.claim("second-worker")
+
+        # the first worker finishing, or failing, leaves the second one's run alone
+        with self.assertLogs("core.jobs", "WARNING"):
+            jobs.run(first)
+        with self.assertLogs("core.jobs", "WARNING"):
+            jobs.fail(first, record, "late")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.last_error), ("RUNNING", "second-worker", ""))
+
+        jobs.run(second)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "DONE")
+
+    @override_settings(JOB_HEARTBEAT_SECONDS=0)
+    def test_heartbeat_keeps_long_jobs_locked(self):
+        stale = timezone.now() - datetime.timedelta(hours=1)
+
+        @jobs.task(name="tests.long")
+        def long_task():
+            # a checkpoint after the lock went stale
+            Job.objects.filter(name="tests.long").update(locked_at=stale)
+            jobs.heartbeat()
+            self.assertEqual(jobs.requeue_stale(), 0)
+            calls.append("long")
+
+        job = long_task.delay()
+        jobs.drain("tests")
+        job.refresh_from_db()
+        self.assertEqual((job.status, calls), ("DONE", ["long"]))
+        self.assertGreater(job.locked_at, stale)
+
+        # outside a job there is nothing to refresh
+        jobs.heartbeat()
+
+
+class OutboxTests(TestCase):
+    """Notifications commit with the state change, once per key, and go out within the limits."""
+
+    databases = {"default", "sessions"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        cls.seller = User.objects.create_user("seller", password="x", role="SELLER")
+        cls.tenant = User.objects.create_user("tenant", email="tenant@example.com", password="x", role="TENANT")
+        cls.property = Property.objects.create(
+            seller=cls.seller, title="Flat", address="Road 1", city="Dhaka",
+            property_type="RENT", price=1000,
+        )
+
+    def test_booking_emails(self):
+        booking = Booking.objects.create(property=self.property, tenant=self.tenant)
+        self.client.force_login(self.admin)
+        self.client.post(reverse("admin-bookings"), {"booking_id": booking.id, "action": "confirm"})
+
+        # the action repeated does not queue the email again
+        Booking.objects.filter(id=booking.id).update(status="PENDING")
+        self.client.post(reverse("admin-bookings"), {"booking_id": booking.id, "action": "confirm"})
+        queued = OutboxMessage.objects.get()
+        self.assertEqual((queued.kind, queued.recipient, queued.status), ("booking_confirmed", "tenant@example.com", "PENDING"))
+        self.assertTrue(Job.objects.filter(name="core.tasks.deliver_outbox", status="QUEUED").exists())
+
+        jobs.drain("tests")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("Flat", mail.outbox[0].body)
+        self.assertEqual(OutboxMessage.objects.get().status, "SENT")
+
+    def test_rolled_back_change_sends_nothing(self):
+        booking = Booking.objects.create(property=self.property, tenant=self.tenant)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                booking.status = "CANCELLED"
+                booking.save()
+                outbox.notify("booking_cancelled", self.tenant, booking.id, booking=booking)
+                raise RuntimeError
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @override_settings(OUTBOX_MAX_PER_RECIPIENT_PER_HOUR=2)
+    def test_merge_and_limits(self):
+        for key in range(4):
+            outbox.notify("welcome", self.tenant, key)
+
+        # the first two are identical and go out as one email; the rest
+        # are over the hourly limit and wait
+        result = outbox.deliver()
+        self.assertEqual((result.sent, result.merged, result.deferred), (1, 1, 2))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertGreater(outbox.next_due(), timezone.now() + datetime.timedelta(minutes=59))
+        self.assertEqual(outbox.deliver().sent, 0)
+
+    def test_new_mail_brings_a_later_delivery_forward(self):
+        # a delivery job waiting out a rate limit
+        later = tasks.deliver_outbox.enqueue(countdown=3600)
+        outbox.notify("welcome", self.tenant, 1)
+
+        later.refresh_from_db()
+        self.assertEqual(Job.objects.filter(name="core.tasks.deliver_outbox", status="QUEUED").count(), 1)
+        self.assertLessEqual(later.run_at, timezone.now())
+        jobs.drain("tests")
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class UserCacheTests(TestCase):
+    """Logged-in pages identify the caller without touching either database."""
+
+    databases = {"default", "sessions"}
+
+    def test_cached_user_and_invalidation(self):
+        tenant = User.objects.create_user("tenant", first_name="Old", password="x", role="TENANT")
+        self.assertEqual(Session.objects.db, "sessions")
+        self.client.force_login(tenant)
+        self.client.get(reverse("tenant-dashboard"))
+
+        with CaptureQueriesContext(connections["default"]) as main, \
+                CaptureQueriesContext(connections["sessions"]) as sessions:
+            response = self.client.get(reverse("tenant-dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sessions.captured_queries, [])
+        user_lookup = 'FROM "core_user" WHERE "core_user"."id"'
+        self.assertFalse([q["sql"] for q in main.captured_queries if user_lookup in q["sql"]])
+
+        # the names and role, not the password hash, and the rest on demand
+        user = response.wsgi_request.user
+        self.assertEqual((user.username, user.role, user.first_name), ("tenant", "TENANT", "Old"))
+        loaded = {f.attname for f in User._meta.concrete_fields} - user.get_deferred_fields()
+        self.assertEqual(loaded, set(user_cache.CACHED_FIELDS))
+        cached = user_cache.auth_cache().get(user_cache.user_key(tenant.id, user_cache.current_version(tenant.id)))
+        self.assertNotIn("password", cached)
+        self.assertNotIn(tenant.password, str(cached))
+
+        # every bump gives a version no earlier copy was stored under
+        versions = {user_cache.current_version(tenant.id)}
+        for _ in range(3):
+            user_cache.bump(tenant.id)
+            versions.add(user_cache.current_version(tenant.id))
+        self.assertEqual(len(versions), 4)
+
+        # a saved user is loaded once more, a deactivated one is logged out
+        with self.captureOnCommitCallbacks(execute=True):
+            tenant.first_name = "New"
+            tenant.save()
+        response = self.client.get(reverse("tenant-dashboard"))
+        self.assertEqual(response.wsgi_request.user.first_name, "New")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tenant.is_active = False
+            tenant.save()
+        response = self.client.get(reverse("tenant-dashboard"))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_password_change_logs_out_other_sessions(self):
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        self.client.force_login(tenant)
+        self.client.get(reverse("tenant-dashboard"))
+        self.assertEqual(self.client.get(reverse("tenant-dashboard")).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tenant.set_password("y")
+            tenant.save()
+        self.assertEqual(self.client.get(reverse("tenant-dashboard")).status_code, 302)
+
+
+class PropertyCacheTests(TestCase):
+    """The property page is cached per version, with only what the page shows."""
+
+    databases = {"default", "sessions"}
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(
+            "seller", email="seller@example.com", phone_number="0123", password="x", role="SELLER",
+        )
+        self.tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        self.property = Property.objects.create(
+            seller=self.seller, title="Flat", address="Road 1", city="Dhaka", property_type="RENT", price=1000,
+        )
+        self.client.force_login(self.tenant)
+
+    def page(self):
+        return self.client.get(reverse("property-detail", args=[self.property.id]))
+
+    def test_cached_page_carries_no_account_data(self):
+        self.page()
+        version = Property.objects.values_list("version", flat=True).get(id=self.property.id)
+        prop, images = cache.get(property_cache.cache_key(self.property.id, version))
+
+        self.assertIn("password", prop.seller.get_deferred_fields())
+        self.assertNotIn(self.seller.password.encode(), pickle.dumps((prop, images)))
+
+        # a cached render loads nothing the cache left out: the flags and
+        # the similar listings only
+        with self.assertNumQueries(2):
+            response = self.page()
+        self.assertContains(response, "seller@example.com")
+        self.assertContains(response, "0123")
+
+    def test_save_bumps_version_without_reloading_it(self):
+        self.page()
+        with CaptureQueriesContext(connection) as queries:
+            self.property.title = "Loft"
+            self.property.save()
+        reloads = [q["sql"] for q in queries.captured_queries if '"core_property"."version" FROM' in q["sql"]]
+        self.assertEqual(reloads, [])
+        self.property.save()
+        self.property.refresh_from_db(fields=["version"])
+        self.assertEqual(self.property.version, 3)
+
+        # the next render is built from the new version
+        self.assertContains(self.page(), "Loft")
+
+
+@override_settings(
+    IMPORT_WORKERS=1,
+    IMPORT_ROOT=tempfile.mkdtemp(),
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class UserImportTests(TestCase):
+    """Uploaded user files are imported in batches by a job, with per-row errors."""
+
+    databases = {"default", "sessions"}
+
+    def test_upload_and_import(self):
+        admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        User.objects.create_user("taken", email="taken@example.com", password="x", role="TENANT")
+        upload = SimpleUploadedFile("users.csv", (
+            "username,email,password,role,first_name\n"
+            "ayesha,ayesha@example.com,secret1,tenant,Ayesha\n"
+            "rahim,rahim@example.com,secret2,AGENT,Rahim\n"
+            "taken,other@example.com,secret3,TENANT,\n"
+            "karim,not-an-email,secret4,SELLER,\n"
+            "boss,boss@example.com,secret5,ADMIN,\n"
+            "ayesha,ayesha2@example.com,secret6,TENANT,\n"
+        ).encode())
+
+        self.client.force_login(admin)
+        self.client.post(reverse("admin-import-users"), {"file": upload})
+        run = ImportRun.objects.get()
+        self.assertEqual(run.status, "QUEUED")
+
+        with override_settings(IMPORT_BATCH_SIZE=2):
+            jobs.drain("tests")
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.rows, run.imported, run.failed), ("DONE", 6, 2, 4))
+        self.assertEqual(sorted(row for row, _ in run.errors), [4, 5, 6, 7])
+        self.assertFalse(os.path.exists(run.source))
+
+        ayesha = User.objects.get(username="ayesha")
+        self.assertEqual((ayesha.role, ayesha.first_name), ("TENANT", "Ayesha"))
+        self.assertTrue(ayesha.check_password("secret1"))
+
+        response = self.client.get(reverse("admin-import-users"))
+        self.assertContains(response, "users.csv")
+
+
+class PropertyImportTests(TestCase):
+    """Manifest + zip imports keep counts and image refs right and resume after a failure."""
+
+    databases = {"default", "sessions"}
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.files = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media, IMPORT_ROOT=self.files)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+    def write_files(self):
+        archive = os.path.join(self.files, "photos.zip")
+        with zipfile.ZipFile(archive, "w") as zf:
+            for name, color in (("a.png", "red"), ("b.png", "blue")):
+                image = BytesIO()
+                Image.new("RGB", (8, 8), color).save(image, "PNG")
+                zf.writestr(f"photos/{name}", image.getvalue())
+            zf.writestr("photos/broken.png", b"not a png")
+
+        manifest = os.path.join(self.files, "listings.csv")
+        with open(manifest, "w") as f:
+            f.write(
+                "seller,title,address,city,property_type,price,images\n"
+                "agency,Flat 1,House 3 Gulshan 2,Dhaka,RENT,25000,photos/a.png|photos/b.png\n"
+                "agency,Flat 2,Road 5,Dhaka,RENT,30000,photos/a.png\n"
+                "agency,Flat 3,Road 7,Sylhet,SELL,\"1,500,000\",photos/broken.png\n"
+                "agency,Flat 4,Road 9,Sylhet,SELL,2000000,photos/b.png\n"
+                "nobody,Flat 5,Road 1,Dhaka,RENT,10000,\n"
+            )
+        return manifest, archive
+
+    def test_import_and_resume(self):
+        User.objects.create_user("agency", password="x", role="SELLER")
+        manifest, archive = self.write_files()
+        run = ImportRun.objects.create(
+            kind="PROPERTIES", source=manifest, filename="listings.csv", archive=archive,
+        )
+
+        # the second batch fails before it commits
+        def stop_at_second_batch(result):
+            if result.position > 2:
+                raise RuntimeError("worker died")
+
+        with self.assertRaises(RuntimeError):
+            imports.run_import(run, workers=2, batch_size=2, progress=stop_at_second_batch)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.position, run.imported), ("FAILED", 2, 2))
+        self.assertEqual(Property.objects.count(), 2)
+
+        imports.run_import(run, workers=2, batch_size=2)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.position, run.imported, run.failed), ("DONE", 5, 3, 2))
+        self.assertEqual(sorted(row for row, _ in run.errors), [4, 6])
+
+        # what the skipped signals would have kept
+        self.assertEqual(Property.objects.count(), 3)
+        refs = Counter(PropertyImage.objects.values_list("image", flat=True))
+        self.assertEqual(dict(ImageBlob.objects.values_list("name", "ref_count")), dict(refs))
+        self.assertEqual(sorted(refs.values()), [2, 2])
+        self.assertEqual(FacetCount.objects.get(city="", property_type="", price_bucket="").count, 3)
+        self.assertTrue(Property.objects.get(title="Flat 1").geohash)
+        self.assertEqual(SimilarityRefresh.objects.count(), 3)
+        self.assertEqual(activity.get_summary(User.objects.get(username="agency")).properties_total, 3)
+
+    def test_unsaved_images_are_released(self):
+        User.objects.create_user("agency", password="x", role="SELLER")
+        manifest, archive = self.write_files()
+        with zipfile.ZipFile(archive, "a") as zf:
+            image = BytesIO()
+            Image.new("RGB", (8, 8), "green").save(image, "PNG")
+            zf.writestr("photos/c.png", image.getvalue())
+        with open(manifest, "w") as f:
+            f.write(
+                "seller,title,address,city,property_type,price,images\n"
+                "agency,Flat 1,Road 1,Dhaka,RENT,25000,photos/a.png\n"
+                "agency,Flat 2,Road 5,Dhaka,RENT,30000,photos/c.png|photos/broken.png\n"
+            )
+
+        def stored():
+            return sorted(
+                os.path.join(root, name)[len(self.media):]
+                for root, _, names in os.walk(self.media) for name in names
+            )
+
+        # a batch that does not commit leaves no files behind
+        with open(manifest, "rb") as f, mock.patch.object(facets, "apply_deltas", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                imports.import_properties(f, "csv", archive, workers=2)
+        self.assertEqual(stored(), [])
+        self.assertFalse(ImageBlob.objects.exists())
+
+        # the dropped row's stored image goes, the saved row's stays
+        with open(manifest, "rb") as f:
+            result = imports.import_properties(f, "csv", archive, workers=2)
+        self.assertEqual((result.imported, result.failed), (1, 1))
+        image = PropertyImage.objects.get()
+        self.assertEqual(stored(), [os.sep + image.image.name.replace("/", os.sep)])
+        self.assertEqual(list(ImageBlob.objects.values_list("name", "ref_count")), [(image.image.name, 1)])
+
+
+class ExportTests(TestCase):
+    """Exports stream date-filtered rows in chunks, in index order."""
+
+    databases = {"default", "sessions"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        prop = Property.objects.create(
+            seller=seller, title="Flat, top floor", address="Road 1", city="Dhaka", property_type="SELL", price=1000,
+        )
+        for day in range(1, 6):
+            when = timezone.make_aware(datetime.datetime(2026, 3, day, 12))
+            booking = Booking.objects.create(property=prop, tenant=tenant, status="COMPLETED")
+            payment = Payment.objects.create(
+                booking=booking, amount="1000.50", platform_cut="100.05", seller_amount="900.45",
+                status="APPROVED", approved_by_admin=cls.admin, approved_at=when,
+                seller_amount_sent=day % 2 == 1, seller_amount_sent_at=when if day % 2 else None,
+            )
+            Booking.objects.filter(id=booking.id).update(created_at=when)
+            Payment.objects.filter(id=payment.id).update(created_at=when)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_view_streams_filtered_rows(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("admin-export", args=["deals"]), {"from": "2026-03-02", "to": "2026-03-05"})
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="deals_from-2026-03-02_to-2026-03-05.csv"', response["Content-Disposition"])
+        # header + 1 row, then 1 row
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 2)
+
+        rows = list(csv.DictReader("".join(chunks).splitlines()))
+        self.assertEqual([row["sent_at"][:10] for row in rows], ["2026-03-03", "2026-03-05"])
+        self.assertEqual((rows[0]["property"], rows[0]["amount"], rows[0]["approved_by"]), ("Flat, top floor", "1000.50", "admin"))
+
+        response = self.client.get(reverse("admin-export", args=["payments"]), {"from": "March"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command_and_plans(self):
+        out = StringIO()
+        call_command("export", "payments", "--format", "jsonl", "--to", "2026-03-04", stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row["created_at"][:10] for row in rows], ["2026-03-01", "2026-03-02", "2026-03-03", "2026-03-04"])
+        self.assertEqual((rows[1]["status"], rows[1]["seller_amount_sent"], rows[1]["sent_at"]), ("APPROVED", False, None))
+
+        start, end = datetime.date(2026, 3, 1), datetime.date(2026, 3, 31)
+        with connection.cursor() as cursor:
+            for kind, export in exports.EXPORTS.items():
+                sql, params = export.rows(start, end).query.sql_with_params()
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                plan = " ".join(row[3] for row in cursor.fetchall())
+                self.assertNotIn("TEMP B-TREE", plan, kind)
+                self.assertIn("_idx", plan, kind)
+
+    def test_csv_formulas_are_kept_as_text(self):
+        Property.objects.update(title="=HYPERLINK(\"http://example.com\")")
+        User.objects.filter(username="admin").update(username="@admin")
+        out = StringIO()
+        call_command("export", "payments", "--format", "csv", "--to", "2026-03-01", stdout=out)
+        row = next(csv.DictReader(out.getvalue().splitlines()))
+        self.assertEqual((row["property"], row["approved_by"]), ("'=HYPERLINK(\"http://example.com\")", "'@admin"))
+        self.assertEqual(row["amount"], "1000.50")
+
+        out = StringIO()
+        call_command("export", "payments", "--format", "jsonl", "--to", "2026-03-01", stdout=out)
+        self.assertEqual(json.loads(out.getvalue())["property"], "=HYPERLINK(\"http://example.com\")")
+
+
+class StreamingPageTests(TestCase):
+    """Admin tables stream in row chunks after the page head, with the same HTML as a normal render."""
+
+    databases = {"default", "sessions"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        for i in range(5):
+            seller = User.objects.create_user(f"seller{i}", password="x", role="SELLER")
+            Property.objects.create(
+                seller=seller, title=f"Flat {i}", address="Road 1", city="Dhaka", property_type="RENT", price=100,
+            )
+
+    @override_settings(STREAM_ROWS_CHUNK_SIZE=2)
+    def test_streamed_rows_match_full_render(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("admin-properties"))
+        self.assertTrue(response.streaming)
+        self.assertIn("csrftoken", response.cookies)
+
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        # head, 3 row chunks, rest of the page
+        self.assertEqual(len(chunks), 5)
+        self.assertIn("<tbody>", chunks[0])
+        self.assertNotIn("Flat 0", chunks[0])
+        self.assertEqual([chunk.count("<tr") for chunk in chunks[1:4]], [2, 2, 1])
+        self.assertIn("Back to Dashboard", chunks[4])
+
+        with override_settings(STREAM_ADMIN_TABLES=False):
+            full = self.client.get(reverse("admin-properties"))
+        self.assertFalse(full.streaming)
+        # the csrf token in each form differs between requests
+        mask = lambda html: re.sub(r'name="csrfmiddlewaretoken" value="[^"]+"', "", html)
+        self.assertEqual(mask("".join(chunks)), mask(full.content.decode()))
+
+        response = self.client.get(reverse("admin-users"))
+        html = b"".join(response.streaming_content).decode()
+        self.assertEqual(html.count('name="user_id"'), 5)
+        self.assertIn("No tenants found.", html)
+
+
+class AsyncViewTests(TestCase):
+    """The async pages render exactly what the sync ones do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        cls.seller = User.objects.create_user("seller", password="x", role="SELLER")
+        cls.tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        User.objects.create_user("agent", password="x", role="AGENT")
+        cls.property = Property.objects.create(
+            seller=cls.seller, title="Flat", address="Road 1, Gulshan", city="Dhaka",
+            property_type="RENT", price=1000, is_featured=True,
+        )
+        other = Property.objects.create(
+            seller=cls.seller, title="House", address="Road 2, Banani", city="Dhaka",
+            property_type="SELL", price=5000,
+        )
+        VisitRequest.objects.create(property=cls.property, tenant=cls.tenant, preferred_date=timezone.localdate())
+        Booking.objects.create(property=other, tenant=cls.tenant)
+        booking = Booking.objects.create(property=cls.property, tenant=cls.tenant, status="CONFIRMED")
+        Payment.objects.create(booking=booking, amount=1000, platform_cut=100, seller_amount=900)
+
+    def request(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return request
+
+    def html(self, response):
+        return re.sub(r'name="csrfmiddlewaretoken" value="[^"]+"', "", response.content.decode())
+
+    async def assert_same_page(self, name, user, *args):
+        sync_response = await sync_to_async(getattr(views, name))(self.request(user), *args)
+        async_response = await getattr(async_views, name)(self.request(user), *args)
+        self.assertEqual(async_response.status_code, 200, name)
+        self.assertEqual(self.html(async_response), self.html(sync_response), name)
+
+    async def test_pages_match_the_sync_views(self):
+        for name in ("admin_dashboard", "admin_payments", "admin_visit_requests", "admin_bookings"):
+            await self.assert_same_page(name, self.admin)
+        await self.assert_same_page("tenant_dashboard", self.tenant)
+        await self.assert_same_page("property_detail", self.tenant, self.property.id)
+        await self.assert_same_page("seller_dashboard", self.seller)
+        await self.assert_same_page("home", self.tenant)
+
+    async def test_roles_and_missing_property(self):
+        response = await async_views.admin_dashboard(self.request(self.tenant))
+        self.assertEqual((response.status_code, response.url), (302, reverse("home")))
+        with self.assertRaises(Http404):
+            await async_views.property_detail(self.request(self.tenant), 0)
+
+
+class ArchiveTests(TestCase):
+    """Old finished rows move to the archive in batches; summaries and history pages still see them."""
+
+    databases = {"default", "sessions"}
+
+    def test_archive_and_history(self):
+        admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        props = [
+            Property.objects.create(
+                seller=seller, title=f"Flat {i}", address="Road 1", city="Dhaka", property_type="SELL", price=1000,
+            )
+            for i in range(4)
+        ]
+        old = timezone.now() - datetime.timedelta(days=400)
+        today = datetime.date.today()
+
+        rejected = VisitRequest.objects.create(property=props[0], tenant=tenant, preferred_date=today, status="REJECTED")
+        VisitRequest.objects.create(property=props[1], tenant=tenant, preferred_date=today, status="REJECTED")
+        VisitRequest.objects.create(property=props[2], tenant=tenant, preferred_date=today, status="APPROVED")
+
+        cancelled = Booking.objects.create(property=props[0], tenant=tenant, status="CANCELLED")
+        sold = Booking.objects.create(property=props[1], tenant=tenant, status="COMPLETED")
+        payment = Payment.objects.create(
+            booking=sold, amount=1000, seller_amount=900, status="APPROVED", approved_at=old,
+            seller_amount_sent=True, seller_amount_sent_at=old,
+        )
+        TenantOwnership.objects.create(
+            tenant=tenant, property=props[1], booking=sold, payment=payment, amount=1000, purchased_at=old,
+        )
+        # payout not sent yet: stays with its payment
+        unpaid = Booking.objects.create(property=props[2], tenant=tenant, status="COMPLETED")
+        Payment.objects.create(booking=unpaid, amount=1000, seller_amount=900, status="APPROVED", approved_at=old)
+        Booking.objects.create(property=props[3], tenant=tenant, status="CANCELLED")
+
+        VisitRequest.objects.exclude(id__gt=rejected.id + 1).update(created_at=old)
+        Booking.objects.filter(id__in=[cancelled.id, sold.id, unpaid.id]).update(created_at=old)
+        Payment.objects.update(created_at=old)
+
+        summaries = {user.id: activity.refresh_summary(user.id) for user in (seller, tenant)}
+        call_command("archive_history", "--batch-size", "1", stdout=StringIO())
+
+        self.assertEqual(sorted(ArchivedVisitRequest.objects.values_list("id", flat=True)), [rejected.id, rejected.id + 1])
+        self.assertEqual(sorted(ArchivedBooking.objects.values_list("id", flat=True)), [cancelled.id, sold.id])
+        self.assertEqual(ArchivedPayment.objects.get().id, payment.id)
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertEqual(VisitRequest.objects.count(), 1)
+
+        ownership = TenantOwnership.objects.get()
+        self.assertEqual((ownership.booking_id, ownership.payment_id, ownership.amount), (None, None, 1000))
+
+        for user_id, before in summaries.items():
+            after = activity.refresh_summary(user_id)
+            for field in ("bookings_received", "visits_received", "payments_received", "visits_rejected",
+                          "bookings_cancelled", "bookings_completed", "total_spent"):
+                self.assertEqual(getattr(after, field), getattr(before, field), field)
+
+        self.client.force_login(tenant)
+        response = self.client.get(reverse("tenant-history"))
+        self.assertEqual(sorted(row.id for row in response.context["rows"]), [cancelled.id, sold.id])
+        self.assertContains(response, "৳ 1000")
+        response = self.client.get(reverse("tenant-my-properties"))
+        self.assertContains(response, "Flat 1")
+        # the purchased property's visit stays out of "My Visits"
+        response = self.client.get(reverse("tenant-my-visits"))
+        self.assertNotContains(response, "Flat 1")
+
+        self.client.force_login(admin)
+        response = self.client.get(reverse("admin-history"), {"kind": "visits", "user": "tenant"})
+        self.assertEqual(len(response.context["rows"]), 2)
+        response = self.client.get(reverse("admin-export", args=["archived-deals"]))
+        self.assertIn(f"{payment.id},{sold.id},", b"".join(response.streaming_content).decode())
+
+
+class ChunkedUploadTests(TestCase):
+    """Uploads resume at the stored offset, one request at a time, and are checked end to end."""
+
+    databases = {"default", "sessions"}
+
+    def setUp(self):
+        self.media, self.parts = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media, CHUNKED_UPLOAD_ROOT=self.parts)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        self.seller = User.objects.create_user("seller", password="x", role="SELLER")
+        self.prop = Property.objects.create(
+            seller=self.seller, title="Flat", address="Road 1", city="Dhaka",
+            property_type="RENT", price=500,
+        )
+        data = BytesIO()
+        Image.new("RGB", (64, 64), "red").save(data, "PNG")
+        self.data = data.getvalue()
+        self.client.force_login(self.seller)
+
+    def start(self, sha256=""):
+        response = self.client.post(reverse("upload-create"), {
+            "property_id": self.prop.id, "filename": "photo.png", "size": len(self.data), "sha256": sha256,
+        })
+        return response.json()["upload_id"]
+
+    def put(self, upload_id, start, end, body=None, **headers):
+        return self.client.put(
+            reverse("upload-chunk", args=[upload_id]),
+            self.data[start:end + 1] if body is None else body,
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end}/{len(self.data)}",
+            **headers,
+        )
+
+    def test_resume_and_finalize(self):
+        upload_id = self.start(hashlib.sha256(self.data).hexdigest())
+        half = len(self.data) // 2
+        self.assertEqual(self.put(upload_id, 0, half - 1).json()["offset"], half)
+
+        # a client that lost track asks where to carry on
+        self.assertEqual(self.client.get(reverse("upload-chunk", args=[upload_id])).json()["offset"], half)
+        self.put(upload_id, half, len(self.data) - 1)
+
+        response = self.client.post(reverse("upload-finalize", args=[upload_id]))
+        self.assertEqual(response.json()["status"], "COMPLETE")
+        image = PropertyImage.objects.get(property=self.prop)
+        with image.image.open("rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.listdir(self.parts), [])
+
+    def test_offset_and_checksum_errors(self):
+        upload_id = self.start(hashlib.sha256(b"something else").hexdigest())
+        self.put(upload_id, 0, 9)
+
+        # a chunk sent twice, or one skipped
+        response = self.put(upload_id, 0, 9)
+        self.assertEqual((response.status_code, response.json()["offset"]), (409, 10))
+        self.assertEqual(self.put(upload_id, 20, 29).status_code, 409)
+
+        # a damaged chunk is dropped whole
+        response = self.put(upload_id, 10, 19, HTTP_X_CHUNK_SHA256="0" * 64)
+        self.assertEqual((response.status_code, response.json()["offset"]), (422, 10))
+
+        self.put(upload_id, 10, len(self.data) - 1)
+        response = self.client.post(reverse("upload-finalize", args=[upload_id]))
+        self.assertEqual((response.status_code, response.json()["offset"]), (422, 0))
+        self.assertFalse(PropertyImage.objects.exists())
+
+    def test_only_images(self):
+        response = self.client.post(reverse("upload-create"), {
+            "property_id": self.prop.id, "filename": "page.html", "size": 10,
+        })
+        self.assertEqual(response.status_code, 400)
+
+        # an image name on bytes that are not one
+        self.data = b"<svg onload=alert(1)>" + b" " * 100
+        upload_id = self.start()
+        self.put(upload_id, 0, len(self.data) - 1)
+        response = self.client.post(reverse("upload-finalize", args=[upload_id]))
+        self.assertEqual((response.status_code, response.json()["offset"]), (422, 0))
+        self.assertFalse(PropertyImage.objects.exists())
+        self.assertEqual(os.listdir(self.media), [])
+
+    def test_one_request_at_a_time(self):
+        upload_id = self.start()
+        UploadSession.objects.filter(id=upload_id).update(locked_at=timezone.now())
+        self.assertEqual(self.put(upload_id, 0, 9).status_code, 409)
+        self.assertEqual(self.client.post(reverse("upload-finalize", args=[upload_id])).status_code, 409)
+
+        # the lock of a request that died runs out
+        UploadSession.objects.filter(id=upload_id).update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(self.put(upload_id, 0, 9).status_code, 200)
+        self.assertIsNone(UploadSession.objects.get(id=upload_id).locked_at)
+
+    def test_prune_abandoned_uploads(self):
+        old = timezone.now() - datetime.timedelta(days=2)
+        abandoned, active = self.start(), self.start()
+        self.put(abandoned, 0, 9)
+        self.put(active, 0, 9)
+        UploadSession.objects.filter(id=abandoned).update(updated_at=old)
+
+        # a part file whose session went with its property
+        orphan = os.path.join(self.parts, f"{uuid.uuid4()}.part")
+        open(orphan, "wb").close()
+        os.utime(orphan, (old.timestamp(), old.timestamp()))
+
+        out = StringIO()
+        call_command("prune_uploads", stdout=out)
+        self.assertIn("Removed 1 upload(s) and 2 part file(s)", out.getvalue())
+        self.assertEqual(list(UploadSession.objects.values_list("id", flat=True)), [uuid.UUID(active)])
+        self.assertEqual(os.listdir(self.parts), [f"{active}.part"])
+
+
+class MediaTests(TestCase):
+    """Uploaded media is served with ranges, validators and cache headers."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+    def write(self, name, content):
+        path = os.path.join(self.media, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        return "/media/" + name
+
+    def test_ranges_and_validators(self):
+        digest = "ab" * 32
+        url = self.write(f"property_images/ab/ab/{digest}.png", b"0123456789")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["ETag"], f'"{digest}"')
+        self.assertIn("immutable", response["Cache-Control"])
+
+        for header, body, content_range in (
+            ("bytes=2-5", b"2345", "bytes 2-5/10"),
+            ("bytes=-3", b"789", "bytes 7-9/10"),
+            ("bytes=8-", b"89", "bytes 8-9/10"),
+        ):
+            with self.subTest(range=header):
+                response = self.client.get(url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b"".join(response.streaming_content), body)
+                self.assertEqual(response["Content-Range"], content_range)
+
+        response = self.client.get(url, HTTP_RANGE="bytes=10-")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, "bytes */10"))
+        # nothing in an empty file can be satisfied, the last N bytes neither
+        empty = self.write("docs/empty.txt", b"")
+        response = self.client.get(empty, HTTP_RANGE="bytes=-5")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, "bytes */0"))
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'"{digest}"').status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+        # If-Range: the range only while the client's copy is current
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE=f'"{digest}"')
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX="/protected-media/")
+    def test_accel_redirect_is_quoted(self):
+        url = self.write("docs/my photo #1?.png", b"x")
+        response = self.client.get(url.replace(" ", "%20").replace("#", "%23").replace("?", "%3F"))
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/docs/my%20photo%20%231%3F.png")
+
+
+class ImageBlobTests(TestCase):
+    """Rows share a stored file by content; it goes once the last row is gone and that has committed."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        self.prop = Property.objects.create(
+            seller=seller, title="Flat", address="Road 1", city="Dhaka",
+            property_type="RENT", price=500,
+        )
+
+    def upload(self, color):
+        data = BytesIO()
+        Image.new("RGB", (8, 8), color).save(data, "PNG")
+        return SimpleUploadedFile("photo.png", data.getvalue())
+
+    def refs(self):
+        return dict(ImageBlob.objects.values_list("name", "ref_count"))
+
+    def test_file_goes_with_the_last_row_after_commit(self):
+        first = PropertyImage.objects.create(property=self.prop, image=self.upload("red"))
+        second = PropertyImage.objects.create(property=self.prop, image=self.upload("red"))
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(self.refs(), {name: 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(property_image_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+            self.assertTrue(property_image_storage.exists(name))
+        self.assertFalse(property_image_storage.exists(name))
+        self.assertEqual(self.refs(), {})
+
+    def test_replaced_image_is_counted(self):
+        image = PropertyImage.objects.create(property=self.prop, image=self.upload("red"))
+        old = image.image.name
+
+        image.image = self.upload("blue")
+        with self.captureOnCommitCallbacks(execute=True):
+            image.save()
+        new = image.image.name
+        self.assertEqual(self.refs(), {new: 1})
+        self.assertFalse(property_image_storage.exists(old))
+
+        # saving a loaded row again changes nothing
+        PropertyImage.objects.get(id=image.id).save()
+        self.assertEqual(self.refs(), {new: 1})
+
+    def test_file_released_during_an_upload_is_written_back(self):
+        first = PropertyImage.objects.create(property=self.prop, image=self.upload("red"))
+        name = first.image.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+
+        # the release commits after storage.save has handed back the name
+        # of the file it is about to delete
+        save = ContentAddressedStorage.save
+
+        def save_then_release(storage, *args, **kwargs):
+            stored = save(storage, *args, **kwargs)
+            for callback in callbacks:
+                callback()
+            return stored
+
+        with mock.patch.object(ContentAddressedStorage, "save", save_then_release):
+            second = PropertyImage.objects.create(property=self.prop, image=self.upload("red"))
+
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(property_image_storage.exists(name))
+        self.assertEqual(self.refs(), {name: 1})
+
+
+class DeletionTests(TestCase):
+    """Deleting marks the user or property at once; a job removes the rest in batches, keeping counts right."""
+
+    databases = {"default", "sessions"}
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media, DELETION_BATCH_SIZE=1)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+    def image(self, prop, color):
+        data = BytesIO()
+        Image.new("RGB", (8, 8), color).save(data, "PNG")
+        return PropertyImage.objects.create(property=prop, image=SimpleUploadedFile("photo.png", data.getvalue()))
+
+    def facet_counts(self):
+        return dict(
+            ((row.city, row.property_type, row.price_bucket), row.count)
+            for row in FacetCount.objects.filter(count__gt=0)
+        )
+
+    def assert_consistent(self):
+        # what the skipped signals would have kept
+        refs = Counter(PropertyImage.objects.values_list("image", flat=True))
+        self.assertEqual(dict(ImageBlob.objects.values_list("name", "ref_count")), dict(refs))
+        counts = self.facet_counts()
+        call_command("rebuild_facet_counts", stdout=StringIO())
+        self.assertEqual(self.facet_counts(), counts)
+        for summary in UserActivitySummary.objects.all():
+            fresh = activity.refresh_summary(summary.user_id)
+            for field in ("properties_total", "properties_available", "bookings_received", "visits_pending",
+                          "bookings_pending", "bookings_confirmed", "total_spent"):
+                self.assertEqual(getattr(summary, field), getattr(fresh, field), field)
+
+    def test_delete_seller_then_tenant(self):
+        admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        other = User.objects.create_user("other", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        agent = User.objects.create_user("agent", password="x", role="AGENT")
+
+        def create(owner, title, price):
+            return Property.objects.create(
+                seller=owner, title=title, address="Road 1", city="Dhaka", property_type="RENT", price=price,
+            )
+
+        flat, house, kept = create(seller, "Flat", 30000), create(seller, "House", 60000), create(other, "Kept", 20000)
+        shared = self.image(flat, "red")
+        self.image(kept, "red")
+        only = self.image(house, "blue")
+
+        VisitRequest.objects.create(property=flat, tenant=tenant, agent=agent, preferred_date=datetime.date.today())
+        sold = Booking.objects.create(property=house, tenant=tenant, status="COMPLETED")
+        payment = Payment.objects.create(booking=sold, amount=60000, status="APPROVED", approved_by_admin=admin)
+        TenantOwnership.objects.create(
+            tenant=tenant, property=house, booking=sold, payment=payment, amount=60000, purchased_at=timezone.now(),
+        )
+        ArchivedBooking.objects.create(
+            id=1000, property=flat, tenant=tenant, seller=seller, status="CANCELLED", created_at=timezone.now(),
+        )
+        Booking.objects.create(property=kept, tenant=tenant, status="PENDING")
+        kept.status = "BOOKED"
+        kept.save()
+        # as if the fixture had committed
+        activity.flush()
+        for user in (seller, other, tenant):
+            activity.get_summary(user)
+
+        self.client.force_login(admin)
+        self.client.post(reverse("admin-users"), {"user_id": seller.id})
+        self.client.post(reverse("admin-users"), {"user_id": seller.id})
+
+        # marked and queued once; nothing removed yet
+        run = DeletionRun.objects.get()
+        self.assertEqual((run.kind, run.status, run.label), ("USER", "QUEUED", "seller"))
+        self.assertFalse(User.objects.get(id=seller.id).is_active)
+        self.assertEqual(Property.objects.filter(seller=seller).count(), 2)
+
+        # image files go once each batch commits
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.drain("tests")
+        run.refresh_from_db()
+        self.assertEqual(run.status, "DONE")
+        self.assertEqual(run.deleted["properties"], 2)
+        self.assertEqual((run.deleted["unlisted"], run.deleted["bookings"], run.deleted["images"]), (2, 1, 2))
+        self.assertEqual(run.deleted["image files"], 1)
+
+        self.assertFalse(User.objects.filter(id=seller.id).exists())
+        self.assertEqual(list(Property.objects.values_list("title", flat=True)), ["Kept"])
+        self.assertFalse(ArchivedBooking.objects.exists())
+        self.assertFalse(TenantOwnership.objects.exists())
+        # the shared file stays with the other seller's image
+        self.assertTrue(os.path.exists(os.path.join(self.media, shared.image.name)))
+        self.assertFalse(os.path.exists(os.path.join(self.media, only.image.name)))
+        self.assert_consistent()
+        self.assertContains(self.client.get(reverse("admin-users")), "Recent Deletions")
+
+        # the tenant's open booking goes, so its property is back on the market
+        self.client.post(reverse("admin-users"), {"user_id": tenant.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.drain("tests")
+        kept.refresh_from_db()
+        self.assertEqual(kept.status, "AVAILABLE")
+        self.assertFalse(Booking.objects.exists())
+        self.assert_consistent()
+        self.assertEqual(FacetCount.objects.get(city="", property_type="", price_bucket="").count, 1)
+
+    def test_seller_deletes_property(self):
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        prop = Property.objects.create(
+            seller=seller, title="Flat", address="Road 1", city="Dhaka", property_type="RENT", price=30000,
+        )
+        image = self.image(prop, "green")
+        Booking.objects.create(property=prop, tenant=tenant, status="PENDING")
+
+        self.client.force_login(seller)
+        self.client.post(reverse("seller_delete_property", args=[prop.id]))
+
+        # off the market right away
+        prop.refresh_from_db()
+        self.assertEqual(prop.status, "INACTIVE")
+        self.assertFalse(self.facet_counts())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.drain("tests")
+        self.assertEqual(DeletionRun.objects.get().status, "DONE")
+        self.assertFalse(Property.objects.exists())
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media, image.image.name)))
+        self.assert_consistent()
+
+    def test_property_being_deleted_takes_no_requests(self):
+        admin = User.objects.create_user("admin", password="x", role="ADMIN")
+        seller = User.objects.create_user("seller", password="x", role="SELLER")
+        tenant = User.objects.create_user("tenant", password="x", role="TENANT")
+        prop = Property.objects.create(
+            seller=seller, title="Flat", address="Road 1", city="Dhaka", property_type="RENT", price=30000,
+            is_featured=True,
+        )
+
+        self.client.force_login(admin)
+        self.client.post(reverse("admin-properties"), {"property_id": prop.id})
+        prop.refresh_from_db()
+        self.assertEqual((prop.status, prop.is_featured), ("INACTIVE", False))
+
+        # and cannot be featured again
+        self.client.post(reverse("admin-properties"), {"property_id": prop.id, "action": "toggle_featured"})
+        prop.refresh_from_db()
+        self.assertFalse(prop.is_featured)
+
+        self.client.force_login(tenant)
+        self.client.post(reverse("request-visit", args=[prop.id]), {"preferred_date": datetime.date.today()})
+        self.client.post(reverse("book-property", args=[prop.id]))
+        self.assertFalse(VisitRequest.objects.exists())
+        self.assertFalse(Booking.objects.exists())
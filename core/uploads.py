@@ -0,0 +1,228 @@
+import hashlib
+import os
+import re
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image
+
+from .models import PropertyImage, UploadSession
+
+
+# resumable chunked uploads for property images
+#
+# the client creates an UploadSession, PUTs the bytes in order with a
+# Content-Range header, and finalizes. Chunks are streamed straight from
+# the request into a .part file, so memory stays at one block per request
+# no matter how large the photo is. The part file's size is the source of
+# truth for the offset, so a client can always ask where to resume from.
+#
+# one request at a time writes to a session: a PUT or finalize first sets
+# the session's locked_at with a single conditional UPDATE (no lock is
+# held while the bytes arrive), and a second request meanwhile gets a 409
+# and asks for the offset again. A lock left by a dead request expires
+# after CHUNKED_UPLOAD_LOCK_SECONDS. Sessions left unfinished for
+# CHUNKED_UPLOAD_EXPIRY_HOURS are removed with their part files by
+# prune() (python manage.py prune_uploads).
+#
+# the file name's extension is checked when the session is created (the
+# same image extensions as the bulk import), and the finished file is
+# opened with PIL before it becomes a PropertyImage, so nothing but an
+# image is ever served from the media URL.
+
+
+BLOCK_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def part_path(session):
+    return os.path.join(settings.CHUNKED_UPLOAD_ROOT, f"{session.id}.part")
+
+
+def current_offset(session):
+    try:
+        return os.path.getsize(part_path(session))
+    except FileNotFoundError:
+        return 0
+
+
+def parse_content_range(header):
+    # "bytes 0-1048575/7340032" -> (0, 1048575, 7340032)
+    match = CONTENT_RANGE_RE.match((header or "").strip())
+    if not match:
+        raise UploadError("Content-Range header is required, e.g. 'bytes 0-1023/4096'.")
+    start, end, total = (int(v) for v in match.groups())
+    if end < start:
+        raise UploadError("Invalid Content-Range.")
+    return start, end, total
+
+
+@contextmanager
+def locked(session):
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.CHUNKED_UPLOAD_LOCK_SECONDS)
+    claimed = UploadSession.objects.filter(id=session.id, status="ACTIVE").filter(
+        Q(locked_at__isnull=True) | Q(locked_at__lt=expired)
+    ).update(locked_at=now)
+    if not claimed:
+        raise UploadError("Another request is writing to this upload.", status=409)
+    try:
+        yield
+    finally:
+        UploadSession.objects.filter(id=session.id, locked_at=now).update(locked_at=None)
+
+
+def write_chunk(session, stream, content_range, chunk_sha256=None):
+    start, end, total = parse_content_range(content_range)
+    length = end - start + 1
+
+    if total != session.total_size:
+        raise UploadError("Content-Range total does not match the upload size.")
+    if end >= session.total_size:
+        raise UploadError("Chunk goes past the end of the upload.")
+    if length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError("Chunk is too large.", status=413)
+
+    with locked(session):
+        return append_chunk(session, stream, start, length, chunk_sha256)
+
+
+def append_chunk(session, stream, start, length, chunk_sha256):
+    offset = current_offset(session)
+    if start != offset:
+        # client is out of sync (retry of an old chunk, lost chunk...)
+        raise UploadError(f"Expected offset {offset}.", status=409)
+
+    os.makedirs(settings.CHUNKED_UPLOAD_ROOT, exist_ok=True)
+    sha = hashlib.sha256()
+    written = 0
+
+    with open(part_path(session), "ab") as f:
+        try:
+            while written < length:
+                block = stream.read(min(BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                f.write(block)
+                sha.update(block)
+                written += len(block)
+
+            if written != length:
+                raise UploadError("Chunk body is shorter than its Content-Range.")
+            if chunk_sha256 and sha.hexdigest() != chunk_sha256.lower():
+                raise UploadError("Chunk checksum mismatch.", status=422)
+        except BaseException:
+            # drop the partial chunk so the client can resend it as a whole
+            f.truncate(offset)
+            raise
+
+    session.received = offset + written
+    session.save(update_fields=["received", "updated_at"])
+    return session.received
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def finalize(session):
+    with locked(session):
+        return attach(session)
+
+
+def attach(session):
+    path = part_path(session)
+    if current_offset(session) != session.total_size:
+        raise UploadError(f"Upload is incomplete ({current_offset(session)} of {session.total_size} bytes).", status=409)
+
+    if session.sha256 and file_sha256(path) != session.sha256:
+        # the bytes on disk are wrong; start over
+        os.remove(path)
+        session.received = 0
+        session.save(update_fields=["received", "updated_at"])
+        raise UploadError("File checksum mismatch, upload discarded.", status=422)
+
+    if not is_image(path):
+        os.remove(path)
+        session.received = 0
+        session.save(update_fields=["received", "updated_at"])
+        raise UploadError("File is not a readable image, upload discarded.", status=422)
+
+    with open(path, "rb") as f:
+        image = PropertyImage.objects.create(
+            property=session.property,
+            image=File(f, name=session.filename),
+        )
+
+    os.remove(path)
+    session.status = "COMPLETE"
+    session.save(update_fields=["status", "updated_at"])
+    return image
+
+
+def is_image(path):
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except (OSError, SyntaxError, ValueError):
+        return False
+    return True
+
+
+def cancel(session):
+    with locked(session):
+        discard(session)
+        session.delete()
+
+
+def discard(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        return 0
+    return 1
+
+
+def prune(hours=None):
+    # removes sessions not written to for `hours` and their part files,
+    # then part files whose session is gone (e.g. with its property);
+    # returns (sessions, files) removed
+    hours = settings.CHUNKED_UPLOAD_EXPIRY_HOURS if hours is None else hours
+    cutoff = timezone.now() - timedelta(hours=hours)
+
+    stale = UploadSession.objects.filter(updated_at__lt=cutoff).filter(
+        Q(locked_at__isnull=True) | Q(locked_at__lt=cutoff)
+    )
+    files = 0
+    for session in stale.filter(status="ACTIVE").only("id"):
+        files += discard(session)
+    sessions = stale.delete()[0]
+
+    try:
+        names = os.listdir(settings.CHUNKED_UPLOAD_ROOT)
+    except FileNotFoundError:
+        names = []
+    live = {str(session_id) for session_id in UploadSession.objects.values_list("id", flat=True)}
+    for name in names:
+        path = os.path.join(settings.CHUNKED_UPLOAD_ROOT, name)
+        session_id, ext = os.path.splitext(name)
+        if ext == ".part" and session_id not in live and os.path.getmtime(path) < cutoff.timestamp():
+            os.remove(path)
+            files += 1
+    return sessions, files
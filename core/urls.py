@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# read-heavy pages have async versions for ASGI deployments (core/async_views.py)
+pages = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     
@@ -7,31 +11,39 @@ urlpatterns = [
     path("register/", views.register_view, name="register"),
 
     # admin routes - made by azmain
-    path("", views.home, name="home"),
-    path("dashboard/admin/", views.admin_dashboard, name="admin-dashboard"),
-    path("dashboard/admin/payments/", views.admin_payments, name="admin-payments"),
-    path("dashboard/admin/deals/", views.admin_deals, name="admin-deals"),
-    path("dashboard/admin/users/", views.admin_users, name="admin-users"),
+    path("", pages.home, name="home"),
+    path("dashboard/admin/", pages.admin_dashboard, name="admin-dashboard"),
+    path("dashboard/admin/payments/", pages.admin_payments, name="admin-payments"),
+    path("dashboard/admin/deals/", pages.admin_deals, name="admin-deals"),
+    path("dashboard/admin/export/<str:kind>/", pages.admin_export, name="admin-export"),
+    path("dashboard/admin/users/", pages.admin_users, name="admin-users"),
     path("dashboard/admin/users/add/", views.admin_add_user, name="admin-add-user"),
-    path("dashboard/admin/properties/", views.admin_properties, name="admin-properties"),
+    path("dashboard/admin/users/import/", views.admin_import_users, name="admin-import-users"),
+    path("dashboard/admin/properties/", pages.admin_properties, name="admin-properties"),
     path("dashboard/admin/properties/add/", views.admin_add_property, name="admin-add-property"),
-    path("dashboard/admin/visit-requests/", views.admin_visit_requests, name="admin-visit-requests"),
-    path("dashboard/admin/bookings/", views.admin_bookings, name="admin-bookings"),
+    path("dashboard/admin/properties/import/", views.admin_import_properties, name="admin-import-properties"),
+    path("dashboard/admin/visit-requests/", pages.admin_visit_requests, name="admin-visit-requests"),
+    path("dashboard/admin/bookings/", pages.admin_bookings, name="admin-bookings"),
+    path("dashboard/admin/history/", views.admin_history, name="admin-history"),
+    path("dashboard/admin/events/", pages.admin_queue_events, name="admin-queue-events"),
+    path("dashboard/admin/queue-rows/", views.admin_queue_rows, name="admin-queue-rows"),
     path("redirect/", views.role_redirect, name="role-redirect"),
 
     # tenant routes - made by tanzeem
-    path("dashboard/tenant/", views.tenant_dashboard, name="tenant-dashboard"),
-    path("dashboard/tenant/property/<int:property_id>/", views.property_detail, name="property-detail"),
+    path("dashboard/tenant/", pages.tenant_dashboard, name="tenant-dashboard"),
+    path("dashboard/tenant/property/<int:property_id>/", pages.property_detail, name="property-detail"),
+    path("dashboard/tenant/search/", views.property_search, name="property-search"),
     path("dashboard/tenant/request-visit/<int:property_id>/", views.request_visit, name="request-visit"),
     path("dashboard/tenant/my-visits/", views.tenant_my_visits, name="tenant-my-visits"),
     path("dashboard/tenant/book/<int:property_id>/", views.book_property, name="book-property"),
     path("dashboard/tenant/my-bookings/", views.tenant_my_bookings, name="tenant-my-bookings"),
     path("dashboard/tenant/my-properties/", views.tenant_my_properties, name="tenant-my-properties"),
+    path("dashboard/tenant/history/", views.tenant_history, name="tenant-history"),
     path("dashboard/tenant/payment/<int:booking_id>/", views.initiate_payment, name="initiate-payment"),
     path("dashboard/tenant/payment/<int:booking_id>/confirmation/", views.payment_confirmation, name="payment-confirmation"),
 
     # seller routes - made by saud
-    path("dashboard/seller/", views.seller_dashboard, name="seller-dashboard"),
+    path("dashboard/seller/", pages.seller_dashboard, name="seller-dashboard"),
     path("dashboard/seller/properties/", views.seller_properties, name="seller_properties"),
     path("dashboard/seller/properties/add/", views.add_property, name="seller_add_property"),
     path("dashboard/seller/properties/edit/<int:property_id>/", views.edit_property, name="seller_edit_property"),
@@ -40,4 +52,9 @@ urlpatterns = [
     path("dashboard/seller/bookings/", views.seller_bookings, name="seller_bookings"),
     path("dashboard/seller/payments/", views.seller_payments, name="seller_payments"),
 
+    # chunked image uploads (seller / admin)
+    path("uploads/", views.upload_create, name="upload-create"),
+    path("uploads/<uuid:upload_id>/", views.upload_chunk, name="upload-chunk"),
+    path("uploads/<uuid:upload_id>/finalize/", views.upload_finalize, name="upload-finalize"),
+
 ]
@@ -0,0 +1,97 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import router, transaction
+
+from .models import User
+
+
+# logged-in user lookup without the database
+#
+# AuthenticationMiddleware resolves request.user on every request: the
+# session (cached_db sessions, read from the "auth" cache) gives the user
+# id, and CachedUserBackend.get_user() then looks the user up here
+# instead of in core_user. A user is cached under its current version
+# ("auth-user:<id>:<version>"); the version itself is a cache entry that
+# the User signals in models.py bump on save and delete, so the next
+# request loads the fresh row and the old copy simply expires.
+#
+# The bump happens right away and again after the transaction commits,
+# which drops a copy that another request read in between. A bump writes
+# a new random version rather than incrementing (incr on the file cache
+# is a read and a write, so two bumps could both land on the same
+# number), and a missing version (never set, or culled) gets a new one
+# too; either way it never matches a version an older copy was stored
+# under.
+#
+# only the fields the pages read are cached, not the password hash: the
+# session check gets the hash the session itself holds (an HMAC of the
+# password, see User.get_session_auth_hash), and any other field loads
+# from the database on first access, as a deferred field would.
+
+CACHED_FIELDS = ["id", "username", "first_name", "last_name", "role", "is_active", "is_staff", "is_superuser"]
+
+
+def auth_cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def version_key(user_id):
+    return f"auth-user-version:{user_id}"
+
+
+def user_key(user_id, version):
+    return f"auth-user:{user_id}:{version}"
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def current_version(user_id):
+    cache = auth_cache()
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(user_id):
+    auth_cache().set(version_key(user_id), new_version(), None)
+
+
+def bump_version(user_id):
+    bump(user_id)
+    # runs right away outside of atomic blocks
+    transaction.on_commit(lambda: bump(user_id))
+
+
+class CachedUserBackend(ModelBackend):
+    # authenticate() and permissions as ModelBackend; only get_user is cached
+
+    def get_user(self, user_id):
+        key = user_key(user_id, current_version(user_id))
+        cached = auth_cache().get(key)
+        if cached is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cached = {field: getattr(user, field) for field in CACHED_FIELDS}
+            cached["session_auth_hash"] = user.get_session_auth_hash()
+            auth_cache().set(key, cached, settings.AUTH_USER_CACHE_SECONDS)
+        else:
+            user = cached_user(cached)
+        return user if self.user_can_authenticate(user) else None
+
+
+def cached_user(cached):
+    # a User with only the cached fields loaded; the rest are deferred.
+    # from_db takes the values in the model's field order
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in CACHED_FIELDS]
+    user = User.from_db(router.db_for_read(User), fields, [cached[field] for field in fields])
+    user._session_auth_hash = cached["session_auth_hash"]
+    return user
@@ -1,11 +1,29 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.http import urlencode
+import math
+import os
 from decimal import Decimal
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Case, Exists, OuterRef, Prefetch, Q, Value, When
 
-from .models import User, Property, Booking, Payment, VisitRequest, PropertyImage
+from .models import (
+    User, Property, Booking, Payment, VisitRequest, PropertyImage, UploadSession, TenantOwnership, ImportRun,
+    ArchivedBooking, ArchivedVisitRequest, DeletionRun,
+)
+from . import (
+    activity, assignment, deletion, exports, facets, geo, imports, notify, outbox, property_cache, streaming, uploads,
+)
+
+
+# first image of each card, ordered so .first in templates reads the prefetch
+first_images = Prefetch("images", queryset=PropertyImage.objects.order_by("id"))
 
 
 #  displays featured properties
@@ -100,16 +118,18 @@ def register_view(request):
             })
 
         # Create user
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            first_name=first_name,
-            last_name=last_name,
-            phone_number=phone_number,
-            address=address,
-            role=role,
-            password=password
-        )
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username=username,
+                email=email,
+                first_name=first_name,
+                last_name=last_name,
+                phone_number=phone_number,
+                address=address,
+                role=role,
+                password=password
+            )
+            outbox.notify("welcome", user, user.id)
 
         # Auto login 
         login(request, user)
@@ -168,7 +188,13 @@ def admin_dashboard(request):
     return render(request, "dashboard/admin_dashboard.html", context)
 
 
+def recent_deletions(kind):
+    return DeletionRun.objects.filter(kind=kind).order_by("-created_at")[:10]
+
+
 #  lists  users,deletion
+# (a deleted user is made inactive here and removed by a background job,
+# see core/deletion.py)
 @login_required
 def admin_users(request):
     if request.user.role != "ADMIN":
@@ -182,18 +208,19 @@ def admin_users(request):
         user_id = request.POST.get("user_id")
         try:
             u = User.objects.get(id=user_id)
-            u.delete()
+            deletion.queue_deletion(u, request.user)
         except User.DoesNotExist:
             pass
         return redirect("admin-users")
 
     context = {
-        "sellers": sellers,
-        "tenants": tenants,
-        "agents": agents,
+        "sellers": streaming.Rows(sellers, "dashboard/partials/admin_user_rows.html"),
+        "tenants": streaming.Rows(tenants, "dashboard/partials/admin_user_rows.html"),
+        "agents": streaming.Rows(agents, "dashboard/partials/admin_user_rows.html"),
+        "deletions": recent_deletions("USER"),
     }
 
-    return render(request, "dashboard/admin_users.html", context)
+    return streaming.render_page(request, "dashboard/admin_users.html", context)
 
 
 #  creates new user 
@@ -209,6 +236,9 @@ def admin_add_user(request):
         role = request.POST.get("role")
         password = request.POST.get("password")
 
+        if role not in ["SELLER", "TENANT", "AGENT"]:
+            return render(request, "dashboard/admin_add_user.html", {"errors": ["Invalid role selected."]})
+
         User.objects.create_user(
             username=username,
             email=email,
@@ -222,6 +252,51 @@ def admin_add_user(request):
     return render(request, "dashboard/admin_add_user.html")
 
 
+# bulk imports: the uploaded files are imported by a background job; a
+# failed run can be resumed from its last committed batch
+def import_page(request, kind, url_name):
+    errors = []
+    if request.method == "POST":
+        if request.POST.get("action") == "resume":
+            run = ImportRun.objects.filter(id=request.POST.get("run_id"), kind=kind, status="FAILED").first()
+            if run is not None:
+                imports.resume_import(run)
+            return redirect(url_name)
+
+        upload = request.FILES.get("file")
+        if upload is None:
+            errors.append("Choose a file to import.")
+        else:
+            try:
+                imports.queue_import(kind, upload, request.user, archive=request.FILES.get("images"))
+            except imports.ImportFileError as e:
+                errors.append(str(e))
+            else:
+                return redirect(url_name)
+
+    context = {
+        "errors": errors,
+        "kind": kind,
+        "columns": imports.USER_FIELDS if kind == "USERS" else imports.PROPERTY_FIELDS,
+        "runs": ImportRun.objects.filter(kind=kind).order_by("-created_at")[:20],
+    }
+    return render(request, "dashboard/admin_imports.html", context)
+
+
+@login_required
+def admin_import_users(request):
+    if request.user.role != "ADMIN":
+        return redirect("home")
+    return import_page(request, "USERS", "admin-import-users")
+
+
+@login_required
+def admin_import_properties(request):
+    if request.user.role != "ADMIN":
+        return redirect("home")
+    return import_page(request, "PROPERTIES", "admin-import-properties")
+
+
 # a lists  properties,feature prop, delete
 @login_required
 def admin_properties(request):
@@ -238,23 +313,25 @@ def admin_properties(request):
             
             if action == "toggle_featured":
                 
-                if prop.status != "SOLD":
+                # a sold or deleted listing is never featured again
+                if prop.is_featured or prop.status not in ["SOLD", "INACTIVE"]:
                     prop.is_featured = not prop.is_featured
                     prop.save()
             elif action == "delete":
-                prop.delete()
+                deletion.queue_deletion(prop, request.user)
                 
         except Property.DoesNotExist:
             pass
         return redirect("admin-properties")
 
     # Show all properties
-    properties = list(Property.objects.select_related("seller").all())
+    properties = Property.objects.select_related("seller").all()
 
     context = {
-        "properties": properties,
+        "properties": streaming.Rows(properties, "dashboard/partials/admin_property_rows.html"),
+        "deletions": recent_deletions("PROPERTY"),
     }
-    return render(request, "dashboard/admin_properties.html", context)
+    return streaming.render_page(request, "dashboard/admin_properties.html", context)
 
 
 #creates new property for a seller
@@ -329,19 +406,22 @@ def admin_payments(request):
                     payment.approved_by_admin = request.user
                     payment.approved_at = timezone.now()
                     
-                    
-                    if payment.booking.property.property_type == "SELL":
-                        payment.booking.property.status = "BOOKED"
-                        payment.booking.property.save()
-                    
-                    payment.save()
+                    with transaction.atomic():
+                        if payment.booking.property.property_type == "SELL":
+                            payment.booking.property.status = "BOOKED"
+                            payment.booking.property.save()
+
+                        payment.save()
+                        outbox.notify("payment_approved", payment.booking.tenant, payment.id, payment=payment)
             
             elif action == "send_to_seller":
                 # Only send if approved 
                 if payment.status == "APPROVED" and not payment.seller_amount_sent:
                     payment.seller_amount_sent = True
                     payment.seller_amount_sent_at = timezone.now()
-                    payment.save()
+                    with transaction.atomic():
+                        payment.save()
+                        outbox.notify("payout_sent", payment.seller, payment.id, payment=payment)
 
         return redirect("admin-payments")
 
@@ -386,10 +466,32 @@ def admin_deals(request):
     ).order_by("-seller_amount_sent_at")
 
     context = {
-        "completed_deals": completed_deals,
+        "completed_deals": streaming.Rows(completed_deals, "dashboard/partials/admin_deal_rows.html"),
     }
 
-    return render(request, "dashboard/admin_deals.html", context)
+    return streaming.render_page(request, "dashboard/admin_deals.html", context)
+
+
+# csv / jsonl download of deals, payments or bookings, streamed in chunks
+@login_required
+def admin_export(request, kind):
+    if request.user.role != "ADMIN":
+        return redirect("home")
+
+    fmt = request.GET.get("format", "csv")
+    try:
+        start = exports.parse_day(request.GET.get("from"), "from")
+        end = exports.parse_day(request.GET.get("to"), "to")
+        exports.get_export(kind, fmt)
+    except exports.ExportError as e:
+        return HttpResponseBadRequest(str(e))
+
+    response = StreamingHttpResponse(
+        exports.stream(kind, fmt, start, end),
+        content_type=f"{exports.FORMATS[fmt][0]}; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{exports.filename(kind, fmt, start, end)}"'
+    return response
 
 
 # tenant routes - tanzeem
@@ -400,36 +502,20 @@ def property_detail(request, property_id):
     if request.user.role != "TENANT":
         return redirect("home")
 
-    prop = get_object_or_404(Property, id=property_id)
-    images = prop.images.all()
-
-    
-    has_pending_visit = VisitRequest.objects.filter(
-        property=prop,
-        tenant=request.user,
-        status="PENDING"
-    ).exists()
-
-   
-    has_approved_visit = VisitRequest.objects.filter(
-        property=prop,
-        tenant=request.user,
-        status="APPROVED"
-    ).exists()
+    # version and per-tenant flags in one query; the rest comes from the cache
+    flags = property_cache.tenant_flags(property_id, request.user).first()
+    if flags is None:
+        raise Http404("No Property matches the given query.")
 
-    
-    has_booking = Booking.objects.filter(
-        property=prop,
-        tenant=request.user,
-        status__in=["PENDING", "CONFIRMED", "COMPLETED"]
-    ).exists()
+    prop, images = property_cache.get_page(property_id, flags["version"])
 
     context = {
         "property": prop,
         "images": images,
-        "has_pending_visit": has_pending_visit,
-        "has_approved_visit": has_approved_visit,
-        "has_booking": has_booking,
+        "similar": property_cache.similar_listings(property_id),
+        "has_pending_visit": flags["has_pending_visit"],
+        "has_approved_visit": flags["has_approved_visit"],
+        "has_booking": flags["has_booking"],
     }
 
     return render(request, "dashboard/property_detail.html", context)
@@ -444,21 +530,83 @@ def tenant_dashboard(request):
     
     properties = Property.objects.select_related("seller").filter(status="AVAILABLE")
 
-   
-    confirmed_properties_count = Booking.objects.filter(
-        tenant=request.user,
-        status="COMPLETED",
-        payments__status="APPROVED"
-    ).distinct().count()
+    # owned-property count comes from the activity summary row
+    summary = activity.get_summary(request.user)
 
     context = {
         "properties": properties,
-        "confirmed_properties_count": confirmed_properties_count,
+        "confirmed_properties_count": summary.owned_properties,
+        # filter counts are kept up to date by the property signals
+        "facets": facets.for_listing(),
     }
 
     return render(request, "dashboard/tenant_dashboard.html", context)
 
 
+# nearby / bounding box search over available properties (JSON)
+#   ?lat=23.78&lon=90.41&radius_km=3   or   ?near=Gulshan&radius_km=3
+#   ?bbox=min_lat,min_lon,max_lat,max_lon
+@login_required
+def property_search(request):
+    if request.user.role != "TENANT":
+        return JsonResponse({"error": "Not allowed."}, status=403)
+
+    params = request.GET
+    try:
+        limit = min(int(params.get("limit", 50)), 200)
+        radius_km = float(params.get("radius_km", 5))
+        bbox = [float(v) for v in params["bbox"].split(",")] if params.get("bbox") else None
+        lat = float(params["lat"]) if params.get("lat") else None
+        lon = float(params["lon"]) if params.get("lon") else None
+        # float() also takes "inf" and "nan"
+        if not all(math.isfinite(v) for v in (radius_km, lat, lon, *(bbox or [])) if v is not None):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({"error": "lat, lon, radius_km, bbox and limit must be numbers."}, status=400)
+    if limit < 1:
+        return JsonResponse({"error": "limit must be at least 1."}, status=400)
+
+    if params.get("near"):
+        place = geo.find_place(params["near"])
+        if place is None:
+            return JsonResponse({"error": "Unknown place."}, status=400)
+        lat, lon = place.latitude, place.longitude
+
+    properties = Property.objects.filter(status="AVAILABLE")
+
+    if bbox is not None:
+        if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            return JsonResponse({"error": "bbox is min_lat,min_lon,max_lat,max_lon."}, status=400)
+        # counted and cut to the limit in SQL, a box can hold any number
+        in_box = geo.within_box(properties, *bbox)
+        count = in_box.count()
+        found = [(None, prop) for prop in in_box.order_by("geohash")[:limit]]
+    elif lat is not None and lon is not None:
+        if not 0 < radius_km <= 100:
+            return JsonResponse({"error": "radius_km must be between 0 and 100."}, status=400)
+        # exact distances are checked in Python, over a box of at most 200km
+        found = geo.within_radius(properties, lat, lon, radius_km)
+        count = len(found)
+    else:
+        return JsonResponse({"error": "Give lat and lon, near, or bbox."}, status=400)
+
+    results = [
+        {
+            "id": prop.id,
+            "title": prop.title,
+            "city": prop.city,
+            "price": str(prop.price),
+            "property_type": prop.property_type,
+            "latitude": prop.latitude,
+            "longitude": prop.longitude,
+            "distance_km": None if distance is None else round(distance, 2),
+            "url": reverse("property-detail", args=[prop.id]),
+        }
+        for distance, prop in found[:limit]
+    ]
+    return JsonResponse({"count": count, "results": results})
+
+
 # visit request for property
 @login_required
 def request_visit(request, property_id):
@@ -466,8 +614,9 @@ def request_visit(request, property_id):
         return redirect("home")
 
     if request.method == "POST":
+        # only listings still on the market; one being deleted is INACTIVE
         try:
-            prop = Property.objects.get(id=property_id)
+            prop = Property.objects.get(id=property_id, status="AVAILABLE")
         except Property.DoesNotExist:
             return redirect("tenant-dashboard")
 
@@ -499,46 +648,38 @@ def tenant_my_visits(request):
     if request.user.role != "TENANT":
         return redirect("home")
 
-    # property IDs where tenant has completed payment 
-    completed_property_ids = set(
-        Booking.objects.filter(
-            tenant=request.user,
-            status="COMPLETED"
-        ).values_list("property_id", flat=True)
-    )
-
-    
-    visits = VisitRequest.objects.filter(tenant=request.user).exclude(
-        property_id__in=completed_property_ids
+    tenant = request.user
+
+    # per-visit booking state as correlated EXISTS subqueries, so the cost
+    # follows this tenant's visits and not the whole booking table
+    tenant_bookings = Booking.objects.filter(tenant=tenant, property=OuterRef("property_id"))
+    # ownership rows stay when completed bookings are archived
+    purchased = TenantOwnership.objects.filter(tenant=tenant, property=OuterRef("property_id"))
+    already_booked = tenant_bookings.filter(status__in=["PENDING", "CONFIRMED"])
+    property_confirmed = Booking.objects.filter(property=OuterRef("property_id"), status="CONFIRMED")
+
+    # properties the tenant already paid for are listed in "My Properties"
+    visits = VisitRequest.objects.filter(tenant=tenant).exclude(
+        Exists(purchased)
+    ).annotate(
+        already_booked=Exists(already_booked),
+        property_confirmed=Exists(property_confirmed),
+    ).annotate(
+        can_book=Case(
+            When(status="APPROVED", already_booked=False, property_confirmed=False, then=Value(True)),
+            default=Value(False),
+        )
     ).select_related(
         "property", "agent"
+    ).prefetch_related(
+        Prefetch("property__images", queryset=PropertyImage.objects.order_by("id"))
     ).order_by("-created_at")
 
-    
-    booked_property_ids = set(
-        Booking.objects.filter(
-            tenant=request.user,
-            status__in=["PENDING", "CONFIRMED"]
-        ).values_list("property_id", flat=True)
-    )
-
-    
-    confirmed_property_ids = set(
-        Booking.objects.filter(status="CONFIRMED").values_list("property_id", flat=True)
-    )
-
-    # Add a flag 
-    for visit in visits:
-        visit.can_book = (
-            visit.status == "APPROVED" and
-            visit.property_id not in booked_property_ids and
-            visit.property_id not in confirmed_property_ids
-        )
-        visit.already_booked = visit.property_id in booked_property_ids
-        visit.property_confirmed = visit.property_id in confirmed_property_ids
+    page_obj = Paginator(visits, 20).get_page(request.GET.get("page"))
 
     context = {
-        "visits": visits,
+        "visits": page_obj,
+        "page_obj": page_obj,
     }
 
     return render(request, "dashboard/tenant_my_visits.html", context)
@@ -555,6 +696,14 @@ def admin_visit_requests(request):
         action = request.POST.get("action")
         agent_id = request.POST.get("agent_id")
 
+        # approves every pending request the agents have room for
+        if action == "auto_assign":
+            result = assignment.assign_batch()
+            return redirect(
+                f"{reverse('admin-visit-requests')}?assigned={len(result.assigned)}"
+                f"&full={len(result.full)}&past={len(result.past)}"
+            )
+
         try:
             visit = VisitRequest.objects.get(id=visit_id)
         except VisitRequest.DoesNotExist:
@@ -568,10 +717,14 @@ def admin_visit_requests(request):
                     visit.agent = agent
                 except User.DoesNotExist:
                     pass
-            visit.save()
+            with transaction.atomic():
+                visit.save()
+                outbox.notify("visit_approved", visit.tenant, visit.id, visit=visit)
         elif action == "reject":
             visit.status = "REJECTED"
-            visit.save()
+            with transaction.atomic():
+                visit.save()
+                outbox.notify("visit_rejected", visit.tenant, visit.id, visit=visit)
 
         return redirect("admin-visit-requests")
 
@@ -587,13 +740,12 @@ def admin_visit_requests(request):
         "property", "tenant"
     ).order_by("-created_at")[:10]
 
-    agents = User.objects.filter(role="AGENT")
-
     context = {
-        "pending_visits": pending_visits,
+        # each with its agents and their load on the preferred date
+        "pending_visits": assignment.attach_workload(list(pending_visits)),
         "approved_visits": approved_visits,
         "rejected_visits": rejected_visits,
-        "agents": agents,
+        "agent_capacity": assignment.capacity(),
     }
 
     return render(request, "dashboard/admin_visit_requests.html", context)
@@ -607,7 +759,7 @@ def book_property(request, property_id):
 
     if request.method == "POST":
         try:
-            prop = Property.objects.get(id=property_id)
+            prop = Property.objects.get(id=property_id, status="AVAILABLE")
         except Property.DoesNotExist:
             return redirect("tenant-my-visits")
 
@@ -662,30 +814,44 @@ def tenant_my_properties(request):
     if request.user.role != "TENANT":
         return redirect("home")
 
-    
-    completed_bookings = Booking.objects.filter(
-        tenant=request.user,
-        status="COMPLETED"
-    ).select_related("property", "property__seller").prefetch_related("payments")
+    # one row per purchase, written by initiate_payment
+    ownerships = TenantOwnership.objects.filter(
+        tenant=request.user
+    ).select_related(
+        "property__seller"
+    ).prefetch_related(
+        Prefetch("property__images", queryset=PropertyImage.objects.order_by("id"))
+    ).order_by("-purchased_at")
 
-   
-    paid_properties = []
-    for booking in completed_bookings:
-        payment = booking.payments.filter(status="APPROVED").first()
-        if payment:
-            paid_properties.append({
-                "property": booking.property,
-                "payment": payment,
-                "booking": booking,
-            })
+    page_obj = Paginator(ownerships, 12).get_page(request.GET.get("page"))
 
     context = {
-        "paid_properties": paid_properties,
+        "paid_properties": page_obj,
+        "page_obj": page_obj,
     }
 
     return render(request, "dashboard/tenant_my_properties.html", context)
 
 
+# tenant's archived visits and bookings
+@login_required
+def tenant_history(request):
+    if request.user.role != "TENANT":
+        return redirect("home")
+
+    kind = "visits" if request.GET.get("kind") == "visits" else "bookings"
+    page_obj = Paginator(history_rows(kind, tenant=request.user), 25).get_page(request.GET.get("page"))
+
+    context = {
+        "kind": kind,
+        "rows": page_obj,
+        "page_obj": page_obj,
+        "page_query": urlencode({"kind": kind}) + "&",
+        "retention_days": settings.ARCHIVE_RETENTION_DAYS,
+    }
+    return render(request, "dashboard/history.html", context)
+
+
 # admin confirms or cancels booking requests
 @login_required
 def admin_bookings(request):
@@ -704,12 +870,16 @@ def admin_bookings(request):
         if action == "confirm":
             booking.status = "CONFIRMED"
             # Update property status to BOOKED
-            booking.property.status = "BOOKED"
-            booking.property.save()
-            booking.save()
+            with transaction.atomic():
+                booking.property.status = "BOOKED"
+                booking.property.save()
+                booking.save()
+                outbox.notify("booking_confirmed", booking.tenant, booking.id, booking=booking)
         elif action == "cancel":
             booking.status = "CANCELLED"
-            booking.save()
+            with transaction.atomic():
+                booking.save()
+                outbox.notify("booking_cancelled", booking.tenant, booking.id, booking=booking)
 
         return redirect("admin-bookings")
 
@@ -734,6 +904,98 @@ def admin_bookings(request):
     return render(request, "dashboard/admin_bookings.html", context)
 
 
+# archived visits and bookings (core/archive.py), newest first
+def history_rows(kind, **filters):
+    if kind == "visits":
+        rows = ArchivedVisitRequest.objects.select_related("property", "tenant", "seller", "agent")
+    else:
+        rows = ArchivedBooking.objects.select_related("property", "tenant", "seller").prefetch_related("payments")
+    return rows.filter(**filters).order_by("-created_at")
+
+
+@login_required
+def admin_history(request):
+    if request.user.role != "ADMIN":
+        return redirect("home")
+
+    kind = "visits" if request.GET.get("kind") == "visits" else "bookings"
+    username = request.GET.get("user", "").strip()
+
+    rows = history_rows(kind)
+    if username:
+        user_id = User.objects.filter(username=username).values_list("id", flat=True).first()
+        rows = rows.filter(Q(tenant_id=user_id) | Q(seller_id=user_id))
+
+    page_obj = Paginator(rows, 25).get_page(request.GET.get("page"))
+
+    query = {"kind": kind, "user": username} if username else {"kind": kind}
+    context = {
+        "kind": kind,
+        "username": username,
+        "rows": page_obj,
+        "page_obj": page_obj,
+        "page_query": urlencode(query) + "&",
+        "retention_days": settings.ARCHIVE_RETENTION_DAYS,
+    }
+    return render(request, "dashboard/history.html", context)
+
+
+# live queue updates without ASGI: answers with what is new and closes
+# (core/notify.py); the browser reconnects on its own
+@login_required
+def admin_queue_events(request):
+    if request.user.role != "ADMIN":
+        return redirect("home")
+
+    kinds = [k for k in request.GET.get("kinds", "").upper().split(",") if k]
+
+    last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        last_id = None
+
+    response = HttpResponse(notify.event_batch(last_id, kinds), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+# the queue rows named in a batch of events, for the page to put in place
+QUEUE_ROWS = {
+    "PAYMENT": (Payment, ("booking__property", "booking__tenant"), "dashboard/partials/pending_payment_rows.html"),
+    "VISIT": (VisitRequest, ("property", "tenant"), "dashboard/partials/pending_visit_rows.html"),
+    "BOOKING": (Booking, ("property", "tenant"), "dashboard/partials/pending_booking_rows.html"),
+}
+
+
+@login_required
+def admin_queue_rows(request):
+    if request.user.role != "ADMIN":
+        return redirect("home")
+
+    kind = request.GET.get("kind", "").upper()
+    if kind not in QUEUE_ROWS:
+        return HttpResponseBadRequest("unknown kind")
+    try:
+        ids = [int(i) for i in request.GET.get("ids", "").split(",") if i]
+    except ValueError:
+        return HttpResponseBadRequest("bad ids")
+    if not ids or len(ids) > 100:
+        return HttpResponseBadRequest("bad ids")
+
+    # rows that left the queue are simply not returned; the page drops them
+    model, related, template = QUEUE_ROWS[kind]
+    rows = list(
+        model.objects.filter(id__in=ids, status="PENDING").select_related(*related).order_by("-created_at")
+    )
+
+    context = {"rows": rows}
+    if kind == "VISIT":
+        context["rows"] = assignment.attach_workload(rows)
+        context["agent_capacity"] = assignment.capacity()
+    return render(request, template, context)
+
+
 # tenant pays for confirmed booking, marks property as sold
 @login_required
 def initiate_payment(request, booking_id):
@@ -754,24 +1016,34 @@ def initiate_payment(request, booking_id):
         platform_cut = amount * Decimal('0.10')
         seller_amount = amount - platform_cut
         
-        
-        Payment.objects.create(
-            booking=booking,
-            amount=amount,
-            platform_cut=platform_cut,
-            seller_amount=seller_amount,
-            status="APPROVED",
-            approved_at=timezone.now()
-        )
-        
-        # Mark booking as COMPLETED 
-        booking.status = "COMPLETED"
-        booking.save()
-        
-        # Mark property as SOLD and remove from featured
-        booking.property.status = "SOLD"
-        booking.property.is_featured = False
-        booking.property.save()
+        # one transaction, so the writes land (and refresh summaries) together
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                booking=booking,
+                amount=amount,
+                platform_cut=platform_cut,
+                seller_amount=seller_amount,
+                status="APPROVED",
+                approved_at=timezone.now()
+            )
+
+            TenantOwnership.objects.create(
+                tenant_id=booking.tenant_id,
+                property_id=booking.property_id,
+                booking=booking,
+                payment=payment,
+                amount=payment.amount,
+                purchased_at=payment.approved_at,
+            )
+
+            # Mark booking as COMPLETED
+            booking.status = "COMPLETED"
+            booking.save()
+
+            # Mark property as SOLD and remove from featured
+            booking.property.status = "SOLD"
+            booking.property.is_featured = False
+            booking.property.save()
 
     return redirect("payment-confirmation", booking_id=booking_id)
 
@@ -805,39 +1077,25 @@ def seller_dashboard(request):
         return redirect("home")
 
     seller = request.user
-    properties = Property.objects.filter(seller=seller).order_by("-created_at")
-    
-   
-    bookings = Booking.objects.filter(property__seller=seller).select_related(
-        "property", "tenant"
-    ).order_by("-created_at")
-    
-   
-    appointments = VisitRequest.objects.filter(property__seller=seller).select_related(
+
+    # headline numbers: one row by primary key
+    summary = activity.get_summary(seller)
+
+    # only the cards shown on the page
+    properties = Property.objects.filter(seller=seller).order_by(
+        "-created_at"
+    ).prefetch_related(first_images)[:6]
+
+    bookings = Booking.objects.filter(seller=seller).select_related(
         "property", "tenant"
-    ).order_by("-created_at")
-    
-    
-    payments_sent = Payment.objects.filter(
-        booking__property__seller=seller,
-        status="APPROVED",
-        seller_amount_sent=True
-    )
-    payments_total = payments_sent.aggregate(Sum("seller_amount"))["seller_amount__sum"] or 0
-    
-    
-    pending_payments = Payment.objects.filter(
-        booking__property__seller=seller,
-        status="APPROVED",
-        seller_amount_sent=False
-    ).aggregate(Sum("seller_amount"))["seller_amount__sum"] or 0
+    ).order_by("-created_at")[:5]
 
     context = {
+        "summary": summary,
         "properties": properties,
         "bookings": bookings,
-        "appointments": appointments,
-        "payments_total": payments_total,
-        "pending_payments": pending_payments,
+        "payments_total": summary.payments_received,
+        "pending_payments": summary.payments_pending,
     }
     return render(request, "dashboard/seller_dashboard.html", context)
 
@@ -920,12 +1178,12 @@ def edit_property(request, property_id):
     return render(request, "dashboard/seller_add_property.html", context)
 
 
-# dedlete property listing
+# dedlete property listing (taken off the market now, removed in the background)
 @login_required
 def delete_property(request, property_id):
     prop = get_object_or_404(Property, id=property_id, seller=request.user)
     if request.method == "POST":
-        prop.delete()
+        deletion.queue_deletion(prop, request.user)
     return redirect("seller_properties")
 
 
@@ -935,8 +1193,7 @@ def seller_appointments(request):
     if request.user.role != "SELLER":
         return redirect("home")
 
-    properties = Property.objects.filter(seller=request.user)
-    appointments = VisitRequest.objects.filter(property__in=properties).select_related(
+    appointments = VisitRequest.objects.filter(seller=request.user).select_related(
         "property", "tenant", "agent"
     ).order_by("-created_at")
 
@@ -950,8 +1207,7 @@ def seller_bookings(request):
     if request.user.role != "SELLER":
         return redirect("home")
 
-    properties = Property.objects.filter(seller=request.user)
-    bookings = Booking.objects.filter(property__in=properties).select_related(
+    bookings = Booking.objects.filter(seller=request.user).select_related(
         "property", "tenant"
     ).order_by("-created_at")
 
@@ -967,7 +1223,7 @@ def seller_payments(request):
 
    
     payments = Payment.objects.filter(
-        booking__property__seller=request.user,
+        seller=request.user,
         status="APPROVED",
         seller_amount_sent=True
     ).select_related(
@@ -976,7 +1232,7 @@ def seller_payments(request):
     
    
     pending_payments = Payment.objects.filter(
-        booking__property__seller=request.user,
+        seller=request.user,
         status="APPROVED",
         seller_amount_sent=False
     ).select_related(
@@ -991,10 +1247,118 @@ def seller_payments(request):
 
 
 
+# chunked image uploads - seller (own properties) and admin
+
+def can_upload_to(user, prop):
+    return user.role == "ADMIN" or (user.role == "SELLER" and prop.seller_id == user.id)
+
+
+def upload_state(session):
+    return {
+        "upload_id": str(session.id),
+        "offset": uploads.current_offset(session),
+        "total_size": session.total_size,
+        "status": session.status,
+    }
+
+
+# starts an upload session for one image
+@login_required
+def upload_create(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required."}, status=405)
+
+    try:
+        prop = Property.objects.get(id=request.POST.get("property_id"))
+    except (Property.DoesNotExist, ValueError):
+        return JsonResponse({"error": "Property not found."}, status=404)
+
+    if not can_upload_to(request.user, prop):
+        return JsonResponse({"error": "Not allowed."}, status=403)
+
+    filename = request.POST.get("filename", "").strip()
+    sha256 = request.POST.get("sha256", "").strip().lower()
+    try:
+        total_size = int(request.POST.get("size", ""))
+    except ValueError:
+        total_size = 0
+
+    if not filename or total_size <= 0:
+        return JsonResponse({"error": "filename and size are required."}, status=400)
+    if os.path.splitext(filename)[1].lower() not in imports.IMAGE_EXTENSIONS:
+        return JsonResponse({"error": "Only image files can be uploaded."}, status=400)
+    if total_size > settings.CHUNKED_UPLOAD_MAX_FILE_SIZE:
+        return JsonResponse({"error": "File is too large."}, status=413)
+
+    session = UploadSession.objects.create(
+        owner=request.user,
+        property=prop,
+        filename=filename[:255],
+        total_size=total_size,
+        sha256=sha256[:64],
+    )
+    return JsonResponse(upload_state(session), status=201)
+
+
+# GET/HEAD: where to resume, PUT: append a chunk, DELETE: cancel
+@login_required
+def upload_chunk(request, upload_id):
+    session = get_object_or_404(UploadSession, id=upload_id, owner=request.user)
+
+    if request.method in ("GET", "HEAD"):
+        return JsonResponse(upload_state(session))
+
+    if session.status != "ACTIVE":
+        return JsonResponse({"error": "Upload is already finished."}, status=409)
+
+    if request.method == "DELETE":
+        try:
+            uploads.cancel(session)
+        except uploads.UploadError as e:
+            return JsonResponse({"error": e.message, **upload_state(session)}, status=e.status)
+        return JsonResponse({"deleted": True})
+
+    if request.method != "PUT":
+        return JsonResponse({"error": "Method not allowed."}, status=405)
+
+    try:
+        # the request itself is the stream; the body is never loaded whole
+        uploads.write_chunk(
+            session,
+            request,
+            request.headers.get("Content-Range"),
+            request.headers.get("X-Chunk-SHA256"),
+        )
+    except uploads.UploadError as e:
+        return JsonResponse({"error": e.message, **upload_state(session)}, status=e.status)
+
+    return JsonResponse(upload_state(session))
+
+
+# verifies the whole file and attaches it to the property
+@login_required
+def upload_finalize(request, upload_id):
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required."}, status=405)
+
+    session = get_object_or_404(UploadSession, id=upload_id, owner=request.user)
+    if session.status != "ACTIVE":
+        return JsonResponse({"error": "Upload is already finished."}, status=409)
+
+    try:
+        image = uploads.finalize(session)
+    except uploads.UploadError as e:
+        return JsonResponse({"error": e.message, **upload_state(session)}, status=e.status)
+
+    return JsonResponse({"image_id": image.id, "url": image.image.url, "status": session.status})
+
+
 """
 SQL Queries Reference
 
 Raw SQL equivalents of the Django ORM calls used in each view function.
+Status and role values are written by name; the columns store the small
+integer codes listed in models.py (e.g. status = 'APPROVED' is status = 2).
 
 
 SHARED ROUTES
@@ -1006,6 +1370,13 @@ register_view()
 SELECT 1 FROM core_user WHERE username = ? LIMIT 1;
 SELECT 1 FROM core_user WHERE email = ? LIMIT 1;
 INSERT INTO core_user (username, email, first_name, last_name, phone_number, address, role, password) VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+-- welcome email, in the same transaction; a deliver_outbox job sends it
+INSERT INTO core_outboxmessage (kind, recipient, subject, body, dedupe_key, status, send_after, ...) VALUES (...)
+ON CONFLICT DO NOTHING;
+SELECT * FROM core_job WHERE name = 'core.tasks.deliver_outbox' AND status = 'QUEUED' LIMIT 1;
+INSERT INTO core_job (name, args, kwargs, priority, status, run_at, unique_key, ...) VALUES (...);  -- unless one is queued
+-- an IntegrityError on job_unique_queued: another request queued it meanwhile, and its job is used
+UPDATE core_job SET run_at = ? WHERE id = ? AND status = 'QUEUED';  -- the queued one was due later
 
 
 ADMIN ROUTES (azmain)
@@ -1026,15 +1397,66 @@ admin_users()
 SELECT * FROM core_user WHERE role = 'SELLER';
 SELECT * FROM core_user WHERE role = 'TENANT';
 SELECT * FROM core_user WHERE role = 'AGENT';
+SELECT * FROM core_deletionrun WHERE kind = 1 ORDER BY created_at DESC LIMIT 10;
+-- queue_deletion (core/deletion.py), in one transaction:
+SELECT * FROM core_deletionrun WHERE kind = ? AND object_id = ? AND status IN (1, 2) LIMIT 1;
+UPDATE core_user SET is_active = 0 WHERE id = ?;
+INSERT INTO core_deletionrun (kind, object_id, label, created_by_id, ...) VALUES (?, ?, ?, ?, ...);
+INSERT INTO core_job (name, args, ...) VALUES ('core.tasks.run_deletion', '[<run id>]', ...);
+-- the job, step by step, leaves first; each step a batch of
+-- DELETION_BATCH_SIZE ids at a time, one transaction per batch:
+UPDATE core_property SET status = 4, is_featured = 0, version = version + 1 WHERE id IN (...);  -- AVAILABLE listings
+SELECT id FROM core_payment WHERE seller_id = ? LIMIT 500;
+DELETE FROM core_payment WHERE id IN (...);
+-- ... then payments of the user's bookings, ownerships, bookings, visits,
+-- the archived rows, agent and approver links (set to NULL), images
+-- (blobs released in bulk, files removed after commit) and properties
+-- (facet counts moved in bulk), as user_steps() in core/deletion.py
+UPDATE core_deletionrun SET deleted = ? WHERE id = ?;
 DELETE FROM core_user WHERE id = ?;
+UPDATE core_deletionrun SET status = 3, error = '', finished_at = ? WHERE id = ?;
 
 admin_add_user()
 INSERT INTO core_user (username, email, phone_number, role, password) VALUES (?, ?, ?, ?, ?);
 
+admin_import_users()
+INSERT INTO core_importrun (kind, status, source, filename, created_by_id, created_at, ...) VALUES ('USERS', 'QUEUED', ?, ?, ?, ?, ...);
+INSERT INTO core_job (name, args, ...) VALUES ('core.tasks.run_import', '[<run id>]', ...);
+SELECT * FROM core_importrun WHERE kind = 'USERS' ORDER BY created_at DESC LIMIT 20;
+-- the job, per batch of IMPORT_BATCH_SIZE rows (passwords hashed in a process pool)
+SELECT username FROM core_user WHERE username IN (?, ...);
+SELECT email FROM core_user WHERE email IN (?, ...);
+INSERT INTO core_user (username, email, password, role, ...) VALUES (...), (...), ...;
+UPDATE core_importrun SET rows = ?, position = ?, imported = ?, failed = ?, errors = ?, seconds = ? WHERE id = ?;
+-- resume (FAILED runs)
+UPDATE core_importrun SET status = 'QUEUED', finished_at = NULL WHERE id = ?;
+INSERT INTO core_job (name, args, ...) VALUES ('core.tasks.run_import', '[<run id>]', ...);
+
+admin_import_properties()
+-- as admin_import_users, kind 'PROPERTIES'; the job, per batch (images
+-- stored by a thread pool first), in one transaction:
+SELECT username, id FROM core_user WHERE username IN (?, ...) AND role = 'SELLER';
+INSERT INTO core_property (seller_id, title, ..., latitude, longitude, geohash) VALUES (...), ... RETURNING id;
+INSERT INTO core_propertyimage (property_id, image, uploaded_at) VALUES (...), ...;
+INSERT INTO core_imageblob (name, ref_count, created_at) VALUES (?, 0, ?), ... ON CONFLICT DO NOTHING;
+UPDATE core_imageblob SET ref_count = ref_count + ? WHERE name IN (?, ...);
+-- facet counts, similarity queue and summaries as in the Property signals (models.py)
+UPDATE core_importrun SET rows = ?, position = ?, imported = ?, ... WHERE id = ?;
+-- images stored for dropped rows, or for a batch that rolled back:
+-- release_unsaved_images (models.py)
+
 admin_properties()
 SELECT p.*, u.* FROM core_property p JOIN core_user u ON p.seller_id = u.id;
-UPDATE core_property SET is_featured = NOT is_featured WHERE id = ?;
-DELETE FROM core_property WHERE id = ?;
+SELECT * FROM core_property WHERE id = ?;
+UPDATE core_property SET is_featured = NOT is_featured WHERE id = ?;  -- unfeature always, feature unless SOLD / INACTIVE
+SELECT * FROM core_deletionrun WHERE kind = 2 ORDER BY created_at DESC LIMIT 10;
+-- queue_deletion (core/deletion.py), in one transaction:
+SELECT * FROM core_deletionrun WHERE kind = ? AND object_id = ? AND status IN (1, 2) LIMIT 1;
+UPDATE core_property SET status = 4, is_featured = 0 WHERE id = ?;
+INSERT INTO core_deletionrun (kind, object_id, label, created_by_id, ...) VALUES (?, ?, ?, ?, ...);
+INSERT INTO core_job (name, args, ...) VALUES ('core.tasks.run_deletion', '[<run id>]', ...);
+-- the job: payments, ownerships, bookings, visits, archived rows, images,
+-- then the property, in batches as for admin_users()
 
 admin_add_property()
 INSERT INTO core_property (seller_id, title, address, city, property_type, price, description) VALUES (?, ?, ?, ?, ?, ?, ?);
@@ -1044,6 +1466,8 @@ admin_payments()
 SELECT * FROM core_payment WHERE id = ?;
 UPDATE core_payment SET status = 'APPROVED', platform_cut = ?, seller_amount = ?, approved_by_admin_id = ?, approved_at = ? WHERE id = ?;
 UPDATE core_payment SET seller_amount_sent = 1, seller_amount_sent_at = ? WHERE id = ?;
+-- payment_approved / payout_sent email with each update (see register_view)
+INSERT INTO core_outboxmessage (...) VALUES (...) ON CONFLICT DO NOTHING;
 
 admin_deals()
 SELECT p.*, b.*, prop.*, s.*, t.* FROM core_payment p
@@ -1053,6 +1477,27 @@ JOIN core_user s ON prop.seller_id = s.id
 JOIN core_user t ON b.tenant_id = t.id
 WHERE p.seller_amount_sent = 1 ORDER BY p.seller_amount_sent_at DESC;
 
+admin_export()
+-- streamed EXPORT_CHUNK_SIZE rows at a time; deals, e.g. ?from=2026-01-01&to=2026-03-31
+SELECT p.id, p.booking_id, b.property_id, prop.title, s.username, t.username, p.amount,
+       p.platform_cut, p.seller_amount, a.username, p.approved_at, p.seller_amount_sent_at
+FROM core_payment p
+JOIN core_booking b ON p.booking_id = b.id
+JOIN core_property prop ON b.property_id = prop.id
+JOIN core_user s ON p.seller_id = s.id
+JOIN core_user t ON b.tenant_id = t.id
+LEFT JOIN core_user a ON p.approved_by_admin_id = a.id
+WHERE p.seller_amount_sent = 1 AND p.seller_amount_sent_at >= ? AND p.seller_amount_sent_at < ?
+ORDER BY p.seller_amount_sent_at;
+-- payments: the same joins plus status and created_at, WHERE p.created_at >= ? AND p.created_at < ? ORDER BY p.created_at
+-- bookings
+SELECT b.id, b.property_id, prop.title, prop.property_type, s.username, t.username, b.status, b.created_at
+FROM core_booking b
+JOIN core_property prop ON b.property_id = prop.id
+JOIN core_user s ON b.seller_id = s.id
+JOIN core_user t ON b.tenant_id = t.id
+WHERE b.created_at >= ? AND b.created_at < ? ORDER BY b.created_at;
+
 admin_visit_requests()
 SELECT v.*, p.*, t.* FROM core_visitrequest v
 JOIN core_property p ON v.property_id = p.id
@@ -1065,8 +1510,29 @@ JOIN core_user t ON v.tenant_id = t.id
 LEFT JOIN core_user a ON v.agent_id = a.id
 WHERE v.status = 'APPROVED' ORDER BY v.created_at DESC LIMIT 10;
 
+-- agent workload on the pending visits' dates (dropdowns)
+SELECT * FROM core_user WHERE role = 'AGENT' AND is_active = 1 ORDER BY id;
+SELECT preferred_date, agent_id, COUNT(id) FROM core_visitrequest
+WHERE preferred_date IN (?, ...) AND agent_id IS NOT NULL AND status = 'APPROVED'
+GROUP BY preferred_date, agent_id;
+
 UPDATE core_visitrequest SET status = 'APPROVED', agent_id = ? WHERE id = ?;
 UPDATE core_visitrequest SET status = 'REJECTED' WHERE id = ?;
+-- visit_approved / visit_rejected email with each update (see register_view)
+INSERT INTO core_outboxmessage (...) VALUES (...) ON CONFLICT DO NOTHING;
+
+-- auto_assign: one transaction; agents picked from per-date heaps in Python
+SELECT v.*, p.*, t.* FROM core_visitrequest v
+JOIN core_property p ON v.property_id = p.id
+JOIN core_user t ON v.tenant_id = t.id
+WHERE v.status = 'PENDING' OR (v.status = 'APPROVED' AND v.agent_id IS NULL)
+ORDER BY v.preferred_date, v.created_at, v.id;
+-- (the two agent queries above, for the batch's dates)
+UPDATE core_visitrequest SET agent_id = CASE id WHEN ? THEN ? ... END, status = 'APPROVED'
+WHERE id IN (?, ...);
+INSERT INTO core_queueevent (kind, object_id, status, created, created_at) VALUES (...), ...;
+SELECT * FROM core_user WHERE id IN (?, ...);  -- the assigned agents, for the emails
+INSERT INTO core_outboxmessage (...) VALUES (...), ... ON CONFLICT DO NOTHING;
 
 admin_bookings()
 SELECT b.*, p.*, t.* FROM core_booking b
@@ -1077,6 +1543,50 @@ WHERE b.status = 'PENDING' ORDER BY b.created_at DESC;
 UPDATE core_booking SET status = 'CONFIRMED' WHERE id = ?;
 UPDATE core_property SET status = 'BOOKED' WHERE id = ?;
 UPDATE core_booking SET status = 'CANCELLED' WHERE id = ?;
+-- booking_confirmed / booking_cancelled email with each update (see register_view)
+INSERT INTO core_outboxmessage (...) VALUES (...) ON CONFLICT DO NOTHING;
+
+admin_queue_events()  -- the WSGI answer; the ASGI stream repeats the middle query every second
+SELECT id FROM core_queueevent ORDER BY id DESC LIMIT 1;  -- without a Last-Event-ID
+SELECT * FROM core_queueevent WHERE id > ? AND kind IN (?) ORDER BY id LIMIT 100;
+
+admin_queue_rows()  -- ?kind=VISIT; PAYMENT and BOOKING join as on their pages
+SELECT v.*, p.*, t.* FROM core_visitrequest v
+JOIN core_property p ON v.property_id = p.id
+JOIN core_user t ON v.tenant_id = t.id
+WHERE v.id IN (?, ...) AND v.status = 'PENDING' ORDER BY v.created_at DESC;
+-- (the two agent queries of admin_visit_requests, for these visits' dates)
+
+admin_history()
+-- bookings (the default); ?user= adds WHERE b.tenant_id = ? OR b.seller_id = ?
+SELECT COUNT(*) FROM core_archivedbooking;
+SELECT b.*, p.*, t.*, s.* FROM core_archivedbooking b
+JOIN core_property p ON b.property_id = p.id
+JOIN core_user t ON b.tenant_id = t.id
+JOIN core_user s ON b.seller_id = s.id
+ORDER BY b.created_at DESC LIMIT 25 OFFSET ?;
+SELECT * FROM core_archivedpayment WHERE booking_id IN (?, ...);
+-- ?kind=visits
+SELECT v.*, p.*, t.*, s.*, a.* FROM core_archivedvisitrequest v
+JOIN core_property p ON v.property_id = p.id
+JOIN core_user t ON v.tenant_id = t.id
+JOIN core_user s ON v.seller_id = s.id
+LEFT JOIN core_user a ON v.agent_id = a.id
+ORDER BY v.created_at DESC LIMIT 25 OFFSET ?;
+
+-- python manage.py archive_history, per batch of ARCHIVE_BATCH_SIZE:
+SELECT id FROM core_visitrequest WHERE status = 'REJECTED' AND created_at < ? LIMIT ?;
+INSERT INTO core_archivedvisitrequest (id, property_id, ..., archived_at) VALUES (...), ...;
+DELETE FROM core_visitrequest WHERE id IN (?, ...);
+SELECT id FROM core_booking b WHERE status IN ('CANCELLED', 'COMPLETED') AND created_at < ?
+AND NOT EXISTS(SELECT 1 FROM core_payment WHERE booking_id = b.id
+               AND (status = 'PENDING' OR (status = 'APPROVED' AND NOT seller_amount_sent))) LIMIT ?;
+INSERT INTO core_archivedbooking (...) VALUES (...), ...;
+INSERT INTO core_archivedpayment (...) SELECT ... FROM core_payment WHERE booking_id IN (?, ...);
+UPDATE core_tenantownership SET booking_id = NULL WHERE booking_id IN (?, ...);
+UPDATE core_tenantownership SET payment_id = NULL WHERE payment_id IN (?, ...);
+DELETE FROM core_payment WHERE booking_id IN (?, ...);
+DELETE FROM core_booking WHERE id IN (?, ...);
 
 
 TENANT ROUTES (tanzeem)
@@ -1086,31 +1596,57 @@ SELECT p.*, u.* FROM core_property p
 JOIN core_user u ON p.seller_id = u.id
 WHERE p.status = 'AVAILABLE';
 
-SELECT COUNT(DISTINCT b.id) FROM core_booking b
-JOIN core_payment pay ON pay.booking_id = b.id
-WHERE b.tenant_id = ? AND b.status = 'COMPLETED' AND pay.status = 'APPROVED';
+SELECT * FROM core_useractivitysummary WHERE user_id = ?;
+SELECT city, property_type, price_bucket, count FROM core_facetcount;
+
+property_search()
+-- one range per run of neighbouring geohash cells covering the box; the
+-- radius search then keeps rows within radius_km (haversine, in Python)
+SELECT * FROM core_property
+WHERE status = 'AVAILABLE'
+AND ((geohash >= ? AND geohash < ?) OR (geohash >= ? AND geohash < ?) ...)
+AND latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?;
+-- ?bbox= counts the same rows and returns the first `limit` of them
+SELECT COUNT(*) FROM core_property WHERE (the conditions above);
+SELECT * FROM core_property WHERE (the conditions above) ORDER BY geohash LIMIT ?;
 
 property_detail()
-SELECT * FROM core_property WHERE id = ?;
-SELECT * FROM core_propertyimage WHERE property_id = ?;
-SELECT 1 FROM core_visitrequest WHERE property_id = ? AND tenant_id = ? AND status = 'PENDING' LIMIT 1;
-SELECT 1 FROM core_visitrequest WHERE property_id = ? AND tenant_id = ? AND status = 'APPROVED' LIMIT 1;
-SELECT 1 FROM core_booking WHERE property_id = ? AND tenant_id = ? AND status IN ('PENDING', 'CONFIRMED', 'COMPLETED') LIMIT 1;
+SELECT p.version,
+    EXISTS(SELECT 1 FROM core_visitrequest WHERE property_id = p.id AND tenant_id = ? AND status = 'PENDING') AS has_pending_visit,
+    EXISTS(SELECT 1 FROM core_visitrequest WHERE property_id = p.id AND tenant_id = ? AND status = 'APPROVED') AS has_approved_visit,
+    EXISTS(SELECT 1 FROM core_booking WHERE property_id = p.id AND tenant_id = ?
+           AND status IN ('PENDING', 'CONFIRMED', 'COMPLETED')) AS has_booking
+FROM core_property p WHERE p.id = ? LIMIT 1;
+-- only when "property-detail:<id>:<version>" is not cached yet
+SELECT p.*, u.* FROM core_property p JOIN core_user u ON p.seller_id = u.id WHERE p.id = ?;
+SELECT * FROM core_propertyimage WHERE property_id = ? ORDER BY id;
+-- similar listings (precomputed by refresh_similar_properties)
+SELECT sp.*, p.* FROM core_similarproperty sp
+JOIN core_property p ON sp.similar_id = p.id
+WHERE sp.property_id = ? AND p.status = 'AVAILABLE'
+ORDER BY sp.rank LIMIT 4;
 
 request_visit()
+SELECT * FROM core_property WHERE id = ? AND status = 'AVAILABLE';
 SELECT 1 FROM core_visitrequest WHERE property_id = ? AND tenant_id = ? AND status = 'PENDING' LIMIT 1;
 INSERT INTO core_visitrequest (property_id, tenant_id, preferred_date, status, created_at) VALUES (?, ?, ?, 'PENDING', ?);
 
 tenant_my_visits()
-SELECT property_id FROM core_booking WHERE tenant_id = ? AND status = 'COMPLETED';
-SELECT v.*, p.*, a.* FROM core_visitrequest v
+SELECT v.*, p.*, a.*,
+    EXISTS(SELECT 1 FROM core_booking b WHERE b.tenant_id = v.tenant_id AND b.property_id = v.property_id
+           AND b.status IN ('PENDING', 'CONFIRMED')) AS already_booked,
+    EXISTS(SELECT 1 FROM core_booking b WHERE b.property_id = v.property_id AND b.status = 'CONFIRMED') AS property_confirmed,
+    (v.status = 'APPROVED' AND NOT already_booked AND NOT property_confirmed) AS can_book
+FROM core_visitrequest v
 JOIN core_property p ON v.property_id = p.id
 LEFT JOIN core_user a ON v.agent_id = a.id
-WHERE v.tenant_id = ? AND v.property_id NOT IN (?) ORDER BY v.created_at DESC;
-SELECT property_id FROM core_booking WHERE tenant_id = ? AND status IN ('PENDING', 'CONFIRMED');
-SELECT property_id FROM core_booking WHERE status = 'CONFIRMED';
+WHERE v.tenant_id = ?
+AND NOT EXISTS(SELECT 1 FROM core_tenantownership o WHERE o.tenant_id = ? AND o.property_id = v.property_id)
+ORDER BY v.created_at DESC LIMIT 20 OFFSET ?;
+SELECT * FROM core_propertyimage WHERE property_id IN (?) ORDER BY id;
 
 book_property()
+SELECT * FROM core_property WHERE id = ? AND status = 'AVAILABLE';
 SELECT 1 FROM core_booking WHERE property_id = ? AND tenant_id = ? AND status IN ('PENDING', 'CONFIRMED') LIMIT 1;
 SELECT 1 FROM core_booking WHERE property_id = ? AND status = 'CONFIRMED' LIMIT 1;
 INSERT INTO core_booking (property_id, tenant_id, status, created_at) VALUES (?, ?, 'PENDING', ?);
@@ -1122,16 +1658,20 @@ JOIN core_user s ON p.seller_id = s.id
 WHERE b.tenant_id = ? AND b.status != 'COMPLETED' ORDER BY b.created_at DESC;
 
 tenant_my_properties()
-SELECT b.*, p.*, s.*, pay.* FROM core_booking b
-JOIN core_property p ON b.property_id = p.id
+SELECT o.*, p.*, s.* FROM core_tenantownership o
+JOIN core_property p ON o.property_id = p.id
 JOIN core_user s ON p.seller_id = s.id
-JOIN core_payment pay ON pay.booking_id = b.id
-WHERE b.tenant_id = ? AND b.status = 'COMPLETED' AND pay.status = 'APPROVED';
+WHERE o.tenant_id = ? ORDER BY o.purchased_at DESC LIMIT 12 OFFSET ?;
+SELECT * FROM core_propertyimage WHERE property_id IN (?) ORDER BY id;
+
+tenant_history()
+-- as admin_history, WHERE b.tenant_id = ? (or v.tenant_id = ?)
 
 initiate_payment()
 SELECT * FROM core_booking WHERE id = ? AND tenant_id = ? AND status = 'CONFIRMED';
 SELECT 1 FROM core_payment WHERE booking_id = ? LIMIT 1;
 INSERT INTO core_payment (booking_id, amount, platform_cut, seller_amount, status, approved_at) VALUES (?, ?, ?, ?, 'APPROVED', ?);
+INSERT INTO core_tenantownership (tenant_id, property_id, booking_id, payment_id, amount, purchased_at) VALUES (?, ?, ?, ?, ?, ?);
 UPDATE core_booking SET status = 'COMPLETED' WHERE id = ?;
 UPDATE core_property SET status = 'SOLD', is_featured = 0 WHERE id = ?;
 
@@ -1143,27 +1683,15 @@ SELECT * FROM core_payment WHERE booking_id = ?;
 SELLER ROUTES (saud)
 
 seller_dashboard()
-SELECT * FROM core_property WHERE seller_id = ? ORDER BY created_at DESC;
+SELECT * FROM core_useractivitysummary WHERE user_id = ?;
+
+SELECT * FROM core_property WHERE seller_id = ? ORDER BY created_at DESC LIMIT 6;
+SELECT * FROM core_propertyimage WHERE property_id IN (?) ORDER BY id;
 
 SELECT b.*, p.*, t.* FROM core_booking b
 JOIN core_property p ON b.property_id = p.id
 JOIN core_user t ON b.tenant_id = t.id
-WHERE p.seller_id = ? ORDER BY b.created_at DESC;
-
-SELECT v.*, p.*, t.* FROM core_visitrequest v
-JOIN core_property p ON v.property_id = p.id
-JOIN core_user t ON v.tenant_id = t.id
-WHERE p.seller_id = ? ORDER BY v.created_at DESC;
-
-SELECT SUM(seller_amount) FROM core_payment pay
-JOIN core_booking b ON pay.booking_id = b.id
-JOIN core_property p ON b.property_id = p.id
-WHERE p.seller_id = ? AND pay.status = 'APPROVED' AND pay.seller_amount_sent = 1;
-
-SELECT SUM(seller_amount) FROM core_payment pay
-JOIN core_booking b ON pay.booking_id = b.id
-JOIN core_property p ON b.property_id = p.id
-WHERE p.seller_id = ? AND pay.status = 'APPROVED' AND pay.seller_amount_sent = 0;
+WHERE b.seller_id = ? ORDER BY b.created_at DESC LIMIT 5;
 
 seller_properties()
 SELECT * FROM core_property WHERE seller_id = ? ORDER BY created_at DESC;
@@ -1180,35 +1708,55 @@ DELETE FROM core_propertyimage WHERE id IN (?) AND property_id = ?;
 
 delete_property()
 SELECT * FROM core_property WHERE id = ? AND seller_id = ?;
-DELETE FROM core_property WHERE id = ?;
+-- queued as in admin_properties()
+UPDATE core_property SET status = 4, is_featured = 0 WHERE id = ?;
 
 seller_appointments()
-SELECT * FROM core_property WHERE seller_id = ?;
 SELECT v.*, p.*, t.*, a.* FROM core_visitrequest v
 JOIN core_property p ON v.property_id = p.id
 JOIN core_user t ON v.tenant_id = t.id
 LEFT JOIN core_user a ON v.agent_id = a.id
-WHERE p.seller_id = ? ORDER BY v.created_at DESC;
+WHERE v.seller_id = ? ORDER BY v.created_at DESC;
 
 seller_bookings()
-SELECT * FROM core_property WHERE seller_id = ?;
 SELECT b.*, p.*, t.* FROM core_booking b
 JOIN core_property p ON b.property_id = p.id
 JOIN core_user t ON b.tenant_id = t.id
-WHERE p.seller_id = ? ORDER BY b.created_at DESC;
+WHERE b.seller_id = ? ORDER BY b.created_at DESC;
 
 seller_payments()
 SELECT pay.*, b.*, p.*, t.* FROM core_payment pay
 JOIN core_booking b ON pay.booking_id = b.id
 JOIN core_property p ON b.property_id = p.id
 JOIN core_user t ON b.tenant_id = t.id
-WHERE p.seller_id = ? AND pay.status = 'APPROVED' AND pay.seller_amount_sent = 1
+WHERE pay.seller_id = ? AND pay.status = 'APPROVED' AND pay.seller_amount_sent = 1
 ORDER BY pay.seller_amount_sent_at DESC;
 
 SELECT pay.*, b.*, p.*, t.* FROM core_payment pay
 JOIN core_booking b ON pay.booking_id = b.id
 JOIN core_property p ON b.property_id = p.id
 JOIN core_user t ON b.tenant_id = t.id
-WHERE p.seller_id = ? AND pay.status = 'APPROVED' AND pay.seller_amount_sent = 0
+WHERE pay.seller_id = ? AND pay.status = 'APPROVED' AND pay.seller_amount_sent = 0
 ORDER BY pay.approved_at DESC;
+
+
+CHUNKED UPLOADS (seller / admin)
+
+upload_create()
+SELECT * FROM core_property WHERE id = ?;
+INSERT INTO core_uploadsession (id, owner_id, property_id, filename, total_size, sha256, received, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 0, 'ACTIVE', ?, ?);
+
+upload_chunk()
+SELECT * FROM core_uploadsession WHERE id = ? AND owner_id = ?;
+-- PUT and DELETE: one request at a time (core/uploads.py); 0 rows -> 409
+UPDATE core_uploadsession SET locked_at = ?
+WHERE id = ? AND status = 'ACTIVE' AND (locked_at IS NULL OR locked_at < ?);
+UPDATE core_uploadsession SET received = ?, updated_at = ? WHERE id = ?;
+UPDATE core_uploadsession SET locked_at = NULL WHERE id = ? AND locked_at = ?;
+
+upload_finalize()
+SELECT * FROM core_uploadsession WHERE id = ? AND owner_id = ?;
+-- (the same lock as upload_chunk)
+INSERT INTO core_propertyimage (property_id, image, uploaded_at) VALUES (?, ?, ?);
+UPDATE core_uploadsession SET status = 'COMPLETE', updated_at = ? WHERE id = ?;
 """
@@ -79,9 +79,33 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # django_session only (core/routers.py): python manage.py migrate --database sessions
+    'sessions': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'sessions.sqlite3',
+    },
 }
 
+DATABASE_ROUTERS = ['core.routers.SessionRouter']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # sessions and logged-in users (core/user_cache.py); on disk so every
+    # server process on the host sees the same logins and logouts. Session
+    # keys live here, so keep it in a directory only this app can read.
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'auth_cache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'auth'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -127,6 +151,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+AUTHENTICATION_BACKENDS = ['core.user_cache.CachedUserBackend']
+AUTH_USER_CACHE_SECONDS = 60 * 60
+
 
 LOGIN_REDIRECT_URL = 'role-redirect'
 LOGOUT_REDIRECT_URL = 'home'
@@ -135,3 +162,88 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 
+# Media serving (core/media.py)
+# set to an nginx "internal" location, e.g. "/protected-media/", to hand file
+# bodies to the front end with X-Accel-Redirect
+MEDIA_ACCEL_REDIRECT_PREFIX = None
+# content-hashed names never change
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+MEDIA_DEFAULT_MAX_AGE = 60 * 60
+
+# Resumable chunked image uploads (core/uploads.py)
+CHUNKED_UPLOAD_ROOT = BASE_DIR / 'upload_tmp'
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_FILE_SIZE = 100 * 1024 * 1024
+# one request writes to an upload at a time; a lock older than this was
+# left by a request that died
+CHUNKED_UPLOAD_LOCK_SECONDS = 60 * 10
+# unfinished uploads idle this long are removed (python manage.py prune_uploads)
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+
+# Serve the read-heavy dashboards with the async views in core/async_views.py.
+# Turn on when running under an ASGI server (uvicorn project370.asgi:application).
+ASYNC_VIEWS = False
+
+# Admin queue event stream (core/notify.py)
+QUEUE_EVENTS_POLL_SECONDS = 1.0
+QUEUE_EVENTS_STREAM_SECONDS = 300
+QUEUE_EVENTS_RETRY_SECONDS = 5
+QUEUE_EVENTS_RETENTION = 60 * 60 * 24
+QUEUE_EVENTS_PRUNE_EVERY = 500
+
+# Cached property/gallery part of the property detail page (core/property_cache.py).
+# Keys include the property version, so changes never serve stale data.
+PROPERTY_DETAIL_CACHE_SECONDS = 60 * 60
+
+# Similar listings (core/similarity.py): prices are placed on a log scale
+# between these bounds (and clamped to them), the same for every property
+SIMILAR_PRICE_BOUNDS = (1_000, 1_000_000_000)
+
+# Automatic agent assignment for visit requests (core/assignment.py):
+# approved visits one agent takes on a single day
+AGENT_DAILY_VISIT_CAPACITY = 8
+
+# Background jobs (core/jobs.py, python manage.py runworkers)
+JOB_POLL_SECONDS = 1.0
+JOB_RETRY_BACKOFF = 30
+JOB_LOCK_TIMEOUT = 60 * 10
+# long tasks refresh their lock this often, well inside JOB_LOCK_TIMEOUT
+JOB_HEARTBEAT_SECONDS = 60
+
+# Email notifications go through the outbox (core/outbox.py) and are sent by a
+# background job. Locally they are written to files in sent_emails/; use
+# django.core.mail.backends.locmem.EmailBackend to keep them in memory, or
+# the smtp backend with EMAIL_HOST etc. in production.
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
+DEFAULT_FROM_EMAIL = 'Project370 <no-reply@project370.local>'
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_PER_MINUTE = 120
+OUTBOX_MAX_PER_RECIPIENT_PER_HOUR = 10
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BACKOFF = 60
+
+IMPORT_ROOT = BASE_DIR / 'imports'
+IMPORT_BATCH_SIZE = 500
+IMPORT_WORKERS = None  # password hashing processes; None: one per CPU core
+IMPORT_IMAGE_WORKERS = None  # image threads; None: four per CPU core, at most 32
+IMPORT_MAX_ERRORS = 1000
+
+# Send the admin users/properties/deals pages as they are rendered, table
+# rows a chunk at a time (core/streaming.py); off renders them in one piece.
+STREAM_ADMIN_TABLES = True
+STREAM_ROWS_CHUNK_SIZE = 200
+
+# Archive of finished visits, bookings and payments (core/archive.py,
+# python manage.py archive_history)
+ARCHIVE_RETENTION_DAYS = 365
+ARCHIVE_BATCH_SIZE = 500
+
+# Deleting users and properties in the background (core/deletion.py):
+# rows removed per transaction
+DELETION_BATCH_SIZE = 500
+
+# Streaming CSV/JSONL exports (core/exports.py, python manage.py export):
+# rows read from the database and sent to the client at a time
+EXPORT_CHUNK_SIZE = 2000